@@ -0,0 +1,70 @@
+# benchmarks/bench_compras.py
+"""
+Compara o registro de compras linha a linha (add_compra) com a importação
+em lote (add_compras_bulk). Uso: python -m benchmarks.bench_compras [n_linhas]
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from db.db_manager import DBManager
+
+
+# cada produto fica numa família de unidades (massa, volume ou peça), como
+# na prática: entre famílias a conversão exigiria densidade/peso por unidade
+FAMILIAS = (('kg', 'g'), ('l', 'ml'), ('un',))
+
+
+def gerar_compras(n, n_produtos=200, n_fornecedores=20, seed=42):
+    rnd = random.Random(seed)
+    hoje = date.today()
+    for i in range(n):
+        dia = hoje - timedelta(days=rnd.randint(0, 30))
+        produto = rnd.randint(1, n_produtos)
+        yield {
+            'produto_nome': f'Produto {produto:04d}',
+            'quantidade': round(rnd.uniform(1, 20), 2),
+            'unidade': rnd.choice(FAMILIAS[produto % len(FAMILIAS)]),
+            'preco_total': round(rnd.uniform(5, 300), 2),
+            'data_str': dia.strftime('%d/%m/%Y'),
+            'lote': f'L{i:06d}',
+            'validade': (dia + timedelta(days=90)).strftime('%d/%m/%Y'),
+            'fornecedor_nome': f'Fornecedor {rnd.randint(1, n_fornecedores):02d}',
+        }
+
+
+def _medir(func, n):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DBManager(db_path=os.path.join(tmp, 'bench.db'))
+        try:
+            t0 = time.perf_counter()
+            func(db)
+            elapsed = time.perf_counter() - t0
+        finally:
+            db.conn.close()
+    return n / elapsed if elapsed else float('inf')
+
+
+def main(n=2000):
+    compras = list(gerar_compras(n))
+
+    def por_linha(db):
+        for c in compras:
+            db.add_compra(c['produto_nome'], c['quantidade'], c['unidade'], c['preco_total'], c['data_str'],
+                          lote=c['lote'], validade=c['validade'], fornecedor_nome=c['fornecedor_nome'])
+
+    def em_lote(db):
+        db.add_compras_bulk(compras)
+
+    rps_linha = _medir(por_linha, n)
+    rps_lote = _medir(em_lote, n)
+    print(f'{n} compras')
+    print(f'  add_compra (por linha): {rps_linha:12.0f} linhas/s')
+    print(f'  add_compras_bulk:       {rps_lote:12.0f} linhas/s  ({rps_lote / rps_linha:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,93 @@
+# benchmarks/bench_date_ranges.py
+"""
+Consultas por período (30/90/365 dias) antes e depois das colunas inteiras
+*_dia (migrations.DAY_COLUMNS), sobre cópias de uma base existente.
+
+"Antes" roda as consultas com a data ISO em texto e os índices de texto
+antigos; "depois" abre a cópia pelo DBManager (que migra) e usa *_dia.
+As duas cópias têm estatísticas (ANALYZE), para comparar plano com plano.
+Uso: python -m benchmarks.bench_date_ranges base.db [repetições]
+     (base sintética: python -m db.synthetic base.db --escala 100k)
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from db.db_manager import DBManager
+from db.migrations import REPLACED_DATE_INDEXES
+from utils.date_helpers import today_number
+
+JANELAS = (30, 90, 365)
+
+# índices de texto anteriores às colunas *_dia
+INDICES_ANTIGOS = {
+    'idx_vendas_data': 'vendas(data)',
+    'idx_vendas_produto_data': 'vendas(produto_id, data)',
+    'idx_compras_produto_data': 'compras(produto_id, data)',
+    'idx_wastes_data': 'wastes(data)',
+    'idx_wastes_produto_data': 'wastes(produto_id, data)',
+    'idx_stock_adj_produto_data': 'stock_adjustments(produto_id, data)',
+    'idx_lotes_ativos_validade': 'lotes(data_validade) WHERE quantidade_base > 0',
+}
+
+# nome -> (sql com texto, sql com *_dia); o parâmetro é o início da janela
+CONSULTAS = {
+    'vendas por produto': ('SELECT produto_id, SUM(quantidade_base) FROM vendas WHERE data >= ? GROUP BY produto_id',
+                           'SELECT produto_id, SUM(quantidade_base) FROM vendas WHERE data_dia >= ? GROUP BY produto_id'),
+    'vendas por dia': ('SELECT substr(data, 1, 10), COUNT(*) FROM vendas WHERE data >= ? GROUP BY 1',
+                       'SELECT data_dia, COUNT(*) FROM vendas WHERE data_dia >= ? GROUP BY 1'),
+    'preço médio de compra': ('SELECT produto_id, AVG(preco_unitario_base) FROM compras WHERE data >= ? GROUP BY produto_id',
+                              'SELECT produto_id, AVG(preco_unitario_base) FROM compras WHERE data_dia >= ? GROUP BY produto_id'),
+    'desperdício': ('SELECT COUNT(*), SUM(quantidade_base) FROM wastes WHERE data >= ?',
+                    'SELECT COUNT(*), SUM(quantidade_base) FROM wastes WHERE data_dia >= ?'),
+}
+
+
+def medir(conn, sql, param, repeticoes):
+    """Menor tempo (ms) entre as repetições, depois de uma execução de aquecimento."""
+    conn.execute(sql, (param,)).fetchall()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        conn.execute(sql, (param,)).fetchall()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos) * 1000
+
+
+def main(base, repeticoes=20):
+    assert set(INDICES_ANTIGOS) == set(REPLACED_DATE_INDEXES)
+    with tempfile.TemporaryDirectory() as tmp:
+        antes, depois = os.path.join(tmp, 'antes.db'), os.path.join(tmp, 'depois.db')
+        shutil.copyfile(base, antes)
+        shutil.copyfile(base, depois)
+
+        conn = sqlite3.connect(antes)
+        for nome, alvo in INDICES_ANTIGOS.items():
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON {alvo}')
+        # estatísticas nos dois lados (a migração roda ANALYZE nas tabelas preenchidas)
+        conn.execute('ANALYZE')
+        conn.commit()
+
+        inicio = time.perf_counter()
+        db = DBManager(db_path=depois)
+        print(f'abertura com migração: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+        print(f'{"consulta":<24}{"dias":>6}{"antes ms":>11}{"depois ms":>11}')
+        for nome, (sql_texto, sql_dia) in CONSULTAS.items():
+            for dias in JANELAS:
+                desde = (date.today() - timedelta(days=dias)).isoformat()
+                t_antes = medir(conn, sql_texto, desde, repeticoes)
+                t_depois = medir(db.conn, sql_dia, today_number() - dias, repeticoes)
+                print(f'{nome:<24}{dias:>6}{t_antes:>11.2f}{t_depois:>11.2f}')
+        conn.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('Uso: python -m benchmarks.bench_date_ranges base.db [repetições]')
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 20)
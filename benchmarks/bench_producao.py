@@ -0,0 +1,71 @@
+# benchmarks/bench_producao.py
+"""
+Produções por segundo de uma receita com vários ingredientes: uma transação
+por produção (transaction() com savepoints) contra a linha de base com um
+commit por etapa. Uso: python -m benchmarks.bench_producao [n_producoes] [n_ingredientes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from db.db_manager import DBManager
+
+
+class DBManagerCommitPorEtapa(DBManager):
+    """
+    Linha de base: cada bloco transaction(), aninhado ou não, faz o próprio
+    commit em vez de virar SAVEPOINT - um commit por ingrediente consumido e
+    outro no fim da produção, como antes da transação única.
+    """
+
+    def _transaction(self):
+        cur = self.conn.cursor()
+        self._tx_depth += 1
+        try:
+            yield cur
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            self._descartar_caches()
+            raise
+        finally:
+            self._tx_depth -= 1
+
+
+def preparar(db, n_producoes, n_ingredientes):
+    compras = [{'produto_nome': f'Insumo {i:02d}', 'quantidade': n_producoes, 'unidade': 'kg',
+                'preco_total': 10.0 * n_producoes, 'data_str': None, 'lote': f'L{i:02d}'}
+               for i in range(n_ingredientes)]
+    db.add_compras_bulk(compras)
+    rid = db.add_receita('Receita bench', 10, 'un')
+    for i in range(n_ingredientes):
+        db.add_receita_ingrediente(rid, f'Insumo {i:02d}', 100, 'g')
+    return rid
+
+
+def _medir(cls, n_producoes, n_ingredientes):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = cls(db_path=os.path.join(tmp, 'bench.db'))
+        try:
+            rid = preparar(db, n_producoes, n_ingredientes)
+            t0 = time.perf_counter()
+            for _ in range(n_producoes):
+                db.add_producao(rid, 10, None, 'un')
+            elapsed = time.perf_counter() - t0
+        finally:
+            db.conn.close()
+    return n_producoes / elapsed if elapsed else float('inf')
+
+
+def main(n_producoes=200, n_ingredientes=12):
+    pps_etapa = _medir(DBManagerCommitPorEtapa, n_producoes, n_ingredientes)
+    pps_unica = _medir(DBManager, n_producoes, n_ingredientes)
+    print(f'{n_producoes} produções, {n_ingredientes} ingredientes')
+    print(f'  commit por etapa:  {pps_etapa:10.1f} produções/s')
+    print(f'  transação única:   {pps_unica:10.1f} produções/s  ({pps_unica / pps_etapa:.1f}x)')
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
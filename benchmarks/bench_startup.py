@@ -0,0 +1,48 @@
+# benchmarks/bench_startup.py
+"""
+Tempo de importação na abertura do aplicativo (python -X importtime).
+Uso: python -m benchmarks.bench_startup [módulo] [n_top]
+"""
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# bibliotecas que só podem ser carregadas quando o dashboard desenha
+PESADOS = ('pandas', 'seaborn', 'matplotlib')
+
+
+def importtime(modulo='ui.app'):
+    """Executa um interpretador novo e retorna [(módulo, self_us, cumulativo_us)]."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+                          cwd=RAIZ, capture_output=True, text=True, check=True)
+    linhas = []
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        self_us, cum_us, nome = linha[len('import time:'):].split('|')
+        linhas.append((nome.strip(), int(self_us), int(cum_us)))
+    return linhas
+
+
+def pesados_importados(linhas):
+    return sorted({nome.split('.')[0] for nome, _, _ in linhas if nome.split('.')[0] in PESADOS})
+
+
+def main(modulo='ui.app', n_top=10):
+    linhas = importtime(modulo)
+    total = next(cum for nome, _, cum in linhas if nome == modulo)
+    print(f'import {modulo}: {total / 1000:.1f} ms ({len(linhas)} módulos)')
+    outros = [l for l in linhas if l[0] != modulo]
+    for nome, _, cum in sorted(outros, key=lambda l: l[2], reverse=True)[:n_top]:
+        print(f'  {cum / 1000:8.1f} ms  {nome}')
+    pesados = pesados_importados(linhas)
+    if pesados:
+        print(f'AVISO: importados na abertura: {", ".join(pesados)}')
+
+
+if __name__ == '__main__':
+    modulo = sys.argv[1] if len(sys.argv) > 1 else 'ui.app'
+    n_top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    main(modulo, n_top)
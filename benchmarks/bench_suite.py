@@ -0,0 +1,178 @@
+# benchmarks/bench_suite.py
+"""
+Suíte pytest-benchmark dos caminhos críticos do DBManager sobre uma base
+sintética (db/synthetic.py) de 10k, 100k ou 1M vendas.
+
+Não faz parte dos testes normais (o nome não começa com test_); rode com:
+    BENCH_ESCALA=100k python -m pytest benchmarks/bench_suite.py \\
+        --benchmark-storage=benchmarks/resultados --benchmark-autosave
+e compare com a última execução salva:
+    ... --benchmark-compare --benchmark-compare-fail=mean:20%
+
+A base de cada escala é gerada uma vez e guardada no diretório temporário
+do sistema; cada execução trabalha sobre uma cópia.
+"""
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import date
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from db.db_manager import DBManager
+from db.synthetic import ESCALAS, gerar_dados
+
+ESCALA = os.environ.get('BENCH_ESCALA', '10k')
+# mude quando o que gerar_dados grava mudar (ex.: lote_movimentos), para gerar a base de novo
+VERSAO_BASE = 2
+
+
+def _base_em_cache():
+    params = ESCALAS[ESCALA]
+    versao = hashlib.sha1(json.dumps({**params, 'versao': VERSAO_BASE}, sort_keys=True).encode()).hexdigest()[:8]
+    path = os.path.join(tempfile.gettempdir(), f'cookbook-bench-{ESCALA}-{versao}.db')
+    if not os.path.exists(path):
+        tmp = path + '.gerando'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        db = DBManager(db_path=tmp, wal=True)
+        try:
+            gerar_dados(db, **params)
+        finally:
+            db.close()
+        os.replace(tmp, path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('bench') / 'bench.db')
+    shutil.copyfile(_base_em_cache(), path)
+    dbm = DBManager(db_path=path, wal=True, readers=2)
+    yield dbm
+    dbm.close()
+
+
+@pytest.fixture(scope='module')
+def produtos(db):
+    # produtos com folga para todas as rodadas de venda (1 g por venda)
+    return [r['id'] for r in db.conn.execute("SELECT id FROM produtos WHERE unidade_base = 'g' AND quantidade > 5000 ORDER BY id LIMIT 200")]
+
+
+# ---------------- escrita ----------------
+def test_compras_bulk(benchmark, db):
+    rnd = random.Random(1)
+    nomes = sorted(p['nome'] for p in db.catalog('produtos').by_id.values() if p['unidade_base'] == 'g')
+    hoje = date.today().strftime('%Y-%m-%d')
+    compras = [{'produto_nome': rnd.choice(nomes), 'quantidade': 1, 'unidade': 'kg', 'preco_total': 10.0,
+                'data_str': hoje, 'lote': f'B{i}', 'fornecedor_nome': 'Fornecedor 0000'} for i in range(500)]
+    benchmark(db.add_compras_bulk, compras)
+
+
+def test_vendas_batch(benchmark, db, produtos):
+    rnd = random.Random(2)
+    vendas = [{'produto_id': rnd.choice(produtos), 'quantidade': 1, 'unidade': 'g', 'preco_unitario': 1.0,
+               'data_str': None} for _ in range(200)]
+    benchmark.pedantic(db.add_vendas_batch, args=(vendas,), rounds=20, iterations=1)
+
+
+def test_add_venda(benchmark, db, produtos):
+    benchmark.pedantic(db.add_venda, args=(produtos[0], 1, 'g', 1.0, None), rounds=100, iterations=1)
+
+
+def test_add_producao(benchmark, db):
+    plano = db.max_producible()
+    rid = max(plano, key=lambda r: plano[r]['max_fornadas'])
+    rendimento = plano[rid]['max_quantidade'] / plano[rid]['max_fornadas']
+    benchmark.pedantic(db.add_producao, args=(rid, rendimento, None), rounds=20, iterations=1)
+
+
+def test_to_base_many(benchmark):
+    np = pytest.importorskip('numpy')
+    from utils.unit_converter import UnitConverter
+    rnd = np.random.default_rng(3)
+    n = 100000
+    quantidades = rnd.uniform(0.1, 5, n)
+    unidades = rnd.choice(UnitConverter.UNITS, n).tolist()
+    alvo = ['g' if u == 'un' else u for u in unidades]
+    benchmark(UnitConverter.to_base_many, quantidades, unidades, alvo, None, np.full(n, 50.0))
+
+
+# ---------------- receitas ----------------
+def test_recipe_costs_frio(benchmark, db):
+    def limpar():
+        db._recipe_cost_cache = {}
+        db._recipe_graph = None
+    benchmark.pedantic(db.compute_all_recipe_costs, setup=limpar, rounds=10, iterations=1)
+
+
+def test_recipe_cost_cache(benchmark, db):
+    rid = db.conn.execute('SELECT MAX(id) FROM receitas').fetchone()[0]
+    db.compute_recipe_cost(rid)
+    benchmark(db.compute_recipe_cost, rid)
+
+
+def test_max_producible(benchmark, db):
+    pytest.importorskip('numpy')
+    benchmark(db.max_producible)
+
+
+# ---------------- consultas / dashboard ----------------
+def test_sales_and_cogs(benchmark, db):
+    benchmark(db.compute_sales_and_cogs)
+
+
+def test_total_stock_value(benchmark, db):
+    benchmark(db.total_stock_value)
+
+
+@pytest.mark.parametrize('plot', ['plot_sales_trend', 'plot_top_products', 'plot_stock_levels', 'plot_purchases_by_supplier'])
+def test_dashboard_plot(benchmark, db, plot):
+    pytest.importorskip('pandas')
+    pytest.importorskip('seaborn')
+    from matplotlib.figure import Figure
+    from utils import dash
+
+    def desenhar():
+        with db.read_connection() as conn:
+            getattr(dash, plot)(conn, Figure())
+    benchmark(desenhar)
+
+
+def test_reorder_plan(benchmark, db):
+    pytest.importorskip('numpy')
+    benchmark(db.compute_reorder_plan)
+
+
+def test_search_produtos(benchmark, db):
+    benchmark(db.search_produtos, 'duto 01')
+
+
+def test_compras_page(benchmark, db):
+    benchmark(db.get_compras_recent_page, 12)
+
+
+def test_trace_lote(benchmark, db):
+    # recall do lote mais consumido (ida) e volta a partir de uma venda dele
+    lote = db.conn.execute('SELECT lote_id FROM lote_movimentos GROUP BY lote_id ORDER BY COUNT(*) DESC LIMIT 1').fetchone()[0]
+    codigo = db.conn.execute('SELECT lote FROM lotes WHERE id = ?', (lote,)).fetchone()[0]
+    assert benchmark(db.trace_lote, codigo)
+
+
+def test_trace_origem(benchmark, db):
+    venda = db.conn.execute("SELECT MAX(origem_id) FROM lote_movimentos WHERE origem = 'venda'").fetchone()[0]
+    assert benchmark(db.trace_origem, 'venda', venda)
+
+
+# ---------------- exportação ----------------
+@pytest.mark.parametrize('fmt', ['csv', 'csv.gz', 'parquet'])
+def test_export_vendas(benchmark, db, tmp_path, fmt):
+    if fmt == 'parquet':
+        pytest.importorskip('pyarrow')
+    destino = str(tmp_path / f'vendas.{fmt}')
+    benchmark.pedantic(db.export_table, args=('vendas', destino), kwargs={'fmt': fmt}, rounds=3, iterations=1)
@@ -0,0 +1,43 @@
+# db/catalog.py
+
+# colunas mantidas em memória por tabela de cadastro (nada que mude a cada
+# venda/compra, como produtos.quantidade, entra aqui)
+CATALOG_COLUMNS = {
+    'produtos': ('id', 'nome', 'unidade_base', 'densidade', 'peso_unidade'),
+    'receitas': ('id', 'nome', 'rendimento', 'unidade_resultado'),
+    'fornecedores': ('id', 'nome', 'contato'),
+}
+
+
+class Catalog:
+    """Mapas id -> registro e nome -> id de uma tabela de cadastro."""
+
+    def __init__(self, table, rows=()):
+        self.table = table
+        self.by_id = {}
+        self.by_nome = {}
+        for r in rows:
+            self.add(r)
+
+    @classmethod
+    def load(cls, conn, table):
+        cols = CATALOG_COLUMNS[table]
+        return cls(table, conn.execute(f'SELECT {", ".join(cols)} FROM {table}').fetchall())
+
+    def add(self, row):
+        row = {c: row[c] for c in CATALOG_COLUMNS[self.table]}
+        self.by_id[row['id']] = row
+        self.by_nome[row['nome']] = row['id']
+
+    def get(self, id):
+        return self.by_id.get(id)
+
+    def get_by_nome(self, nome):
+        id = self.by_nome.get(nome)
+        return None if id is None else self.by_id[id]
+
+    def id_of(self, nome):
+        return self.by_nome.get(nome)
+
+    def names(self):
+        return sorted(self.by_nome)
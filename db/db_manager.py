@@ -2,69 +2,222 @@
 import sqlite3
 import os
 import csv
-import math
+import inspect
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 from utils.unit_converter import UnitConverter
-from utils.date_helpers import parse_date_input, ISO_DATE_FMT
+from db.migrations import run_migrations, create_search_index, REBUILD_VENDAS_DIARIAS_SQL, DAY_COLUMNS
+from db.pool import ReadPool
+from db.catalog import Catalog, CATALOG_COLUMNS
+from db import export
+from db.instrumentation import Instrumentation
+from utils.date_helpers import parse_date_input, parse_dates_many, next_day_iso, day_number, today_number, ISO_DATE_FMT
+from utils.text_helpers import sem_acentos
 
 DB_FILE = 'sistema_culinario.db'
 
 class DBManager:
-    def __init__(self, db_path=DB_FILE):
+    # nº máximo de parâmetros por cláusula IN nas operações em lote
+    BULK_CHUNK = 500
+
+    # linhas por página nas listagens paginadas (get_*_page)
+    PAGE_SIZE = 200
+
+    # linhas lidas por fetchmany nas exportações
+    EXPORT_CHUNK = 2000
+
+    # coluna de data usada pelo filtro de período de export_table (demais tabelas: 'data', se existir)
+    EXPORT_DATE_COLUMNS = {'lotes': 'data_compra', 'vendas_diarias': 'dia'}
+    # (tabela, coluna ISO) -> coluna inteira com o nº do dia
+    DAY_COLUMN_OF = {(t, src): col for t, src, col in DAY_COLUMNS}
+
+    # inserts com a coluna inteira *_dia ao lado da data (ver migrations.DAY_COLUMNS)
+    _INSERT_COMPRA_SQL = ('INSERT INTO compras (produto_id, fornecedor_id, quantidade, unidade, quantidade_base, preco_total, '
+                          'preco_unitario_base, data, lote, validade, data_dia) VALUES (?,?,?,?,?,?,?,?,?,?,?)')
+    # e com o custo (custo_unitario do lote, custo total do movimento)
+    _INSERT_LOTE_SQL = ('INSERT INTO lotes (produto_id, quantidade_base, data_compra, data_validade, lote, validade_dia, custo_unitario) '
+                        'VALUES (?,?,?,?,?,?,?)')
+    _INSERT_VENDA_SQL = ('INSERT INTO vendas (produto_id, quantidade, quantidade_base, preco_unitario, data, local, data_dia, custo) '
+                         'VALUES (?,?,?,?,?,?,?,?)')
+    _INSERT_AJUSTE_SQL = 'INSERT INTO stock_adjustments (produto_id, data, before_qty, after_qty, motivo, data_dia, custo) VALUES (?,?,?,?,?,?,?)'
+    _INSERT_MOVIMENTO_SQL = ('INSERT INTO lote_movimentos (lote_id, origem, origem_id, quantidade_base, custo, data, data_dia) '
+                             'VALUES (?,?,?,?,?,?,?)')
+
+    # ajustes aplicados a todas as conexões quando wal=True
+    CACHE_SIZE_KIB = 20000
+    MMAP_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, db_path=DB_FILE, wal=False, readers=0, busy_timeout_ms=5000):
+        """
+        wal=True liga journal_mode=WAL com synchronous=NORMAL e cache/mmap
+        maiores; readers=N cria um pool de até N conexões somente-leitura
+        (ver read_connection) para que dashboards, exportações e importações
+        possam ler em outras threads enquanto self.conn registra as operações.
+        """
         first_time = not os.path.exists(db_path)
-        self.conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
-        self.conn.row_factory = sqlite3.Row
+        self.db_path = db_path
+        self.wal = wal
+        self.busy_timeout_ms = busy_timeout_ms
+        # com pool, o escritor pode ser usado por outras threads (sempre sob _write_lock)
+        self._threaded = bool(readers) and db_path != ':memory:'
+        self._write_lock = threading.RLock()
+        self.instrumentation = None     # ver enable_instrumentation
+        self.conn = self._connect()
+        if wal:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self._read_pool = ReadPool(lambda: self._connect(read_only=True), readers) if self._threaded else None
+        # cache de custos de receitas: (meses, data inicial da média) -> estado
+        self._recipe_cost_cache = {}
+        self._recipe_graph = None
+        self._tx_depth = 0
+        # cadastros em memória (ver catalog); descartados quando outro processo grava
+        self._catalogs = {}
+        self._catalog_version = None
         self._create_tables()
 
+    def _connect(self, read_only=False):
+        conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES,
+                               timeout=self.busy_timeout_ms / 1000, check_same_thread=not self._threaded)
+        conn.row_factory = sqlite3.Row
+        if self.instrumentation is not None:
+            conn.set_trace_callback(self.instrumentation.trace)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        if self.wal:
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute(f'PRAGMA cache_size = -{int(self.CACHE_SIZE_KIB)}')
+            conn.execute(f'PRAGMA mmap_size = {int(self.MMAP_SIZE)}')
+            conn.execute('PRAGMA temp_store = MEMORY')
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    @contextmanager
+    def read_connection(self):
+        """
+        Empresta uma conexão para leitura. Com pool (readers > 0) é uma conexão
+        própria, utilizável em outra thread; sem pool é a conexão principal.
+        """
+        if self._read_pool is None:
+            with self._write_lock:
+                yield self.conn
+        else:
+            with self._read_pool.connection() as conn:
+                yield conn
+
     def get_connection(self):
         """Retorna o objeto de conexão DB-API 2 do sqlite3."""
         return self.conn
+
+    # métodos públicos que não são operações de negócio (não são cronometrados)
+    _NAO_INSTRUMENTAR = {'transaction', 'read_connection', 'get_connection', 'close', 'catalog',
+                         'enable_instrumentation', 'disable_instrumentation'}
+
+    def _metodos_instrumentaveis(self):
+        return [n for n, f in vars(DBManager).items()
+                if inspect.isfunction(f) and not n.startswith('_') and n not in self._NAO_INSTRUMENTAR]
+
+    def _todas_conexoes(self):
+        return [self.conn] + (self._read_pool.connections() if self._read_pool else [])
+
+    def enable_instrumentation(self, slow_ms=100.0):
+        """
+        Liga a instrumentação (db/instrumentation.py): latência e nº de comandos
+        SQL por método público, latência por comando e log de comandos lentos
+        (>= slow_ms) com EXPLAIN QUERY PLAN. Retorna o objeto Instrumentation
+        (report(), dump(arquivo), reset()).
+        """
+        if self.instrumentation is None:
+            def explain(sql):
+                conn = sqlite3.connect(self.db_path) if self.db_path != ':memory:' else self.conn
+                try:
+                    return [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+                finally:
+                    if conn is not self.conn:
+                        conn.close()
+            inst = Instrumentation(slow_ms=slow_ms, explain=explain)
+            for nome in self._metodos_instrumentaveis():
+                setattr(self, nome, inst.wrap(nome, getattr(self, nome)))
+            self.instrumentation = inst
+            for conn in self._todas_conexoes():
+                conn.set_trace_callback(inst.trace)
+        return self.instrumentation
+
+    def disable_instrumentation(self):
+        """Desliga a instrumentação e devolve o objeto com as métricas coletadas."""
+        inst, self.instrumentation = self.instrumentation, None
+        if inst is not None:
+            for conn in self._todas_conexoes():
+                conn.set_trace_callback(None)
+            for nome in self._metodos_instrumentaveis():
+                self.__dict__.pop(nome, None)
+        return inst
     
     def close(self):
         """Fecha a conexão com o banco de dados."""
+        if self._read_pool:
+            self._read_pool.close()
         if self.conn:
+            # atualiza as estatísticas do planejador das tabelas consultadas
+            # (ex.: bases novas que cresceram desde a última abertura)
+            try:
+                self.conn.execute('PRAGMA optimize')
+            except sqlite3.Error:
+                pass
             self.conn.close()
             print("Conexão com o banco de dados fechada.")
 
-        # --- MÉTODO NOVO / ATUALIZADO ---
-    def total_stock_value(self):
-        """Calcula o valor total do estoque."""
-        cursor = self.conn.cursor()
-        query = """
-        SELECT SUM(COALESCE(quantidade, 0) * COALESCE(ultima_compra_unitaria, 0)) as total_value
-        FROM produtos;
-        """
-        result = cursor.execute(query).fetchone()
-        
-        # Se não houver produtos, o resultado pode ser None
-        return result['total_value'] if result and result['total_value'] else 0.0
-
-    # --- MÉTODO NOVO / ATUALIZADO ---
-    def compute_sales_and_cogs(self, days=30):
-        """Calcula a receita e o custo estimado (COGS) dos últimos X dias."""
-        cursor = self.conn.cursor()
-        
-        # Query para calcular a receita (Revenue)
-        revenue_query = f"""
-        SELECT SUM(COALESCE(v.quantidade_base, 0) * COALESCE(v.preco_unitario, 0)) as total_revenue
-        FROM vendas v
-        WHERE date(v.data) >= date('now', '-{days} days');
-        """
-        revenue_result = cursor.execute(revenue_query).fetchone()
-        revenue = revenue_result['total_revenue'] if revenue_result and revenue_result['total_revenue'] else 0.0
-
-        # Query para calcular o custo estimado dos produtos vendidos (COGS)
-        cogs_query = f"""
-        SELECT SUM(COALESCE(v.quantidade_base, 0) * COALESCE(p.ultima_compra_unitaria, 0)) as total_cogs
-        FROM vendas v
-        JOIN produtos p ON v.produto_id = p.id
-        WHERE date(v.data) >= date('now', '-{days} days');
-        """
-        cogs_result = cursor.execute(cogs_query).fetchone()
-        cogs = cogs_result['total_cogs'] if cogs_result and cogs_result['total_cogs'] else 0.0
-
-        return {'revenue': revenue, 'cogs_est': cogs}
+    @contextmanager
+    def transaction(self):
+        """
+        Agrupa escritas em uma única transação e entrega um cursor.
+
+        O bloco mais externo faz um único commit (ou rollback em caso de erro);
+        blocos aninhados - por exemplo consume_from_lotes chamado por
+        add_producao - viram SAVEPOINTs, desfeitos isoladamente se falharem.
+        """
+        with self._write_lock:
+            yield from self._transaction()
+
+    def _transaction(self):
+        cur = self.conn.cursor()
+        if self._tx_depth == 0:
+            # BEGIN explícito: sem ele o primeiro SAVEPOINT abriria a transação
+            # e o RELEASE correspondente já faria o commit
+            if not self.conn.in_transaction:
+                cur.execute('BEGIN')
+            self._tx_depth += 1
+            try:
+                yield cur
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                self._descartar_caches()
+                raise
+            finally:
+                self._tx_depth -= 1
+        else:
+            nome = f'sp_{self._tx_depth}'
+            cur.execute(f'SAVEPOINT {nome}')
+            self._tx_depth += 1
+            try:
+                yield cur
+                cur.execute(f'RELEASE SAVEPOINT {nome}')
+            except BaseException:
+                cur.execute(f'ROLLBACK TO SAVEPOINT {nome}')
+                cur.execute(f'RELEASE SAVEPOINT {nome}')
+                # o bloco interno pode ter gravado no catálogo ids que não existem mais
+                self._descartar_caches()
+                raise
+            finally:
+                self._tx_depth -= 1
+
+    def _descartar_caches(self):
+        """Caches podem ter sido recarregados com dados que um rollback desfez."""
+        self._recipe_graph = None
+        self._recipe_cost_cache = {}
+        self._catalogs = {}
 
     def _create_tables(self):
         cur = self.conn.cursor()
@@ -80,7 +233,9 @@ class DBManager:
             unidade_base TEXT NOT NULL,
             quantidade REAL DEFAULT 0,
             ultima_compra_unitaria REAL DEFAULT 0,
-            reorder_level REAL DEFAULT 0
+            reorder_level REAL DEFAULT 0,
+            densidade REAL,
+            peso_unidade REAL
         );
         CREATE TABLE IF NOT EXISTS compras (
             id INTEGER PRIMARY KEY,
@@ -94,6 +249,7 @@ class DBManager:
             data TEXT,
             lote TEXT,
             validade TEXT,
+            data_dia INTEGER,
             FOREIGN KEY(produto_id) REFERENCES produtos(id),
             FOREIGN KEY(fornecedor_id) REFERENCES fornecedores(id)
         );
@@ -104,6 +260,9 @@ class DBManager:
             data_compra TEXT,
             data_validade TEXT,
             lote TEXT,
+            validade_dia INTEGER,
+            custo_unitario REAL,
+            producao_id INTEGER,
             FOREIGN KEY(produto_id) REFERENCES produtos(id)
         );
         CREATE TABLE IF NOT EXISTS receitas (
@@ -119,8 +278,10 @@ class DBManager:
             quantidade_usada REAL,
             unidade TEXT,
             quantidade_base REAL,
+            sub_receita_id INTEGER,
             FOREIGN KEY(receita_id) REFERENCES receitas(id),
-            FOREIGN KEY(produto_id) REFERENCES produtos(id)
+            FOREIGN KEY(produto_id) REFERENCES produtos(id),
+            FOREIGN KEY(sub_receita_id) REFERENCES receitas(id)
         );
         CREATE TABLE IF NOT EXISTS producoes (
             id INTEGER PRIMARY KEY,
@@ -128,6 +289,7 @@ class DBManager:
             quantidade_produzida REAL,
             data TEXT,
             unidade TEXT,
+            custo REAL,
             FOREIGN KEY(receita_id) REFERENCES receitas(id)
         );
         CREATE TABLE IF NOT EXISTS vendas (
@@ -138,6 +300,8 @@ class DBManager:
             preco_unitario REAL,
             data TEXT,
             local TEXT,
+            data_dia INTEGER,
+            custo REAL,
             FOREIGN KEY(produto_id) REFERENCES produtos(id)
         );
         CREATE TABLE IF NOT EXISTS despesas (
@@ -152,7 +316,9 @@ class DBManager:
             data TEXT,
             before_qty REAL,
             after_qty REAL,
-            motivo TEXT
+            motivo TEXT,
+            data_dia INTEGER,
+            custo REAL
         );
         CREATE TABLE IF NOT EXISTS wastes (
             id INTEGER PRIMARY KEY,
@@ -161,21 +327,121 @@ class DBManager:
             quantidade_base REAL,
             unidade TEXT,
             motivo TEXT,
-            data TEXT
+            data TEXT,
+            data_dia INTEGER,
+            custo REAL
+        );
+        -- rastreabilidade: quanto de cada lote foi para cada venda, produção
+        -- ou desperdício (origem, origem_id), gravado junto com o consumo
+        CREATE TABLE IF NOT EXISTS lote_movimentos (
+            id INTEGER PRIMARY KEY,
+            lote_id INTEGER NOT NULL,
+            origem TEXT NOT NULL,
+            origem_id INTEGER NOT NULL,
+            quantidade_base REAL NOT NULL,
+            custo REAL,
+            data TEXT,
+            data_dia INTEGER,
+            FOREIGN KEY(lote_id) REFERENCES lotes(id)
+        );
+
+        -- Índices secundários: as consultas por período comparam a coluna
+        -- diretamente (sem date(...)) para que o SQLite possa usá-los; os
+        -- filtros por período usam as colunas inteiras *_dia, indexadas em
+        -- migrations.DAY_INDEXES.
+        CREATE INDEX IF NOT EXISTS idx_compras_data ON compras(data);
+        CREATE INDEX IF NOT EXISTS idx_compras_fornecedor ON compras(fornecedor_id);
+        CREATE INDEX IF NOT EXISTS idx_lotes_produto_validade ON lotes(produto_id, data_validade);
+        CREATE INDEX IF NOT EXISTS idx_lotes_ativos_fefo ON lotes(produto_id, data_validade, data_compra) WHERE quantidade_base > 0;
+        CREATE INDEX IF NOT EXISTS idx_receita_ing_receita ON receita_ingredientes(receita_id);
+        CREATE INDEX IF NOT EXISTS idx_receita_ing_produto ON receita_ingredientes(produto_id);
+        CREATE INDEX IF NOT EXISTS idx_producoes_receita_data ON producoes(receita_id, data);
+        CREATE INDEX IF NOT EXISTS idx_producoes_data ON producoes(data);
+        -- recall: lote -> consumos (ida) e consumo -> lotes (volta); o índice
+        -- de lotes.producao_id, que liga produções aos lotes gerados, é
+        -- criado em migrations.run_migrations
+        CREATE INDEX IF NOT EXISTS idx_lotes_lote ON lotes(lote);
+        CREATE INDEX IF NOT EXISTS idx_lote_mov_lote ON lote_movimentos(lote_id, origem, origem_id);
+        CREATE INDEX IF NOT EXISTS idx_lote_mov_origem ON lote_movimentos(origem, origem_id);
+
+        -- sem AUTOINCREMENT o id da última linha apagada volta a ser usado:
+        -- os movimentos dela saem junto para não passarem à linha nova
+        -- (producoes: em migrations, junto com lotes.producao_id)
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_delete_movimentos AFTER DELETE ON vendas
+        BEGIN
+            DELETE FROM lote_movimentos WHERE origem = 'venda' AND origem_id = OLD.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_wastes_delete_movimentos AFTER DELETE ON wastes
+        BEGIN
+            DELETE FROM lote_movimentos WHERE origem = 'waste' AND origem_id = OLD.id;
+        END;
+
+        -- produtos.quantidade é mantida incrementalmente a partir dos lotes
+        -- (ver verify_stock_consistency para a auditoria completa).
+        CREATE TRIGGER IF NOT EXISTS trg_lotes_insert_estoque AFTER INSERT ON lotes
+        BEGIN
+            UPDATE produtos SET quantidade = COALESCE(quantidade, 0) + COALESCE(NEW.quantidade_base, 0) WHERE id = NEW.produto_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_lotes_update_estoque AFTER UPDATE OF quantidade_base, produto_id ON lotes
+        BEGIN
+            UPDATE produtos SET quantidade = COALESCE(quantidade, 0) - COALESCE(OLD.quantidade_base, 0) WHERE id = OLD.produto_id;
+            UPDATE produtos SET quantidade = COALESCE(quantidade, 0) + COALESCE(NEW.quantidade_base, 0) WHERE id = NEW.produto_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_lotes_delete_estoque AFTER DELETE ON lotes
+        BEGIN
+            UPDATE produtos SET quantidade = COALESCE(quantidade, 0) - COALESCE(OLD.quantidade_base, 0) WHERE id = OLD.produto_id;
+        END;
+
+        -- Resumo diário de vendas (dia x produto), mantido pelos gatilhos de
+        -- vendas (migrations.VENDAS_DIARIAS_TRIGGERS); dashboard e relatórios
+        -- leem daqui. Ver rebuild_vendas_diarias.
+        CREATE TABLE IF NOT EXISTS vendas_diarias (
+            dia TEXT NOT NULL,
+            produto_id INTEGER NOT NULL,
+            quantidade REAL NOT NULL DEFAULT 0,
+            quantidade_base REAL NOT NULL DEFAULT 0,
+            receita REAL NOT NULL DEFAULT 0,
+            n_vendas INTEGER NOT NULL DEFAULT 0,
+            custo REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, produto_id)
         );
         ''')
         self.conn.commit()
+        run_migrations(self.conn)
+        # sem FTS5/trigram as buscas por nome usam LIKE
+        self.has_search_index = create_search_index(self.conn)
+
+    # ---------------- Cadastros em memória ----------------
+    def catalog(self, table):
+        """
+        Catalog (mapas id -> registro e nome -> id) de 'produtos', 'receitas'
+        ou 'fornecedores', carregado na primeira consulta. Os métodos de
+        escrita deste DBManager o mantêm atualizado; gravações de outras
+        conexões/processos são detectadas por PRAGMA data_version.
+        """
+        with self._write_lock:
+            version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            if version != self._catalog_version:
+                self._catalogs = {}
+                self._catalog_version = version
+            cat = self._catalogs.get(table)
+            if cat is None:
+                cat = self._catalogs[table] = Catalog.load(self.conn, table)
+            return cat
+
+    def _invalidate_catalog(self, *tables):
+        for table in tables:
+            self._catalogs.pop(table, None)
 
     # ---------------- Suppliers ----------------
     def add_or_get_fornecedor(self, nome, contato=None):
-        cur = self.conn.cursor()
-        cur.execute('SELECT id FROM fornecedores WHERE nome = ?', (nome,))
-        r = cur.fetchone()
-        if r:
-            return r['id']
-        cur.execute('INSERT INTO fornecedores (nome, contato) VALUES (?,?)', (nome, contato))
-        self.conn.commit()
-        return cur.lastrowid
+        fid = self.catalog('fornecedores').id_of(nome)
+        if fid is not None:
+            return fid
+        with self.transaction() as cur:
+            cur.execute('INSERT INTO fornecedores (nome, contato) VALUES (?,?)', (nome, contato))
+            self.catalog('fornecedores').add({'id': cur.lastrowid, 'nome': nome, 'contato': contato})
+            return cur.lastrowid
 
     def get_fornecedores(self):
         cur = self.conn.cursor()
@@ -184,70 +450,334 @@ class DBManager:
 
     # ---------------- Produtos ----------------
     def add_or_get_produto(self, nome, unidade_base='un'):
-        cur = self.conn.cursor()
-        cur.execute('SELECT * FROM produtos WHERE nome = ?', (nome,))
-        row = cur.fetchone()
-        if row:
-            return row['id']
-        cur.execute('INSERT INTO produtos (nome, unidade_base) VALUES (?,?)', (nome, unidade_base))
-        self.conn.commit()
-        return cur.lastrowid
+        pid = self.catalog('produtos').id_of(nome)
+        if pid is not None:
+            return pid
+        with self.transaction() as cur:
+            cur.execute('INSERT INTO produtos (nome, unidade_base) VALUES (?,?)', (nome, unidade_base))
+            self.catalog('produtos').add({'id': cur.lastrowid, 'nome': nome, 'unidade_base': unidade_base,
+                                          'densidade': None, 'peso_unidade': None})
+            return cur.lastrowid
 
     def get_produtos(self, like=None):
         cur = self.conn.cursor()
         if like:
-            cur.execute('SELECT * FROM produtos WHERE nome LIKE ? ORDER BY nome', (f'%{like}%',))
+            cond, params = self._nome_filter('produtos', like)
+            cur.execute(f'SELECT * FROM produtos WHERE {cond} ORDER BY nome', params)
         else:
             cur.execute('SELECT * FROM produtos ORDER BY nome')
         return cur.fetchall()
 
+    def get_produtos_page(self, after=None, limit=None, like=None):
+        """
+        Página de produtos por nome (paginação por chave: after é o nome do
+        último produto da página anterior; nome é único e indexado).
+        """
+        where, params = [], []
+        if like:
+            cond, cond_params = self._nome_filter('produtos', like)
+            where.append(cond); params += cond_params
+        if after is not None:
+            where.append('nome > ?'); params.append(after)
+        sql = 'SELECT * FROM produtos'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        cur = self.conn.cursor()
+        cur.execute(sql + ' ORDER BY nome LIMIT ?', params + [limit or self.PAGE_SIZE])
+        return cur.fetchall()
+
+    # ---------------- Busca por nome ----------------
+    @staticmethod
+    def _fts_terms(texto):
+        """Separa o texto (sem acentos) em termos para MATCH (3+ letras) e para LIKE (menores)."""
+        palavras = sem_acentos(texto).split()
+        match = ['"' + p.replace('"', '""') + '"' for p in palavras if len(p) >= 3]
+        curtas = [p for p in palavras if len(p) < 3]
+        return ' AND '.join(match), curtas
+
+    @staticmethod
+    def _like_escape(texto):
+        return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def _nome_filter(self, table, texto):
+        """Condição `id IN (...)` que filtra `table` por nome contendo texto (sem acentos)."""
+        if not self.has_search_index:
+            return "nome LIKE ? ESCAPE '\\'", [f'%{self._like_escape(texto.strip())}%']
+        match, curtas = self._fts_terms(texto)
+        where, params = [], []
+        if match:
+            where.append(f'{table}_fts MATCH ?'); params.append(match)
+        for p in curtas:
+            where.append("nome LIKE ? ESCAPE '\\'"); params.append(f'%{self._like_escape(p)}%')
+        if not where:
+            return '1', []
+        return f"id IN (SELECT rowid FROM {table}_fts WHERE {' AND '.join(where)})", params
+
+    def _search_nomes(self, table, texto, limit):
+        texto = (texto or '').strip()
+        if not texto:
+            return []
+        cur = self.conn.cursor()
+        if not self.has_search_index:
+            cur.execute(f"SELECT * FROM {table} WHERE nome LIKE ? ESCAPE '\\' ORDER BY nome LIKE ? ESCAPE '\\' DESC, nome LIMIT ?",
+                        (f'%{self._like_escape(texto)}%', f'{self._like_escape(texto)}%', limit))
+            return cur.fetchall()
+        match, curtas = self._fts_terms(texto)
+        where, params = [], []
+        if match:
+            where.append(f'{table}_fts MATCH ?'); params.append(match)
+        for p in curtas:
+            where.append("f.nome LIKE ? ESCAPE '\\'"); params.append(f'%{self._like_escape(p)}%')
+        # nomes que começam pelo texto primeiro, depois relevância (bm25) e ordem alfabética
+        rank = f'bm25({table}_fts), ' if match else ''
+        cur.execute(f'''
+            SELECT t.* FROM {table}_fts f JOIN {table} t ON t.id = f.rowid
+            WHERE {' AND '.join(where)}
+            ORDER BY f.nome LIKE ? ESCAPE '\\' DESC, {rank}t.nome
+            LIMIT ?
+        ''', params + [f'{self._like_escape(sem_acentos(texto))}%', limit])
+        return cur.fetchall()
+
+    def search_produtos(self, prefix, limit=20):
+        """
+        Produtos cujo nome contém o texto digitado, ignorando acentos e
+        maiúsculas; os que começam por ele vêm primeiro.
+        """
+        return self._search_nomes('produtos', prefix, limit)
+
+    def search_receitas(self, prefix, limit=20):
+        """Como search_produtos, para receitas."""
+        return self._search_nomes('receitas', prefix, limit)
+
     def get_produto(self, produto_id):
         cur = self.conn.cursor()
         cur.execute('SELECT * FROM produtos WHERE id = ?', (produto_id,))
         return cur.fetchone()
 
-    def set_produto_reorder(self, produto_id, reorder_level):
+    def get_produto_by_nome(self, nome):
         cur = self.conn.cursor()
-        cur.execute('UPDATE produtos SET reorder_level = ? WHERE id = ?', (reorder_level, produto_id))
-        self.conn.commit()
+        cur.execute('SELECT * FROM produtos WHERE nome = ?', (nome,))
+        return cur.fetchone()
+
+    def set_produto_reorder(self, produto_id, reorder_level):
+        with self.transaction() as cur:
+            cur.execute('UPDATE produtos SET reorder_level = ? WHERE id = ?', (reorder_level, produto_id))
+
+    def set_produto_conversao(self, produto_id, densidade=None, peso_unidade=None):
+        """
+        Fatores para converter entre massa, volume e unidades nos próximos
+        lançamentos do produto: densidade em g/ml, peso_unidade em g por
+        unidade (None = não definido). Quantidades já gravadas não mudam.
+        """
+        with self.transaction() as cur:
+            cur.execute('UPDATE produtos SET densidade = ?, peso_unidade = ? WHERE id = ?', (densidade, peso_unidade, produto_id))
+        self._invalidate_catalog('produtos')
+
+    def _quantidade_base_produto(self, produto_id, quantidade, unidade):
+        """Quantidade na unidade base do produto, com os fatores de conversão dele (catalog)."""
+        p = self.catalog('produtos').get(produto_id)
+        if p is None:
+            return UnitConverter.to_base(quantidade, unidade)[0]
+        try:
+            return UnitConverter.to_product_base(quantidade, unidade, p['unidade_base'], p['densidade'], p['peso_unidade'])[0]
+        except ValueError as e:
+            raise ValueError(f"{p['nome']}: {e}")
+
+    @staticmethod
+    def _quantidades_base(quantidades, unidades, prods=None):
+        """
+        Quantidades de um lote de linhas na base de cada produto (prods: linha
+        do catalog por quantidade; None = só to_base). Retorna (quantidades,
+        unidades base) em listas. Usa UnitConverter.to_base_many se houver
+        numpy; sem ele, converte linha a linha com to_product_base.
+        """
+        if prods is None:
+            prods = [{}] * len(quantidades)
+        try:
+            import numpy  # noqa: F401  (to_base_many depende dele)
+        except ImportError:
+            result, bases = [], []
+            for n, (q, u, p) in enumerate(zip(quantidades, unidades, prods), start=1):
+                try:
+                    qb, base = UnitConverter.to_product_base(q, u, p.get('unidade_base'), p.get('densidade'), p.get('peso_unidade'))
+                except ValueError as e:
+                    raise ValueError(f'Item {n}: {e}' if str(e) != 'Quantidade inválida' else str(e))
+                result.append(qb)
+                bases.append(base)
+            return result, bases
+        result, bases = UnitConverter.to_base_many(
+            quantidades, unidades, [p.get('unidade_base') for p in prods],
+            [p.get('densidade') for p in prods], [p.get('peso_unidade') for p in prods])
+        return result.tolist(), bases
 
     # ---------------- Compras e lotes ----------------
     def add_compra(self, produto_nome, quantidade, unidade, preco_total, data_str, lote=None, validade=None, fornecedor_nome=None):
-        cur = self.conn.cursor()
-        try:
-            data_iso = parse_date_input(data_str)
-            validade_iso = parse_date_input(validade) if (validade and str(validade).strip()) else None
-            quantidade_base, unidade_base = UnitConverter.to_base(quantidade, unidade)
+        with self.transaction() as cur:
+            data_iso = parse_date_input(data_str, strict=True)
+            validade_iso = parse_date_input(validade, strict=True) if (validade and str(validade).strip()) else None
+            unidade_base = UnitConverter.to_base(quantidade, unidade)[1]
             produto_id = self.add_or_get_produto(produto_nome, unidade_base)
+            quantidade_base = self._quantidade_base_produto(produto_id, quantidade, unidade)
+            self._ensure_lotes_exist(cur, [produto_id])
             fornecedor_id = None
             if fornecedor_nome:
                 fornecedor_id = self.add_or_get_fornecedor(fornecedor_nome)
-            preco_unitario_base = 0
-            if quantidade_base > 0:
-                try:
-                    preco_dec = (Decimal(str(preco_total)) / Decimal(str(quantidade_base))).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
-                    preco_unitario_base = float(preco_dec)
-                except Exception:
-                    preco_unitario_base = float(preco_total) / float(quantidade_base)
-            cur.execute('INSERT INTO compras (produto_id, fornecedor_id, quantidade, unidade, quantidade_base, preco_total, preco_unitario_base, data, lote, validade) VALUES (?,?,?,?,?,?,?,?,?,?)',
-                        (produto_id, fornecedor_id, quantidade, unidade, quantidade_base, preco_total, preco_unitario_base, data_iso, lote, validade_iso))
+            preco_unitario_base = self._preco_unitario_base(preco_total, quantidade_base)
+            cur.execute(self._INSERT_COMPRA_SQL, (produto_id, fornecedor_id, quantidade, unidade, quantidade_base, preco_total,
+                                                  preco_unitario_base, data_iso, lote, validade_iso, day_number(data_iso)))
             compra_id = cur.lastrowid
-            # criar lote
-            cur.execute('INSERT INTO lotes (produto_id, quantidade_base, data_compra, data_validade, lote) VALUES (?,?,?,?,?)', (produto_id, quantidade_base, data_iso, validade_iso, lote))
-            # atualizar quantidade do produto (soma lotes)
-            cur.execute('SELECT SUM(quantidade_base) as total FROM lotes WHERE produto_id = ?', (produto_id,))
-            total = cur.fetchone()['total'] or 0
-            cur.execute('UPDATE produtos SET quantidade = ?, ultima_compra_unitaria = ? WHERE id = ?', (total, preco_unitario_base, produto_id))
-            self.conn.commit()
+            # criar lote (o gatilho trg_lotes_insert_estoque atualiza produtos.quantidade)
+            cur.execute(self._INSERT_LOTE_SQL, (produto_id, quantidade_base, data_iso, validade_iso, lote, day_number(validade_iso), preco_unitario_base))
+            cur.execute('UPDATE produtos SET ultima_compra_unitaria = ? WHERE id = ?', (preco_unitario_base, produto_id))
+            self._invalidate_recipe_costs_for_produtos([produto_id])
             return compra_id
+
+    @staticmethod
+    def _preco_unitario_base(preco_total, quantidade_base):
+        """Preço por unidade base (4 casas decimais); 0 quando a quantidade é nula."""
+        if quantidade_base <= 0:
+            return 0
+        try:
+            preco_dec = (Decimal(str(preco_total)) / Decimal(str(quantidade_base))).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+            return float(preco_dec)
         except Exception:
-            self.conn.rollback()
-            raise
+            return float(preco_total) / float(quantidade_base)
+
+    def _ids_by_nome(self, cur, table, nomes, insert_sql=None, insert_rows=None):
+        """
+        Resolve {nome: id} para vários nomes de uma vez (fornecedores/produtos)
+        pelo catalog. Os nomes ausentes são inseridos com executemany a partir
+        de insert_rows ({nome: tupla de parâmetros}), sem commit, e entram no
+        catalog.
+        """
+        catalog = self.catalog(table)
+        nomes = list(dict.fromkeys(nomes))
+        ids = {n: catalog.id_of(n) for n in nomes if catalog.id_of(n) is not None}
+        faltando = [n for n in nomes if n not in ids]
+        if faltando and insert_sql:
+            cur.executemany(insert_sql, [insert_rows[n] for n in faltando])
+            cols = ', '.join(CATALOG_COLUMNS[table])
+            for i in range(0, len(faltando), self.BULK_CHUNK):
+                chunk = faltando[i:i + self.BULK_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                cur.execute(f'SELECT {cols} FROM {table} WHERE nome IN ({marks})', chunk)
+                for r in cur.fetchall():
+                    catalog.add(r)
+                    ids[r['nome']] = r['id']
+        return ids
+
+    def add_compras_bulk(self, compras):
+        """
+        Registra várias compras em uma única transação.
+
+        `compras` é um iterável de dicts com as mesmas chaves de add_compra
+        (produto_nome, quantidade, unidade, preco_total, data_str, lote,
+        validade, fornecedor_nome). Produtos e fornecedores são resolvidos
+        em lote, compras e lotes inseridos com executemany e o último preço
+        de cada produto atualizado uma única vez. Retorna o nº de compras.
+        """
+        linhas = []
+        for n, c in enumerate(compras, start=1):
+            if not c.get('produto_nome'):
+                raise ValueError(f'Compra {n}: produto não informado')
+            try:
+                quantidade, preco_total = float(c.get('quantidade')), float(c.get('preco_total'))
+            except (TypeError, ValueError):
+                raise ValueError(f'Compra {n}: preço/quantidade inválido')
+            linhas.append({
+                'produto_nome': c['produto_nome'],
+                'fornecedor_nome': c.get('fornecedor_nome') or None,
+                'quantidade': quantidade,
+                'unidade': c['unidade'],
+                'preco_total': preco_total,
+                'data': c.get('data_str'),
+                'lote': c.get('lote') or None,
+                'validade': c.get('validade'),
+            })
+        if not linhas:
+            return 0
+        # datas de importação se repetem muito: uma conversão por texto distinto
+        datas = parse_dates_many([l['data'] for l in linhas], strict=True)
+        validades = [v if (v and str(v).strip()) else None for v in (l['validade'] for l in linhas)]
+        validades = [None if v is None else iso for v, iso in zip(validades, parse_dates_many(validades, strict=True))]
+        for l, data_iso, validade_iso in zip(linhas, datas, validades):
+            l['data'], l['validade'] = data_iso, validade_iso
+        quantidades = [l['quantidade'] for l in linhas]
+        unidades = [l['unidade'] for l in linhas]
+        # base de cada compra: unidade dos produtos novos
+        _, unidades_base = self._quantidades_base(quantidades, unidades)
+        with self.transaction() as cur:
+            produtos = {}
+            for l, unidade_base in zip(linhas, unidades_base):
+                produtos.setdefault(l['produto_nome'], (l['produto_nome'], unidade_base))
+            produto_ids = self._ids_by_nome(cur, 'produtos', produtos,
+                                            'INSERT INTO produtos (nome, unidade_base) VALUES (?,?)', produtos)
+            fornecedores = {l['fornecedor_nome']: (l['fornecedor_nome'], None) for l in linhas if l['fornecedor_nome']}
+            fornecedor_ids = self._ids_by_nome(cur, 'fornecedores', fornecedores,
+                                               'INSERT INTO fornecedores (nome, contato) VALUES (?,?)', fornecedores)
+            # quantidades na base de cada produto (já existentes podem ter outra dimensão)
+            catalog = self.catalog('produtos')
+            prods = [catalog.get(produto_ids[l['produto_nome']]) for l in linhas]
+            quantidades_base, _ = self._quantidades_base(quantidades, unidades, prods)
+            self._ensure_lotes_exist(cur, set(produto_ids.values()))
+            ultimo_preco = {}
+            compras_rows, lotes_rows = [], []
+            for l, p, quantidade_base in zip(linhas, prods, quantidades_base):
+                pid = p['id']
+                fid = fornecedor_ids.get(l['fornecedor_nome'])
+                preco_unitario_base = self._preco_unitario_base(l['preco_total'], quantidade_base)
+                compras_rows.append((pid, fid, l['quantidade'], l['unidade'], quantidade_base, l['preco_total'],
+                                     preco_unitario_base, l['data'], l['lote'], l['validade'], day_number(l['data'])))
+                lotes_rows.append((pid, quantidade_base, l['data'], l['validade'], l['lote'], day_number(l['validade']), preco_unitario_base))
+                ultimo_preco[pid] = preco_unitario_base
+            cur.executemany(self._INSERT_COMPRA_SQL, compras_rows)
+            cur.executemany(self._INSERT_LOTE_SQL, lotes_rows)
+            # quantidade já veio dos gatilhos; resta o último preço de cada produto tocado
+            cur.executemany('UPDATE produtos SET ultima_compra_unitaria = ? WHERE id = ?',
+                            [(preco, pid) for pid, preco in ultimo_preco.items()])
+            self._invalidate_recipe_costs_for_produtos(ultimo_preco)
+            return len(compras_rows)
+
+    def import_compras_csv(self, filename, delimiter=','):
+        """
+        Importa compras de um CSV com cabeçalho
+        produto,quantidade,unidade,preco_total,data[,lote,validade,fornecedor].
+        Todas as linhas entram em uma única transação (ver add_compras_bulk).
+        """
+        with open(filename, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f, delimiter=delimiter)
+            compras = ({
+                'produto_nome': (r.get('produto') or '').strip(),
+                'quantidade': r.get('quantidade'),
+                'unidade': (r.get('unidade') or '').strip(),
+                'preco_total': r.get('preco_total'),
+                'data_str': r.get('data'),
+                'lote': (r.get('lote') or '').strip() or None,
+                'validade': r.get('validade'),
+                'fornecedor_nome': (r.get('fornecedor') or '').strip() or None,
+            } for r in reader)
+            return self.add_compras_bulk(compras)
 
     def get_compras_recent(self, months=3):
         cur = self.conn.cursor()
-        since = (datetime.now() - timedelta(days=30*months)).strftime(ISO_DATE_FMT)
-        cur.execute('SELECT c.*, p.nome as produto_nome, f.nome as fornecedor_nome FROM compras c LEFT JOIN produtos p ON c.produto_id=p.id LEFT JOIN fornecedores f ON c.fornecedor_id = f.id WHERE date(c.data) >= ? ORDER BY c.data DESC', (since,))
+        since = today_number() - 30*months
+        cur.execute('SELECT c.*, p.nome as produto_nome, f.nome as fornecedor_nome FROM compras c LEFT JOIN produtos p ON c.produto_id=p.id LEFT JOIN fornecedores f ON c.fornecedor_id = f.id WHERE c.data_dia >= ? ORDER BY c.data DESC', (since,))
+        return cur.fetchall()
+
+    def get_compras_recent_page(self, months=3, after=None, limit=None):
+        """
+        Página de get_compras_recent, da mais recente para a mais antiga.
+        after é (data, id) da última compra da página anterior; a janela é a
+        mesma de get_compras_recent (data_dia), (data, id) só ordena as páginas.
+        """
+        since = today_number() - 30*months
+        sql = 'SELECT c.*, p.nome as produto_nome, f.nome as fornecedor_nome FROM compras c LEFT JOIN produtos p ON c.produto_id=p.id LEFT JOIN fornecedores f ON c.fornecedor_id = f.id WHERE c.data_dia >= ?'
+        params = [since]
+        if after is not None:
+            sql += ' AND (c.data, c.id) < (?, ?)'
+            params += list(after)
+        cur = self.conn.cursor()
+        cur.execute(sql + ' ORDER BY c.data DESC, c.id DESC LIMIT ?', params + [limit or self.PAGE_SIZE])
         return cur.fetchall()
 
     def get_last_price_for_produto(self, produto_id):
@@ -258,113 +788,202 @@ class DBManager:
 
     def get_average_price_last_months(self, produto_id, months=3):
         cur = self.conn.cursor()
-        since = (datetime.now() - timedelta(days=30*months)).strftime(ISO_DATE_FMT)
-        cur.execute('SELECT AVG(preco_unitario_base) as media FROM compras WHERE produto_id = ? AND date(data) >= ?', (produto_id, since))
+        since = today_number() - 30*months
+        cur.execute('SELECT AVG(preco_unitario_base) as media FROM compras WHERE produto_id = ? AND data_dia >= ?', (produto_id, since))
         r = cur.fetchone()
         return r['media'] if r and r['media'] is not None else 0
 
     # ---------------- Lotes consumption (FEFO/FIFO) ----------------
+    def _ensure_lotes_exist(self, cur, produto_ids):
+        """
+        Cria um lote 'legacy' para produtos com quantidade mas sem nenhum lote
+        (dados anteriores ao controle por lotes). Não faz commit.
+        """
+        ids = list(produto_ids)
+        for i in range(0, len(ids), self.BULK_CHUNK):
+            chunk = ids[i:i + self.BULK_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            cur.execute(f'SELECT p.id, p.quantidade, p.ultima_compra_unitaria FROM produtos p WHERE p.id IN ({marks}) AND p.quantidade > 0 AND NOT EXISTS (SELECT 1 FROM lotes l WHERE l.produto_id = p.id)', chunk)
+            legacy = [(r['id'], r['quantidade'], r['ultima_compra_unitaria']) for r in cur.fetchall()]
+            if legacy:
+                # o gatilho de inserção soma o lote à quantidade: zera antes para não duplicar
+                cur.executemany('UPDATE produtos SET quantidade = 0 WHERE id = ?', [(pid,) for pid, _, _ in legacy])
+                cur.executemany("INSERT INTO lotes (produto_id, quantidade_base, data_compra, data_validade, lote, custo_unitario) VALUES (?,?,NULL,NULL,'legacy',?)", legacy)
+
     def _ensure_lotes_exist_for_produto(self, produto_id):
-        cur = self.conn.cursor()
-        cur.execute('SELECT COUNT(*) as cnt FROM lotes WHERE produto_id = ?', (produto_id,))
-        if cur.fetchone()['cnt'] == 0:
-            prod = self.get_produto(produto_id)
-            if prod and prod['quantidade'] > 0:
-                cur.execute('INSERT INTO lotes (produto_id, quantidade_base, data_compra, data_validade, lote) VALUES (?,?,?,?,?)', (produto_id, prod['quantidade'], None, None, 'legacy'))
-                self.conn.commit()
+        with self.transaction() as cur:
+            self._ensure_lotes_exist(cur, [produto_id])
+
+    # lotes sem custo (gravados fora do DBManager) valem o último preço de compra
+    _FEFO_LOTES_SQL = '''SELECT l.id, l.quantidade_base, COALESCE(l.custo_unitario, p.ultima_compra_unitaria, 0) as custo_unitario
+                         FROM lotes l JOIN produtos p ON p.id = l.produto_id
+                         WHERE l.produto_id = ? AND l.quantidade_base > 0
+                         ORDER BY CASE WHEN l.data_validade IS NULL THEN 1 ELSE 0 END, l.data_validade ASC, l.data_compra ASC'''
 
-    def consume_from_lotes(self, produto_id, quantidade_base, motivo=None):
+    @staticmethod
+    def _plan_fefo(lotes, need):
+        """
+        Percorre os lotes (já em ordem FEFO) retirando `need`.
+        Retorna ([(qtd_retirada, lote_id), ...], quantidade que faltou,
+        [custo unitário de cada retirada]).
+        """
+        takes, custos = [], []
+        for r in lotes:
+            if need <= 1e-9:
+                break
+            take = min(r['quantidade_base'], need)
+            takes.append((take, r['id']))
+            custos.append(float(r['custo_unitario'] or 0))
+            need -= take
+        return takes, need, custos
+
+    @staticmethod
+    def _dividir_em_sequencia(takes, custos, quantidades):
+        """
+        Divide as retiradas de _plan_fefo entre as quantidades de
+        `quantidades`, em sequência (as primeiras levam os lotes que vencem
+        antes). Retorna, para cada quantidade, [(lote_id, qtd, custo), ...].
+        """
+        resultado, i = [], 0
+        resto = takes[0][0] if takes else 0.0
+        for q in quantidades:
+            partes = []
+            while q > 1e-9 and i < len(takes):
+                t = min(q, resto)
+                partes.append((takes[i][1], t, t * custos[i]))
+                q -= t
+                resto -= t
+                if resto <= 1e-9:
+                    i += 1
+                    resto = takes[i][0] if i < len(takes) else 0.0
+            resultado.append(partes)
+        return resultado
+
+    def _registrar_movimentos(self, cur, origem, origem_id, data_iso, retiradas):
+        """Grava em lote_movimentos as retiradas [(lote_id, qtd, custo), ...] de um consumo."""
+        dia = day_number(data_iso)
+        cur.executemany(self._INSERT_MOVIMENTO_SQL, [(lote_id, origem, origem_id, qtd, custo, data_iso, dia)
+                                                    for lote_id, qtd, custo in retiradas])
+
+    def consume_from_lotes(self, produto_id, quantidade_base, motivo=None, origem=None, origem_id=None, data_str=None):
+        """
+        Retira quantidade_base dos lotes do produto em ordem FEFO e registra o
+        ajuste com o custo efetivo (custo_unitario de cada lote retirado).
+        Retorna esse custo. Com origem ('venda', 'producao' ou 'waste') e
+        origem_id, grava também em lote_movimentos quanto saiu de cada lote.
+        """
         if quantidade_base <= 0:
-            return
-        self._ensure_lotes_exist_for_produto(produto_id)
-        cur = self.conn.cursor()
-        try:
-            cur.execute('SELECT SUM(quantidade_base) as total FROM lotes WHERE produto_id = ?', (produto_id,))
-            before_total = float(cur.fetchone()['total'] or 0)
+            return 0.0
+        with self.transaction() as cur:
+            self._ensure_lotes_exist(cur, [produto_id])
+            cur.execute('SELECT quantidade FROM produtos WHERE id = ?', (produto_id,))
+            row = cur.fetchone()
+            if row is None:
+                raise ValueError('Produto não encontrado')
+            before_total = float(row['quantidade'] or 0)
             need = float(quantidade_base)
-            cur.execute('SELECT id, quantidade_base FROM lotes WHERE produto_id = ? AND quantidade_base > 0 ORDER BY CASE WHEN data_validade IS NULL THEN 1 ELSE 0 END, data_validade ASC, data_compra ASC', (produto_id,))
-            rows = cur.fetchall()
-            for r in rows:
-                if need <= 1e-9:
-                    break
-                take = min(r['quantidade_base'], need)
-                cur.execute('UPDATE lotes SET quantidade_base = quantidade_base - ? WHERE id = ?', (take, r['id']))
-                need -= take
+            cur.execute(self._FEFO_LOTES_SQL, (produto_id,))
+            takes, need, custos = self._plan_fefo(cur.fetchall(), need)
+            cur.executemany('UPDATE lotes SET quantidade_base = quantidade_base - ? WHERE id = ?', takes)
             if need > 1e-6:
-                self.conn.rollback()
                 raise ValueError('Estoque insuficiente (por lotes). Necessário: {:.4f}'.format(quantidade_base))
-            cur.execute('SELECT SUM(quantidade_base) as total FROM lotes WHERE produto_id = ?', (produto_id,))
-            after_total = float(cur.fetchone()['total'] or 0)
-            cur.execute('UPDATE produtos SET quantidade = ? WHERE id = ?', (after_total, produto_id))
-            cur.execute('INSERT INTO stock_adjustments (produto_id, data, before_qty, after_qty, motivo) VALUES (?,?,?,?,?)', (produto_id, datetime.now().strftime(ISO_DATE_FMT), before_total, after_total, motivo or 'consumo'))
-            self.conn.commit()
-        except Exception:
-            self.conn.rollback()
-            raise
+            after_total = before_total - float(quantidade_base)
+            custo = sum(t * c for (t, _), c in zip(takes, custos))
+            # ajuste e movimentos com a data da operação (venda/produção retroativa)
+            data_iso = parse_date_input(data_str, strict=True)
+            cur.execute(self._INSERT_AJUSTE_SQL, (produto_id, data_iso, before_total, after_total, motivo or 'consumo', day_number(data_iso), custo))
+            if origem is not None:
+                self._registrar_movimentos(cur, origem, origem_id, data_iso,
+                                           [(lote_id, t, t * c) for (t, lote_id), c in zip(takes, custos)])
+            return custo
 
     # ---------------- Waste tracking ----------------
     def add_waste(self, produto_id, quantidade, unidade, motivo, data_str=None):
-        cur = self.conn.cursor()
-        try:
-            data_iso = parse_date_input(data_str or datetime.now().strftime('%d/%m/%Y'))
-            quantidade_base, _ = UnitConverter.to_base(quantidade, unidade)
+        with self.transaction() as cur:
+            data_iso = parse_date_input(data_str, strict=True)
             prod = self.get_produto(produto_id)
             if not prod:
                 raise ValueError('Produto não encontrado')
+            quantidade_base = self._quantidade_base_produto(produto_id, quantidade, unidade)
             if (prod['quantidade'] or 0) < quantidade_base - 1e-9:
                 raise ValueError('Estoque insuficiente para registrar desperdício')
-            self.consume_from_lotes(produto_id, quantidade_base, motivo='waste:'+ (motivo or ''))
-            cur.execute('INSERT INTO wastes (produto_id, quantidade, quantidade_base, unidade, motivo, data) VALUES (?,?,?,?,?,?)', (produto_id, quantidade, quantidade_base, unidade, motivo, data_iso))
-            self.conn.commit()
-            return cur.lastrowid
-        except Exception:
-            self.conn.rollback()
-            raise
+            # a linha vem antes do consumo para que lote_movimentos aponte para o id dela
+            cur.execute('INSERT INTO wastes (produto_id, quantidade, quantidade_base, unidade, motivo, data, data_dia, custo) VALUES (?,?,?,?,?,?,?,0)', (produto_id, quantidade, quantidade_base, unidade, motivo, data_iso, day_number(data_iso)))
+            waste_id = cur.lastrowid
+            custo = self.consume_from_lotes(produto_id, quantidade_base, motivo='waste:'+ (motivo or ''), origem='waste', origem_id=waste_id, data_str=data_iso)
+            cur.execute('UPDATE wastes SET custo = ? WHERE id = ?', (custo, waste_id))
+            return waste_id
 
     def get_waste_recent(self, days=30):
         cur = self.conn.cursor()
-        since = (datetime.now() - timedelta(days=days)).strftime(ISO_DATE_FMT)
-        cur.execute('SELECT w.*, p.nome FROM wastes w JOIN produtos p ON w.produto_id=p.id WHERE date(w.data) >= ? ORDER BY w.data DESC', (since,))
+        since = today_number() - days
+        cur.execute('SELECT w.*, p.nome FROM wastes w JOIN produtos p ON w.produto_id=p.id WHERE w.data_dia >= ? ORDER BY w.data DESC', (since,))
         return cur.fetchall()
 
     # ---------------- Receitas / ingredientes ----------------
 
     def add_receita(self, nome, rendimento, unidade_resultado='un'):
-        cur = self.conn.cursor()
-        try:
+        with self.transaction() as cur:
             # verifica duplicado
-            cur.execute('SELECT id FROM receitas WHERE nome = ?', (nome,))
-            if cur.fetchone():
+            if self.catalog('receitas').id_of(nome) is not None:
                 raise ValueError(f"A receita '{nome}' já existe")
             cur.execute('INSERT INTO receitas (nome, rendimento, unidade_resultado) VALUES (?,?,?)', (nome, rendimento, unidade_resultado))
-            self.conn.commit()
+            self.catalog('receitas').add({'id': cur.lastrowid, 'nome': nome, 'rendimento': rendimento, 'unidade_resultado': unidade_resultado})
+            self._invalidate_recipe_costs([cur.lastrowid])
             return cur.lastrowid
-        except Exception:
-            self.conn.rollback()
-            raise
 
     def update_receita(self, receita_id, nome, rendimento):
-        cur = self.conn.cursor()
-        cur.execute('UPDATE receitas SET nome=?, rendimento=? WHERE id=?', (nome, rendimento, receita_id))
-        self.conn.commit()
+        with self.transaction() as cur:
+            cur.execute('UPDATE receitas SET nome=?, rendimento=? WHERE id=?', (nome, rendimento, receita_id))
+        self._invalidate_catalog('receitas')
+        self._invalidate_recipe_costs([receita_id])
 
     def delete_receita(self, receita_id):
         cur = self.conn.cursor()
-        cur.execute('DELETE FROM receita_ingredientes WHERE receita_id=?', (receita_id,))
-        cur.execute('DELETE FROM receitas WHERE id=?', (receita_id,))
-        self.conn.commit()
+        cur.execute('SELECT DISTINCT r.nome FROM receita_ingredientes ri JOIN receitas r ON r.id = ri.receita_id WHERE ri.sub_receita_id = ?', (receita_id,))
+        usos = [r['nome'] for r in cur.fetchall()]
+        if usos:
+            raise ValueError('Receita usada como sub-receita em: ' + ', '.join(usos))
+        with self.transaction() as cur:
+            cur.execute('DELETE FROM receita_ingredientes WHERE receita_id=?', (receita_id,))
+            cur.execute('DELETE FROM receitas WHERE id=?', (receita_id,))
+        self._invalidate_catalog('receitas')
+        self._recipe_graph = None
+        self._invalidate_recipe_costs([receita_id])
 
     def add_receita_ingrediente(self, receita_id, produto_nome, quantidade, unidade):
-        cur = self.conn.cursor()
-        try:
-            quantidade_base, unidade_base = UnitConverter.to_base(quantidade, unidade)
+        with self.transaction() as cur:
+            unidade_base = UnitConverter.to_base(quantidade, unidade)[1]
             produto_id = self.add_or_get_produto(produto_nome, unidade_base)
+            quantidade_base = self._quantidade_base_produto(produto_id, quantidade, unidade)
             cur.execute('INSERT INTO receita_ingredientes (receita_id, produto_id, quantidade_usada, unidade, quantidade_base) VALUES (?,?,?,?,?)', (receita_id, produto_id, quantidade, unidade, quantidade_base))
-            self.conn.commit()
+            self._invalidate_recipe_costs([receita_id])
+            return cur.lastrowid
+
+    def add_receita_sub_receita(self, receita_id, sub_receita_id, quantidade, unidade):
+        """
+        Usa outra receita como ingrediente (ex.: "Massa" dentro de "Bolo").
+        `quantidade`/`unidade` referem-se ao resultado da sub-receita; o valor
+        gravado em quantidade_base fica na unidade_resultado dela, para que
+        quantidade_base / rendimento seja a fração de uma fornada.
+        Recusa referências que criariam um ciclo.
+        """
+        with self.transaction() as cur:
+            cur.execute('SELECT id, nome, unidade_resultado FROM receitas WHERE id IN (?,?)', (receita_id, sub_receita_id))
+            receitas = {r['id']: r for r in cur.fetchall()}
+            if receita_id not in receitas or sub_receita_id not in receitas:
+                raise ValueError('Receita não encontrada')
+            if self._reaches(sub_receita_id, receita_id):
+                raise ValueError(f"'{receitas[sub_receita_id]['nome']}' não pode ser usada em '{receitas[receita_id]['nome']}': ciclo entre receitas")
+            q_base, u_base = UnitConverter.to_base(quantidade, unidade)
+            fator, u_resultado = UnitConverter.to_base(1, receitas[sub_receita_id]['unidade_resultado'] or 'un')
+            if u_base != u_resultado:
+                raise ValueError(f"Unidade '{unidade}' incompatível com o resultado de '{receitas[sub_receita_id]['nome']}'")
+            cur.execute('INSERT INTO receita_ingredientes (receita_id, sub_receita_id, quantidade_usada, unidade, quantidade_base) VALUES (?,?,?,?,?)',
+                        (receita_id, sub_receita_id, quantidade, unidade, q_base / fator))
+            self._recipe_graph = None
+            self._invalidate_recipe_costs([receita_id])
             return cur.lastrowid
-        except Exception:
-            self.conn.rollback()
-            raise
 
     def get_receitas(self):
         cur = self.conn.cursor()
@@ -377,29 +996,307 @@ class DBManager:
                        FROM receita_ingredientes ri JOIN produtos p ON ri.produto_id = p.id WHERE ri.receita_id = ?''', (receita_id,))
         return cur.fetchall()
 
+    def get_receita_sub_receitas(self, receita_id):
+        """Sub-receitas usadas pela receita, com o produto gerado pela produção delas (se houver)."""
+        cur = self.conn.cursor()
+        cur.execute('''SELECT ri.*, s.nome as sub_receita_nome, s.rendimento as sub_rendimento, s.unidade_resultado as sub_unidade_resultado,
+                              p.id as sub_produto_id, p.quantidade as sub_produto_qtd_atual
+                       FROM receita_ingredientes ri
+                       JOIN receitas s ON s.id = ri.sub_receita_id
+                       LEFT JOIN produtos p ON p.nome = s.nome
+                       WHERE ri.receita_id = ?''', (receita_id,))
+        return cur.fetchall()
+
+    # ---------------- Custo de receitas (DAG de sub-receitas) ----------------
+    def _get_recipe_graph(self):
+        """Arestas receita -> sub-receita, em cache até a próxima alteração de estrutura."""
+        if self._recipe_graph is None:
+            subs, parents = {}, {}
+            cur = self.conn.cursor()
+            cur.execute('SELECT receita_id, sub_receita_id, quantidade_base FROM receita_ingredientes WHERE sub_receita_id IS NOT NULL')
+            for r in cur.fetchall():
+                subs.setdefault(r['receita_id'], []).append((r['sub_receita_id'], float(r['quantidade_base'] or 0)))
+                parents.setdefault(r['sub_receita_id'], set()).add(r['receita_id'])
+            self._recipe_graph = {'subs': subs, 'parents': parents}
+        return self._recipe_graph
+
+    def _reaches(self, origem, destino):
+        """True se `destino` é alcançável a partir de `origem` pelas sub-receitas."""
+        subs = self._get_recipe_graph()['subs']
+        stack, seen = [origem], set()
+        while stack:
+            rid = stack.pop()
+            if rid == destino:
+                return True
+            if rid in seen:
+                continue
+            seen.add(rid)
+            stack.extend(s for s, _ in subs.get(rid, ()))
+        return False
+
+    def _with_ancestors(self, receita_ids):
+        """As receitas dadas mais todas as que as usam, direta ou indiretamente."""
+        parents = self._get_recipe_graph()['parents']
+        result, stack = set(), list(receita_ids)
+        while stack:
+            rid = stack.pop()
+            if rid in result:
+                continue
+            result.add(rid)
+            stack.extend(parents.get(rid, ()))
+        return result
+
+    def _query_recipe_costs(self, since, receita_ids=None):
+        """
+        Custo direto (só produtos, sem sub-receitas) de várias receitas em uma
+        única consulta agrupada. O preço de cada ingrediente é o último preço de
+        compra ou, se zero, a média das compras desde `since`.
+        Retorna {receita_id: (custo_direto, rendimento)}.
+        """
+        filtro, params = '', [day_number(since)]
+        if receita_ids is not None:
+            filtro = 'WHERE r.id IN ({})'.format(','.join('?' * len(receita_ids)))
+            params.extend(receita_ids)
+        cur = self.conn.cursor()
+        cur.execute(f'''
+            WITH media AS (
+                SELECT produto_id, AVG(preco_unitario_base) as media
+                FROM compras
+                WHERE data_dia >= ? AND produto_id IN (SELECT produto_id FROM receita_ingredientes)
+                GROUP BY produto_id
+            )
+            SELECT r.id, r.rendimento,
+                   COALESCE(SUM(COALESCE(ri.quantidade_base, 0) * COALESCE(NULLIF(p.ultima_compra_unitaria, 0), m.media, 0)), 0) as total_cost
+            FROM receitas r
+            LEFT JOIN receita_ingredientes ri ON ri.receita_id = r.id AND ri.produto_id IS NOT NULL
+            LEFT JOIN produtos p ON p.id = ri.produto_id
+            LEFT JOIN media m ON m.produto_id = ri.produto_id
+            {filtro}
+            GROUP BY r.id
+        ''', params)
+        return {r['id']: (float(r['total_cost']), float(r['rendimento'] or 0)) for r in cur.fetchall()}
+
+    def _recipe_cost_entry(self, use_avg_months):
+        since = (datetime.now() - timedelta(days=30*use_avg_months)).strftime(ISO_DATE_FMT)
+        key = (use_avg_months, since)
+        if key not in self._recipe_cost_cache:
+            # a janela da média mudou (novo dia): descarta entradas antigas
+            self._recipe_cost_cache = {k: v for k, v in self._recipe_cost_cache.items() if k[0] != use_avg_months}
+            self._recipe_cost_cache[key] = {'since': since, 'direct': {}, 'costs': {}, 'dirty': set(), 'complete': False}
+        return self._recipe_cost_cache[key]
+
+    def _invalidate_recipe_costs(self, receita_ids):
+        """Marca as receitas e as que dependem delas (sub-receitas) para recálculo."""
+        if not self._recipe_cost_cache:
+            return
+        afetadas = self._with_ancestors(receita_ids)
+        for entry in self._recipe_cost_cache.values():
+            for rid in afetadas:
+                entry['costs'].pop(rid, None)
+                entry['dirty'].add(rid)
+
+    def _invalidate_recipe_costs_for_produtos(self, produto_ids):
+        """Invalida apenas as receitas que usam algum dos produtos."""
+        ids = list(produto_ids)
+        if not self._recipe_cost_cache or not ids:
+            return
+        cur = self.conn.cursor()
+        receitas = set()
+        for i in range(0, len(ids), self.BULK_CHUNK):
+            chunk = ids[i:i + self.BULK_CHUNK]
+            cur.execute('SELECT DISTINCT receita_id FROM receita_ingredientes WHERE produto_id IN ({})'.format(','.join('?' * len(chunk))), chunk)
+            receitas.update(r['receita_id'] for r in cur.fetchall())
+        self._invalidate_recipe_costs(receitas)
+
+    def _refresh_recipe_costs(self, entry):
+        """
+        Atualiza o cache: busca o custo direto das receitas sujas e refaz o
+        custo total delas percorrendo o DAG de sub-receitas. Cada sub-receita
+        é avaliada uma única vez; as receitas limpas reaproveitam o cache.
+        """
+        direct, costs = entry['direct'], entry['costs']
+        if not entry['complete']:
+            direct.clear()
+            direct.update(self._query_recipe_costs(entry['since']))
+            costs.clear()
+            entry['complete'] = True
+        elif entry['dirty']:
+            dirty = list(entry['dirty'])
+            for i in range(0, len(dirty), self.BULK_CHUNK):
+                chunk = dirty[i:i + self.BULK_CHUNK]
+                atual = self._query_recipe_costs(entry['since'], chunk)
+                for rid in chunk:
+                    if rid in atual:
+                        direct[rid] = atual[rid]
+                    else:
+                        direct.pop(rid, None)  # receita removida
+        else:
+            return
+        entry['dirty'].clear()
+        subs = self._get_recipe_graph()['subs']
+        em_avaliacao = set()
+
+        def total(rid):
+            if rid in costs:
+                return costs[rid]['total_cost']
+            if rid in em_avaliacao:
+                raise ValueError('Ciclo entre receitas')
+            em_avaliacao.add(rid)
+            custo, rendimento = direct[rid]
+            for sub_id, qtd in subs.get(rid, ()):
+                sub_rend = direct[sub_id][1]
+                custo += (qtd / sub_rend if sub_rend else qtd) * total(sub_id)
+            em_avaliacao.discard(rid)
+            costs[rid] = {'total_cost': custo, 'cost_per_unit': custo / rendimento if rendimento else custo}
+            return custo
+
+        for rid in direct:
+            total(rid)
+
+    def compute_all_recipe_costs(self, use_avg_months=3):
+        """
+        Custo total e por unidade de todas as receitas: {receita_id: {'total_cost', 'cost_per_unit'}}.
+        Inclui o custo das sub-receitas. O resultado fica em cache; compras e
+        alterações de receitas invalidam apenas as receitas afetadas (e as que
+        as usam), que são recalculadas na próxima chamada.
+        """
+        entry = self._recipe_cost_entry(use_avg_months)
+        self._refresh_recipe_costs(entry)
+        return {rid: dict(c) for rid, c in entry['costs'].items()}
+
     def compute_recipe_cost(self, receita_id, use_avg_months=3):
+        entry = self._recipe_cost_entry(use_avg_months)
+        self._refresh_recipe_costs(entry)
+        cost = entry['costs'].get(receita_id)
+        if cost is None:
+            raise ValueError('Receita não encontrada')
+        return dict(cost)
+
+    def get_receita_requirements(self, receita_id, quantidade=None):
+        """
+        Necessidade total de produtos (em unidade base) para produzir `quantidade`
+        (na unidade_resultado; padrão: uma fornada), expandindo as sub-receitas.
+        Retorna {produto_id: quantidade_base}.
+        """
         cur = self.conn.cursor()
-        cur.execute('SELECT rendimento FROM receitas WHERE id = ?', (receita_id,))
-        r = cur.fetchone()
-        if not r:
+        subs = self._get_recipe_graph()['subs']
+        receitas = self._descendants(receita_id)
+        marks = ','.join('?' * len(receitas))
+        cur.execute(f'SELECT id, rendimento FROM receitas WHERE id IN ({marks})', list(receitas))
+        rendimentos = {r['id']: float(r['rendimento'] or 0) for r in cur.fetchall()}
+        if receita_id not in rendimentos:
             raise ValueError('Receita não encontrada')
-        rendimento = float(r['rendimento'])
-        total_cost = 0.0
-        ingredientes = self.get_receita_ingredientes(receita_id)
+        cur.execute(f'SELECT receita_id, produto_id, quantidade_base FROM receita_ingredientes WHERE produto_id IS NOT NULL AND receita_id IN ({marks})', list(receitas))
+        diretos = {}
+        for r in cur.fetchall():
+            diretos.setdefault(r['receita_id'], []).append((r['produto_id'], float(r['quantidade_base'] or 0)))
+        memo = {}
+
+        def por_fornada(rid):
+            if rid not in memo:
+                req = {}
+                for pid, qtd in diretos.get(rid, ()):
+                    req[pid] = req.get(pid, 0.0) + qtd
+                for sub_id, qtd in subs.get(rid, ()):
+                    sub_rend = rendimentos[sub_id]
+                    frac = qtd / sub_rend if sub_rend else qtd
+                    for pid, q in por_fornada(sub_id).items():
+                        req[pid] = req.get(pid, 0.0) + frac * q
+                memo[rid] = req
+            return memo[rid]
+
+        rendimento = rendimentos[receita_id]
+        fator = float(quantidade) / rendimento if (quantidade is not None and rendimento) else 1.0
+        return {pid: q * fator for pid, q in por_fornada(receita_id).items()}
+
+    def _descendants(self, receita_id):
+        subs = self._get_recipe_graph()['subs']
+        result, stack = set(), [receita_id]
+        while stack:
+            rid = stack.pop()
+            if rid in result:
+                continue
+            result.add(rid)
+            stack.extend(s for s, _ in subs.get(rid, ()))
+        return result
+
+    # ---------------- Planejamento de produção ----------------
+    def max_producible(self):
+        """
+        Quanto é possível produzir de cada receita com o estoque atual.
+
+        Monta de uma vez a matriz receita x ingrediente (quantidade por fornada)
+        e o vetor de estoque, e calcula com NumPy, para todas as receitas ao
+        mesmo tempo, o nº máximo de fornadas e o ingrediente limitante.
+        Sub-receitas contam com o estoque do produto gerado pela produção
+        delas, como em add_producao.
+        Retorna {receita_id: {'nome', 'max_fornadas', 'max_quantidade',
+        'unidade_resultado', 'limitante'}}.
+        """
+        import numpy as np  # usado só pelo planejador
+
+        cur = self.conn.cursor()
+        cur.execute('SELECT id, nome, rendimento, unidade_resultado FROM receitas ORDER BY id')
+        receitas = cur.fetchall()
+        if not receitas:
+            return {}
+        cur.execute('''
+            SELECT ri.receita_id, ri.quantidade_base,
+                   COALESCE(ri.produto_id, ps.id) as produto_id,
+                   ri.sub_receita_id, COALESCE(p.nome, s.nome) as nome
+            FROM receita_ingredientes ri
+            LEFT JOIN produtos p ON p.id = ri.produto_id
+            LEFT JOIN receitas s ON s.id = ri.sub_receita_id
+            LEFT JOIN produtos ps ON ps.nome = s.nome
+        ''')
+        ingredientes = cur.fetchall()
+        cur.execute('SELECT id, quantidade FROM produtos')
+        estoque_por_id = {r['id']: float(r['quantidade'] or 0) for r in cur.fetchall()}
+
+        linha = {r['id']: i for i, r in enumerate(receitas)}
+        colunas, nomes = {}, []
+        rows, cols, qtds = [], [], []
         for ing in ingredientes:
-            preco = ing['preco_unit_base'] or 0
-            if preco == 0:
-                media = self.get_average_price_last_months(ing['produto_id'], months=use_avg_months)
-                preco = media or 0
-            total_cost += float(ing['quantidade_base'] or 0) * float(preco or 0)
-        cost_per_unit = total_cost / rendimento if rendimento else total_cost
-        return {'total_cost': total_cost, 'cost_per_unit': cost_per_unit}
+            if ing['receita_id'] not in linha:
+                continue
+            # sub-receita ainda não produzida: coluna própria com estoque zero
+            chave = ing['produto_id'] if ing['produto_id'] is not None else ('receita', ing['sub_receita_id'])
+            if chave not in colunas:
+                colunas[chave] = len(nomes)
+                nomes.append(ing['nome'])
+            rows.append(linha[ing['receita_id']])
+            cols.append(colunas[chave])
+            qtds.append(float(ing['quantidade_base'] or 0))
+
+        matriz = np.zeros((len(receitas), max(len(nomes), 1)))
+        np.add.at(matriz, (np.array(rows, dtype=int), np.array(cols, dtype=int)), np.array(qtds))
+        estoque = np.zeros(matriz.shape[1])
+        for chave, c in colunas.items():
+            estoque[c] = max(estoque_por_id.get(chave, 0.0), 0.0)
+        usa = matriz > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            razao = np.where(usa, estoque / np.where(usa, matriz, 1.0), np.inf)
+        limitante = razao.argmin(axis=1)
+        fornadas = razao.min(axis=1)
+        sem_ingredientes = ~usa.any(axis=1)
+        fornadas[sem_ingredientes] = 0.0
+        rendimentos = np.array([float(r['rendimento'] or 0) for r in receitas])
+
+        resultado = {}
+        for i, r in enumerate(receitas):
+            resultado[r['id']] = {
+                'nome': r['nome'],
+                'max_fornadas': float(fornadas[i]),
+                'max_quantidade': float(fornadas[i] * rendimentos[i]),
+                'unidade_resultado': r['unidade_resultado'] or 'un',
+                'limitante': None if sem_ingredientes[i] else nomes[limitante[i]],
+            }
+        return resultado
 
     # ---------------- Produção ----------------
-    def add_producao(self, receita_id, quantidade_produzida, data_str, unidade):
-        cur = self.conn.cursor()
-        try:
-            data_iso = parse_date_input(data_str)
+    def add_producao(self, receita_id, quantidade_produzida, data_str, unidade=None):
+        with self.transaction() as cur:
+            data_iso = parse_date_input(data_str, strict=True)
             cur.execute('SELECT rendimento, nome, unidade_resultado FROM receitas WHERE id=?', (receita_id,))
             row = cur.fetchone()
             if not row:
@@ -407,102 +1304,411 @@ class DBManager:
             rendimento = row['rendimento']
             receita_nome = row['nome']
             unidade_resultado = row['unidade_resultado'] or 'un'
+            unidade = unidade or unidade_resultado
             factor = float(quantidade_produzida) / float(rendimento) if rendimento else 1
-            ingredientes = self.get_receita_ingredientes(receita_id)
+            ingredientes = [(ing['produto_id'], ing['produto_nome'], ing['produto_qtd_atual'], ing['quantidade_base'])
+                            for ing in self.get_receita_ingredientes(receita_id)]
+            # sub-receitas são consumidas do produto gerado pela produção delas
+            ingredientes += [(sub['sub_produto_id'], sub['sub_receita_nome'], sub['sub_produto_qtd_atual'], sub['quantidade_base'])
+                             for sub in self.get_receita_sub_receitas(receita_id)]
             if not ingredientes:
                 raise ValueError('Receita sem ingredientes')
             faltando = []
-            for ing in ingredientes:
-                need = ing['quantidade_base'] * factor
-                if (ing['produto_qtd_atual'] or 0) < need - 1e-9:
-                    faltando.append(f"{ing['produto_nome']} (necessário {need:.2f}, disponível {ing['produto_qtd_atual'] or 0:.2f})")
+            for _, nome, disponivel, qtd_base in ingredientes:
+                need = qtd_base * factor
+                if (disponivel or 0) < need - 1e-9:
+                    faltando.append(f"{nome} (necessário {need:.2f}, disponível {disponivel or 0:.2f})")
             if faltando:
                 raise ValueError('Estoque insuficiente para produção:\n' + '\n'.join(faltando))
-            # consumir insumos
-            for ing in ingredientes:
-                need = ing['quantidade_base'] * factor
-                self.consume_from_lotes(ing['produto_id'], need, motivo=f'Produção {receita_nome}')
-            # registrar produção e criar lote do produto final (nome da receita)
-            cur.execute('INSERT INTO producoes (receita_id, quantidade_produzida, data, unidade) VALUES (?,?,?,?)', (receita_id, quantidade_produzida, data_iso, unidade))
+            # registrar produção e consumir insumos (ligados a ela em lote_movimentos);
+            # o custo deles é o custo da produção
+            cur.execute('INSERT INTO producoes (receita_id, quantidade_produzida, data, unidade, custo) VALUES (?,?,?,?,0)', (receita_id, quantidade_produzida, data_iso, unidade))
+            producao_id = cur.lastrowid
+            custo = sum(self.consume_from_lotes(ing_produto_id, qtd_base * factor, motivo=f'Produção {receita_nome}',
+                                                origem='producao', origem_id=producao_id, data_str=data_iso)
+                        for ing_produto_id, _, _, qtd_base in ingredientes)
+            cur.execute('UPDATE producoes SET custo = ? WHERE id = ?', (custo, producao_id))
+            # criar lote do produto final (nome da receita)
             produto_id = self.add_or_get_produto(receita_nome, unidade_resultado)
-            cur.execute('INSERT INTO lotes (produto_id, quantidade_base, data_compra, data_validade, lote) VALUES (?,?,?,?,?)', (produto_id, quantidade_produzida, data_iso, None, 'producao'))
-            cur.execute('SELECT SUM(quantidade_base) as total FROM lotes WHERE produto_id = ?', (produto_id,))
-            total = cur.fetchone()['total'] or 0
-            cur.execute('UPDATE produtos SET quantidade = ? WHERE id = ?', (total, produto_id))
-            cur.execute('INSERT INTO stock_adjustments (produto_id, data, before_qty, after_qty, motivo) VALUES (?,?,?,?,?)', (produto_id, data_iso, 0, total, 'producao'))
-            self.conn.commit()
-            return cur.lastrowid
-        except Exception:
-            self.conn.rollback()
-            raise
+            self._ensure_lotes_exist(cur, [produto_id])
+            cur.execute('SELECT quantidade FROM produtos WHERE id = ?', (produto_id,))
+            before_total = float(cur.fetchone()['quantidade'] or 0)
+            custo_unitario = custo / float(quantidade_produzida) if float(quantidade_produzida) else 0.0
+            cur.execute('INSERT INTO lotes (produto_id, quantidade_base, data_compra, lote, custo_unitario, producao_id) VALUES (?,?,?,?,?,?)',
+                        (produto_id, quantidade_produzida, data_iso, 'producao', custo_unitario, producao_id))
+            cur.execute(self._INSERT_AJUSTE_SQL, (produto_id, data_iso, before_total, before_total + float(quantidade_produzida), 'producao', day_number(data_iso), custo))
+            return producao_id
 
     # ---------------- Vendas ----------------
     def add_venda(self, produto_id, quantidade, unidade, preco_unitario, data_str, local=None):
-        cur = self.conn.cursor()
-        try:
-            data_iso = parse_date_input(data_str)
-            quantidade_base, _ = UnitConverter.to_base(quantidade, unidade)
+        with self.transaction() as cur:
+            data_iso = parse_date_input(data_str, strict=True)
             prod = self.get_produto(produto_id)
             if not prod:
                 raise ValueError('Produto não encontrado')
+            quantidade_base = self._quantidade_base_produto(produto_id, quantidade, unidade)
             if (prod['quantidade'] or 0) < quantidade_base - 1e-9:
                 raise ValueError('Estoque insuficiente')
-            self.consume_from_lotes(produto_id, quantidade_base, motivo='venda')
-            cur.execute('INSERT INTO vendas (produto_id, quantidade, quantidade_base, preco_unitario, data, local) VALUES (?,?,?,?,?,?)', (produto_id, quantidade, quantidade_base, preco_unitario, data_iso, local))
-            self.conn.commit()
-            return cur.lastrowid
-        except Exception:
-            self.conn.rollback()
-            raise
+            # a venda vem antes do consumo para que lote_movimentos aponte para o id dela
+            cur.execute(self._INSERT_VENDA_SQL, (produto_id, quantidade, quantidade_base, preco_unitario, data_iso, local, day_number(data_iso), 0.0))
+            venda_id = cur.lastrowid
+            custo = self.consume_from_lotes(produto_id, quantidade_base, motivo='venda', origem='venda', origem_id=venda_id, data_str=data_iso)
+            if custo:
+                cur.execute('UPDATE vendas SET custo = ? WHERE id = ?', (custo, venda_id))
+            return venda_id
+
+    def add_vendas_batch(self, vendas):
+        """
+        Registra um lote de vendas (ex.: exportação diária do PDV) de forma
+        atômica: ou todas as linhas entram, ou nenhuma.
+
+        `vendas` é um iterável de dicts com as chaves de add_venda
+        (produto_id, quantidade, unidade, preco_unitario, data_str, local).
+        As linhas são agrupadas por produto: o estoque é verificado uma vez
+        e os lotes são percorridos em ordem FEFO uma única vez para a
+        quantidade total de cada produto. Retorna o nº de vendas gravadas.
+        """
+        vendas = list(vendas)
+        if not vendas:
+            return 0
+        # conversão de todas as linhas de uma vez, na base de cada produto
+        catalog = self.catalog('produtos')
+        prods = [catalog.get(int(v['produto_id'])) or {} for v in vendas]
+        quantidades_base, _ = self._quantidades_base([v['quantidade'] for v in vendas], [v['unidade'] for v in vendas], prods)
+        linhas = []
+        por_produto = {}
+        linhas_do_produto = {}
+        datas = parse_dates_many([v.get('data_str') for v in vendas], strict=True)
+        for n, (v, quantidade_base, data_iso) in enumerate(zip(vendas, quantidades_base, datas)):
+            pid = int(v['produto_id'])
+            linhas.append((pid, v['quantidade'], quantidade_base, v['preco_unitario'], data_iso, v.get('local'), day_number(data_iso)))
+            por_produto[pid] = por_produto.get(pid, 0.0) + quantidade_base
+            linhas_do_produto.setdefault(pid, []).append(n)
+        with self.transaction() as cur:
+            ids = list(por_produto)
+            produtos = {}
+            for i in range(0, len(ids), self.BULK_CHUNK):
+                chunk = ids[i:i + self.BULK_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                cur.execute(f'SELECT id, nome FROM produtos WHERE id IN ({marks})', chunk)
+                produtos.update((r['id'], r) for r in cur.fetchall())
+            nao_encontrados = [pid for pid in ids if pid not in produtos]
+            if nao_encontrados:
+                raise ValueError('Produto não encontrado: ' + ', '.join(map(str, nao_encontrados)))
+            self._ensure_lotes_exist(cur, ids)
+            takes, ajustes, faltando = [], [], []
+            retiradas_linha = [[] for _ in linhas]
+            for pid, need in por_produto.items():
+                cur.execute(self._FEFO_LOTES_SQL, (pid,))
+                lotes = cur.fetchall()
+                before_total = float(sum(l['quantidade_base'] for l in lotes))
+                t, restante, custos = self._plan_fefo(lotes, need)
+                if restante > 1e-6:
+                    faltando.append(f"{produtos[pid]['nome']} (necessário {need:.2f}, disponível {before_total:.2f})")
+                    continue
+                takes.extend(t)
+                # cada venda leva os lotes (e o custo) que ela mesma consumiu, na ordem do lote
+                idx = linhas_do_produto[pid]
+                for n, partes in zip(idx, self._dividir_em_sequencia(t, custos, [linhas[n][2] for n in idx])):
+                    retiradas_linha[n] = partes
+                # um ajuste por dia das vendas do produto, com a data delas
+                por_dia = {}
+                for n in idx:
+                    por_dia.setdefault(linhas[n][4], []).append(n)
+                for data_iso, dia_idx in por_dia.items():
+                    saida = sum(linhas[n][2] for n in dia_idx)
+                    ajustes.append((pid, data_iso, before_total, before_total - saida, 'venda', day_number(data_iso),
+                                    sum(c for n in dia_idx for _, _, c in retiradas_linha[n])))
+                    before_total -= saida
+            if faltando:
+                raise ValueError('Estoque insuficiente:\n' + '\n'.join(faltando))
+            cur.executemany('UPDATE lotes SET quantidade_base = quantidade_base - ? WHERE id = ?', takes)
+            cur.executemany(self._INSERT_AJUSTE_SQL, ajustes)
+            # uma execução por venda: o lastrowid de cada uma liga seus lotes em lote_movimentos
+            movimentos = []
+            for l, r in zip(linhas, retiradas_linha):
+                cur.execute(self._INSERT_VENDA_SQL, l + (sum(c for _, _, c in r),))
+                venda_id = cur.lastrowid
+                movimentos.extend((lote_id, 'venda', venda_id, qtd, custo, l[4], l[6]) for lote_id, qtd, custo in r)
+            cur.executemany(self._INSERT_MOVIMENTO_SQL, movimentos)
+            return len(linhas)
+
+    def rebuild_vendas_diarias(self):
+        """Reconstrói do zero o resumo vendas_diarias a partir de vendas."""
+        with self.transaction() as cur:
+            cur.execute('DELETE FROM vendas_diarias')
+            cur.execute(REBUILD_VENDAS_DIARIAS_SQL)
 
     def get_vendas_por_data(self, date_str):
         cur = self.conn.cursor()
         date_iso = parse_date_input(date_str)
-        cur.execute('SELECT v.*, p.nome FROM vendas v JOIN produtos p ON v.produto_id = p.id WHERE date(v.data) = ? ORDER BY v.id', (date_iso,))
+        cur.execute('SELECT v.*, p.nome FROM vendas v JOIN produtos p ON v.produto_id = p.id WHERE v.data_dia = ? ORDER BY v.id', (day_number(date_iso),))
+        return cur.fetchall()
+
+    def get_vendas_por_data_page(self, date_str, after=None, limit=None):
+        """Página de get_vendas_por_data; after é o id da última venda da página anterior."""
+        date_iso = parse_date_input(date_str)
+        sql = 'SELECT v.*, p.nome FROM vendas v JOIN produtos p ON v.produto_id = p.id WHERE v.data_dia = ?'
+        params = [day_number(date_iso)]
+        if after is not None:
+            sql += ' AND v.id > ?'
+            params.append(after)
+        cur = self.conn.cursor()
+        cur.execute(sql + ' ORDER BY v.id LIMIT ?', params + [limit or self.PAGE_SIZE])
         return cur.fetchall()
 
     # ---------------- Relatórios / util ----------------
     def total_stock_value(self):
-        cur = self.conn.cursor()
-        cur.execute('SELECT SUM(p.quantidade * COALESCE(p.ultima_compra_unitaria,0)) as valor FROM produtos p')
-        r = cur.fetchone()
+        with self.read_connection() as conn:
+            r = conn.execute('SELECT SUM(p.quantidade * COALESCE(p.ultima_compra_unitaria,0)) as valor FROM produtos p').fetchone()
         return float(r['valor'] or 0)
 
+    def verify_stock_consistency(self, tolerance=1e-6, fix=False):
+        """
+        Audita produtos.quantidade contra a soma dos lotes (uma única consulta
+        agrupada). Retorna a lista de divergências; com fix=True grava a soma
+        dos lotes como quantidade correta. Produtos sem nenhum lote (legado)
+        não são considerados.
+        """
+        cur = self.conn.cursor()
+        cur.execute('''
+            SELECT p.id, p.nome, COALESCE(p.quantidade, 0) as quantidade, l.total as quantidade_lotes
+            FROM produtos p
+            JOIN (SELECT produto_id, COALESCE(SUM(quantidade_base), 0) as total FROM lotes GROUP BY produto_id) l ON l.produto_id = p.id
+            WHERE ABS(COALESCE(p.quantidade, 0) - l.total) > ?
+            ORDER BY p.nome
+        ''', (tolerance,))
+        drift = [{'produto_id': r['id'], 'nome': r['nome'], 'quantidade': r['quantidade'],
+                  'quantidade_lotes': r['quantidade_lotes'], 'diferenca': r['quantidade'] - r['quantidade_lotes']}
+                 for r in cur.fetchall()]
+        if fix and drift:
+            with self.transaction() as cur:
+                cur.executemany('UPDATE produtos SET quantidade = ? WHERE id = ?', [(d['quantidade_lotes'], d['produto_id']) for d in drift])
+        return drift
+
     def lots_expiring_within(self, days=7):
         cur = self.conn.cursor()
-        limit_date = (datetime.now() + timedelta(days=days)).strftime(ISO_DATE_FMT)
-        cur.execute('SELECT l.*, p.nome FROM lotes l JOIN produtos p ON l.produto_id=p.id WHERE l.data_validade IS NOT NULL AND date(l.data_validade) <= ? AND l.quantidade_base>0 ORDER BY l.data_validade ASC', (limit_date,))
+        cur.execute('SELECT l.*, p.nome FROM lotes l JOIN produtos p ON l.produto_id=p.id WHERE l.validade_dia <= ? AND l.quantidade_base > 0 ORDER BY l.validade_dia ASC', (today_number() + days,))
         return cur.fetchall()
 
-    def generate_reorder_csv(self, filename):
-        cur = self.conn.cursor()
-        cur.execute('SELECT id,nome,quantidade,reorder_level,unidade_base FROM produtos WHERE reorder_level > 0 AND quantidade < reorder_level ORDER BY nome')
-        rows = cur.fetchall()
-        if not rows:
+    # ---------------- Rastreabilidade (recall) ----------------
+    # ida: consumos do lote e, pelas produções que o usaram, dos lotes gerados por elas
+    # (CROSS JOIN fixa a ordem: parte dos poucos lotes do recall, não da tabela lotes)
+    _TRACE_LOTE_SQL = '''
+        WITH RECURSIVE alvo(lote_id, nivel) AS (
+            SELECT id, 0 FROM lotes WHERE {filtro}
+            UNION
+            SELECT l.id, a.nivel + 1
+            FROM alvo a
+            JOIN lote_movimentos m ON m.lote_id = a.lote_id AND m.origem = 'producao'
+            JOIN lotes l ON l.producao_id = m.origem_id
+        )
+        SELECT a.nivel, m.lote_id, l.lote, p.nome, m.origem, m.origem_id, m.quantidade_base, m.custo, m.data
+        FROM alvo a
+        CROSS JOIN lote_movimentos m ON m.lote_id = a.lote_id
+        JOIN lotes l ON l.id = m.lote_id
+        JOIN produtos p ON p.id = l.produto_id
+        ORDER BY a.nivel, m.data_dia, m.id'''
+
+    # volta: lotes de um consumo e, para lotes de produção, os insumos dela
+    _TRACE_ORIGEM_SQL = '''
+        WITH RECURSIVE consumo(origem, origem_id, nivel) AS (
+            VALUES (?, ?, 0)
+            UNION
+            SELECT 'producao', l.producao_id, c.nivel + 1
+            FROM consumo c
+            JOIN lote_movimentos m ON m.origem = c.origem AND m.origem_id = c.origem_id
+            JOIN lotes l ON l.id = m.lote_id
+            WHERE l.producao_id IS NOT NULL
+        )
+        SELECT c.nivel, m.origem, m.origem_id, m.lote_id, l.lote, p.nome, l.data_compra, l.data_validade, m.quantidade_base, m.custo
+        FROM consumo c
+        CROSS JOIN lote_movimentos m ON m.origem = c.origem AND m.origem_id = c.origem_id
+        JOIN lotes l ON l.id = m.lote_id
+        JOIN produtos p ON p.id = l.produto_id
+        ORDER BY c.nivel, m.id'''
+
+    def trace_lote(self, lote):
+        """
+        Recall: vendas, produções e desperdícios que usaram o lote (código
+        de lotes.lote, ou id se int), inclusive via produtos feitos com ele
+        (nivel > 0). Só cobre consumos gravados depois de lote_movimentos.
+        """
+        filtro = 'id = ?' if isinstance(lote, int) else 'lote = ?'
+        with self.read_connection() as conn:
+            return conn.execute(self._TRACE_LOTE_SQL.format(filtro=filtro), (lote,)).fetchall()
+
+    def trace_origem(self, origem, origem_id):
+        """Lotes consumidos por uma venda, produção ou desperdício (origem, id), até os insumos comprados."""
+        with self.read_connection() as conn:
+            return conn.execute(self._TRACE_ORIGEM_SQL, (origem, origem_id)).fetchall()
+
+    # ---------------- Reposição ----------------
+    def compute_reorder_plan(self, days=30, lead_time_days=3, cobertura_dias=7, safety_z=1.65):
+        """
+        Sugestão de compra para todos os produtos a partir do consumo real.
+
+        Uma consulta agrupada soma, por produto e dia dos últimos `days` dias,
+        vendas, perdas (wastes) e os demais consumos registrados em
+        stock_adjustments (ingredientes de produção e baixas manuais; vendas e
+        perdas também geram ajustes e não são contadas de novo). Com NumPy,
+        para todos os produtos de uma vez:
+          consumo_diario     = média diária (dias sem consumo contam como 0)
+          estoque_seguranca  = safety_z * desvio diário * sqrt(lead_time_days)
+          ponto_pedido       = consumo_diario * lead_time_days + estoque_seguranca
+          alvo               = consumo_diario * (lead_time_days + cobertura_dias) + estoque_seguranca
+        O reorder_level manual continua valendo como mínimo (ponto_pedido >=
+        reorder_level, alvo >= 2 * reorder_level). Produtos com quantidade <=
+        ponto_pedido recebem sugerido = ceil(alvo - quantidade).
+        Retorna a lista dos produtos com sugestão, por fornecedor (o da compra
+        mais recente) e nome.
+        """
+        import numpy as np  # usado só pelo planejador
+
+        since = today_number() - days
+        with self.read_connection() as conn:
+            produtos = conn.execute('''
+                SELECT p.id, p.nome, p.unidade_base, COALESCE(p.quantidade, 0) as quantidade,
+                       COALESCE(p.reorder_level, 0) as reorder_level, COALESCE(p.ultima_compra_unitaria, 0) as preco,
+                       f.nome as fornecedor
+                FROM produtos p
+                LEFT JOIN (SELECT produto_id, fornecedor_id, MAX(data) FROM compras
+                           WHERE fornecedor_id IS NOT NULL GROUP BY produto_id) uc ON uc.produto_id = p.id
+                LEFT JOIN fornecedores f ON f.id = uc.fornecedor_id
+                ORDER BY p.id
+            ''').fetchall()
+            consumo = conn.execute('''
+                SELECT produto_id, dia, SUM(qtd) as qtd FROM (
+                    SELECT produto_id, data_dia as dia, quantidade_base as qtd FROM vendas WHERE data_dia >= ?
+                    UNION ALL
+                    SELECT produto_id, data_dia, quantidade_base FROM wastes WHERE data_dia >= ?
+                    UNION ALL
+                    SELECT produto_id, data_dia, before_qty - after_qty FROM stock_adjustments
+                    WHERE data_dia >= ? AND before_qty > after_qty AND motivo != 'venda' AND motivo NOT LIKE 'waste:%'
+                )
+                WHERE produto_id IS NOT NULL AND qtd > 0
+                GROUP BY produto_id, dia
+            ''', (since, since, since)).fetchall()
+        if not produtos:
+            return []
+
+        indice = {r['id']: i for i, r in enumerate(produtos)}
+        pares = [(indice[r['produto_id']], float(r['qtd'])) for r in consumo if r['produto_id'] in indice]
+        idx = np.array([i for i, _ in pares], dtype=int)
+        qtd_dia = np.array([q for _, q in pares], dtype=float)
+        n = len(produtos)
+        total = np.bincount(idx, weights=qtd_dia, minlength=n)
+        total_sq = np.bincount(idx, weights=qtd_dia ** 2, minlength=n)
+        media = total / days
+        desvio = np.sqrt(np.maximum(total_sq / days - media ** 2, 0.0))
+
+        quantidade = np.array([float(r['quantidade']) for r in produtos])
+        reorder = np.array([float(r['reorder_level']) for r in produtos])
+        seguranca = safety_z * desvio * np.sqrt(lead_time_days)
+        ponto_pedido = np.maximum(media * lead_time_days + seguranca, reorder)
+        alvo = np.maximum(media * (lead_time_days + cobertura_dias) + seguranca, reorder * 2)
+        sugerido = np.where(quantidade <= ponto_pedido, np.ceil(np.maximum(alvo - quantidade, 0.0)), 0.0)
+
+        plano = []
+        for i in np.flatnonzero(sugerido > 0):
+            r = produtos[i]
+            plano.append({
+                'produto_id': r['id'], 'nome': r['nome'], 'unidade_base': r['unidade_base'],
+                'fornecedor': r['fornecedor'], 'quantidade': float(quantidade[i]),
+                'consumo_diario': float(media[i]), 'estoque_seguranca': float(seguranca[i]),
+                'ponto_pedido': float(ponto_pedido[i]), 'sugerido': float(sugerido[i]),
+                'custo_estimado': float(sugerido[i] * r['preco']),
+            })
+        plano.sort(key=lambda p: (p['fornecedor'] is None, p['fornecedor'] or '', p['nome']))
+        return plano
+
+    def generate_reorder_csv(self, filename, **params):
+        """Grava compute_reorder_plan(**params) em CSV, agrupado por fornecedor."""
+        plano = self.compute_reorder_plan(**params)
+        if not plano:
             return False
         with open(filename, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow(['produto_id','nome','quantidade_atual','reorder_level','sugerido_para_compra','unidade_base'])
-            for r in rows:
-                suggested = max(math.ceil((r['reorder_level'] * 2) - r['quantidade']), 0)
-                writer.writerow([r['id'], r['nome'], r['quantidade'], r['reorder_level'], suggested, r['unidade_base']])
+            writer.writerow(['fornecedor','produto_id','nome','quantidade_atual','consumo_diario','ponto_pedido','sugerido_para_compra','unidade_base','custo_estimado'])
+            for p in plano:
+                writer.writerow([p['fornecedor'] or '', p['produto_id'], p['nome'], round(p['quantidade'], 4), round(p['consumo_diario'], 4),
+                                 round(p['ponto_pedido'], 4), int(p['sugerido']), p['unidade_base'], round(p['custo_estimado'], 2)])
         return True
 
     def export_table_csv(self, table, filename):
-        cur = self.conn.cursor()
-        cur.execute(f'SELECT * FROM {table}')
-        rows = cur.fetchall()
-        if not rows:
-            return False
-        with open(filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(rows[0].keys())
-            for r in rows:
-                writer.writerow([r[k] for k in r.keys()])
-        return True
+        return self.export_table(table, filename, fmt='csv') > 0
+
+    def exportable_tables(self):
+        """Tabelas do esquema que podem ser exportadas (sem as internas do SQLite e do FTS)."""
+        with self.read_connection() as conn:
+            rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'").fetchall()
+        virtuais = [r['name'] for r in rows if (r['sql'] or '').upper().startswith('CREATE VIRTUAL')]
+        return sorted(r['name'] for r in rows
+                      if r['name'] not in virtuais and not any(r['name'].startswith(v + '_') for v in virtuais))
+
+    def export_table(self, table, filename, columns=None, start_date=None, end_date=None, fmt=None):
+        """
+        Exporta uma tabela em fluxo (fetchmany de EXPORT_CHUNK linhas), sem
+        carregá-la inteira em memória. Retorna o nº de linhas exportadas.
+
+        table precisa existir no esquema (ver exportable_tables) e columns,
+        se informado, ser um subconjunto das suas colunas. start_date/end_date
+        (inclusivos) filtram pela coluna de data da tabela. fmt é 'csv',
+        'csv.gz' ou 'parquet' (requer pyarrow); por padrão vem da extensão
+        do arquivo.
+        """
+        fmt = fmt or export.format_from_filename(filename)
+        if fmt not in export.FORMATS:
+            raise ValueError(f'Formato de exportação inválido: {fmt}')
+        if table not in self.exportable_tables():
+            raise ValueError(f'Tabela inválida para exportação: {table}')
+        with self.read_connection() as conn:
+            info = {r['name']: r['type'] for r in conn.execute(f'PRAGMA table_info({table})')}
+            columns = list(columns) if columns else list(info)
+            invalidas = [c for c in columns if c not in info]
+            if invalidas:
+                raise ValueError(f'Colunas inexistentes em {table}: ' + ', '.join(invalidas))
+            where, params = [], []
+            if start_date or end_date:
+                date_col = self.EXPORT_DATE_COLUMNS.get(table, 'data')
+                if date_col not in info:
+                    raise ValueError(f'A tabela {table} não tem coluna de data')
+                dia_col = self.DAY_COLUMN_OF.get((table, date_col))
+                if dia_col in info:
+                    # mesma faixa pela coluna inteira, indexada
+                    if start_date:
+                        where.append(f'{dia_col} >= ?'); params.append(day_number(parse_date_input(start_date)))
+                    if end_date:
+                        where.append(f'{dia_col} <= ?'); params.append(day_number(parse_date_input(end_date)))
+                else:
+                    if start_date:
+                        where.append(f'{date_col} >= ?'); params.append(parse_date_input(start_date))
+                    if end_date:
+                        where.append(f'{date_col} < ?'); params.append(next_day_iso(parse_date_input(end_date)))
+            sql = f'SELECT {", ".join(columns)} FROM {table}'
+            if where:
+                sql += ' WHERE ' + ' AND '.join(where)
+            cur = conn.execute(sql, params)
+
+            def batches():
+                while True:
+                    rows = cur.fetchmany(self.EXPORT_CHUNK)
+                    if not rows:
+                        return
+                    yield [tuple(r) for r in rows]
+
+            if fmt == 'parquet':
+                return export.write_parquet(filename, columns, [info[c] for c in columns], batches())
+            return export.write_csv(filename, columns, batches(), compress=(fmt == 'csv.gz'))
 
     def compute_sales_and_cogs(self, start_date=None, end_date=None):
-        cur = self.conn.cursor()
+        """
+        Receita e custo das vendas (COGS) do período, ambos de vendas_diarias.
+        O custo é o registrado em cada venda: custo_unitario dos lotes
+        consumidos por ela (ver consume_from_lotes).
+        'cogs_est' (nome antigo, quando o custo era estimado) repete 'cogs'
+        por compatibilidade; obsoleto, será removido na próxima versão.
+        """
         if start_date:
             s = parse_date_input(start_date)
         else:
@@ -511,13 +1717,11 @@ class DBManager:
             e = parse_date_input(end_date)
         else:
             e = datetime.now().strftime(ISO_DATE_FMT)
-        cur.execute('''
-            SELECT 
-                SUM(v.preco_unitario * v.quantidade) as revenue,
-                SUM(v.quantidade_base * COALESCE(p.ultima_compra_unitaria,0)) as cogs
-            FROM vendas v
-            JOIN produtos p ON v.produto_id=p.id
-            WHERE date(v.data) BETWEEN ? AND ?
-        ''', (s, e))
-        r = cur.fetchone()
-        return {'revenue': float(r['revenue'] or 0), 'cogs_est': float(r['cogs'] or 0)}
+        with self.read_connection() as conn:
+            r = conn.execute('''
+                SELECT SUM(receita) as revenue, SUM(custo) as cogs
+                FROM vendas_diarias
+                WHERE dia BETWEEN ? AND ?
+            ''', (s, e)).fetchone()
+        cogs = float(r['cogs'] or 0)
+        return {'revenue': float(r['revenue'] or 0), 'cogs': cogs, 'cogs_est': cogs}
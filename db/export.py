@@ -0,0 +1,60 @@
+# db/export.py
+"""
+Escrita incremental das exportações de DBManager.export_table: cada função
+recebe um iterável de lotes de linhas (listas de tuplas, vindas de fetchmany)
+e grava lote a lote, sem montar a tabela inteira em memória.
+"""
+import csv
+import gzip
+
+FORMATS = ('csv', 'csv.gz', 'parquet')
+
+
+def format_from_filename(filename):
+    nome = filename.lower()
+    if nome.endswith('.parquet'):
+        return 'parquet'
+    if nome.endswith('.gz'):
+        return 'csv.gz'
+    return 'csv'
+
+
+def write_csv(filename, columns, batches, compress=False):
+    """Grava CSV (gzip se compress=True). Retorna o nº de linhas."""
+    opener = gzip.open if compress else open
+    n = 0
+    with opener(filename, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in batches:
+            writer.writerows(rows)
+            n += len(rows)
+    return n
+
+
+def _arrow_type(pa, decl):
+    # afinidade de tipo do SQLite a partir do tipo declarado da coluna
+    decl = (decl or '').upper()
+    if 'INT' in decl:
+        return pa.int64()
+    if any(t in decl for t in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+
+def write_parquet(filename, columns, decl_types, batches):
+    """Grava Parquet (requer pyarrow), um row group por lote. Retorna o nº de linhas."""
+    import pyarrow as pa  # dependência opcional, só para este formato
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, _arrow_type(pa, t)) for c, t in zip(columns, decl_types)])
+    texto = [pa.types.is_string(f.type) for f in schema]
+    n = 0
+    with pq.ParquetWriter(filename, schema) as writer:
+        for rows in batches:
+            cols = list(zip(*rows))
+            arrays = [pa.array([None if v is None else str(v) for v in col] if is_text else col, type=field.type)
+                      for col, field, is_text in zip(cols, schema, texto)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            n += len(rows)
+    return n
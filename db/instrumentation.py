@@ -0,0 +1,219 @@
+# db/instrumentation.py
+"""
+Instrumentação opcional do DBManager (ver DBManager.enable_instrumentation).
+
+- Cada chamada a um método público é cronometrada e conta quantos comandos
+  SQL executou (inclusive os de métodos chamados por ele): muitos comandos
+  por chamada costumam indicar um padrão N+1.
+- Os comandos chegam por Connection.set_trace_callback. O SQLite só avisa o
+  início de cada comando, então a latência de um comando é o tempo até o
+  próximo começar ou até o método que o executou retornar (inclui o fetch).
+- Comandos acima de slow_ms vão para o log de lentos; o EXPLAIN QUERY PLAN
+  deles é obtido ao gerar o relatório, numa conexão à parte.
+
+Relatório de um dump salvo: python -m db.instrumentation dump.json
+"""
+import bisect
+import functools
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+
+class Histograma:
+    """Contagem de latências (ms) em faixas fixas, com total e máximo."""
+
+    LIMITES_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.faixas = [0] * (len(self.LIMITES_MS) + 1)
+
+    def add(self, ms):
+        self.n += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.faixas[bisect.bisect_left(self.LIMITES_MS, ms)] += 1
+
+    @property
+    def media(self):
+        return self.total / self.n if self.n else 0.0
+
+    def percentil(self, p):
+        """Limite superior da faixa que contém o percentil p (0-100)."""
+        alvo, acumulado = self.n * p / 100.0, 0
+        for i, c in enumerate(self.faixas):
+            acumulado += c
+            if c and acumulado >= alvo:
+                return self.LIMITES_MS[i] if i < len(self.LIMITES_MS) else self.max
+        return 0.0
+
+    def as_dict(self):
+        return {'n': self.n, 'total_ms': self.total, 'media_ms': self.media, 'max_ms': self.max,
+                'p50_ms': self.percentil(50), 'p95_ms': self.percentil(95),
+                'faixas_ms': dict(zip([f'<={l}' for l in self.LIMITES_MS] + ['>'], self.faixas))}
+
+
+_LITERAIS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b', re.I), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?, ...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def normalizar_sql(sql):
+    """Troca literais por ? para agrupar o mesmo comando com valores diferentes."""
+    for regex, troca in _LITERAIS:
+        sql = regex.sub(troca, sql)
+    return sql.strip()
+
+
+class Instrumentation:
+    def __init__(self, slow_ms=100.0, max_lentos=200, explain=None):
+        """
+        slow_ms: comandos a partir desta latência entram no log de lentos
+        (os max_lentos mais recentes). explain(sql) -> linhas do plano.
+        """
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.metodos = {}      # nome -> {'latencia': Histograma, 'comandos': int, 'max_comandos': int, 'erros': int}
+        self.comandos = {}     # sql normalizado -> Histograma
+        self.lentos = deque(maxlen=max_lentos)
+        self._planos = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- estado por thread ---
+    def _pilha(self):
+        pilha = getattr(self._local, 'pilha', None)
+        if pilha is None:
+            pilha = self._local.pilha = []
+        return pilha
+
+    def trace(self, sql):
+        """Callback de set_trace_callback: fecha o comando anterior e abre este."""
+        agora = time.perf_counter()
+        self._fechar_comando(agora)
+        self._local.atual = (sql, agora)
+        for op in self._pilha():
+            op['comandos'] += 1
+
+    def _fechar_comando(self, agora):
+        atual = getattr(self._local, 'atual', None)
+        if atual is None:
+            return
+        self._local.atual = None
+        sql, inicio = atual
+        ms = (agora - inicio) * 1000
+        pilha = self._pilha()
+        with self._lock:
+            self.comandos.setdefault(normalizar_sql(sql), Histograma()).add(ms)
+            if ms >= self.slow_ms:
+                self.lentos.append({'ms': ms, 'sql': sql, 'metodo': pilha[-1]['nome'] if pilha else None,
+                                    'quando': time.strftime('%Y-%m-%d %H:%M:%S')})
+
+    # --- métodos ---
+    def _metodo(self, nome):
+        m = self.metodos.get(nome)
+        if m is None:
+            m = self.metodos[nome] = {'latencia': Histograma(), 'comandos': 0, 'max_comandos': 0, 'erros': 0}
+        return m
+
+    def record_error(self, nome):
+        """Conta um erro de quem não passa por wrap (ex.: desenho do dashboard no Tk)."""
+        with self._lock:
+            self._metodo(nome)['erros'] += 1
+
+    def wrap(self, nome, func):
+        @functools.wraps(func)
+        def medido(*args, **kwargs):
+            pilha = self._pilha()
+            op = {'nome': nome, 'comandos': 0}
+            pilha.append(op)
+            inicio = time.perf_counter()
+            erro = False
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                erro = True
+                raise
+            finally:
+                agora = time.perf_counter()
+                self._fechar_comando(agora)
+                pilha.pop()
+                with self._lock:
+                    m = self._metodo(nome)
+                    m['latencia'].add((agora - inicio) * 1000)
+                    m['comandos'] += op['comandos']
+                    m['max_comandos'] = max(m['max_comandos'], op['comandos'])
+                    m['erros'] += erro
+        return medido
+
+    # --- saída ---
+    def _plano(self, sql):
+        if self.explain is None or sql.lstrip().startswith('--'):
+            return None
+        if sql not in self._planos:
+            try:
+                self._planos[sql] = self.explain(sql)
+            except sqlite3.Error as e:
+                self._planos[sql] = [f'(sem plano: {e})']
+        return self._planos[sql]
+
+    def snapshot(self):
+        """Todas as métricas em um dict serializável (ver dump)."""
+        with self._lock:
+            metodos = {n: {**m['latencia'].as_dict(), 'comandos': m['comandos'], 'max_comandos': m['max_comandos'],
+                           'comandos_por_chamada': m['comandos'] / m['latencia'].n if m['latencia'].n else 0,
+                           'erros': m['erros']}
+                       for n, m in self.metodos.items()}
+            comandos = {sql: h.as_dict() for sql, h in self.comandos.items()}
+            lentos = list(self.lentos)
+        return {'slow_ms': self.slow_ms, 'metodos': metodos, 'comandos': comandos,
+                'lentos': [{**l, 'plano': self._plano(l['sql'])} for l in lentos]}
+
+    def dump(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=1)
+
+    def report(self, top=15):
+        return format_report(self.snapshot(), top)
+
+    def reset(self):
+        with self._lock:
+            self.metodos.clear()
+            self.comandos.clear()
+            self.lentos.clear()
+
+
+def format_report(dados, top=15):
+    """Texto do relatório a partir de snapshot() (ou de um dump carregado)."""
+    linhas = ['Métodos (por tempo total)',
+              f'  {"método":<32}{"chamadas":>9}{"total ms":>11}{"média":>9}{"p95":>9}{"máx":>9}{"sql/cham.":>10}{"máx sql":>9}{"erros":>7}']
+    for nome, m in sorted(dados['metodos'].items(), key=lambda kv: -kv[1]['total_ms'])[:top]:
+        linhas.append(f'  {nome:<32}{m["n"]:>9}{m["total_ms"]:>11.1f}{m["media_ms"]:>9.2f}{m["p95_ms"]:>9.2f}'
+                      f'{m["max_ms"]:>9.1f}{m["comandos_por_chamada"]:>10.1f}{m["max_comandos"]:>9}{m["erros"]:>7}')
+    linhas += ['', 'Comandos SQL (por tempo total)', f'  {"n":>8}{"total ms":>11}{"média":>9}{"máx":>9}  sql']
+    for sql, h in sorted(dados['comandos'].items(), key=lambda kv: -kv[1]['total_ms'])[:top]:
+        linhas.append(f'  {h["n"]:>8}{h["total_ms"]:>11.1f}{h["media_ms"]:>9.2f}{h["max_ms"]:>9.1f}  {sql[:120]}')
+    linhas += ['', f'Comandos lentos (>= {dados["slow_ms"]} ms)']
+    for l in sorted(dados['lentos'], key=lambda l: -l['ms'])[:top]:
+        linhas.append(f'  {l["ms"]:.1f} ms  {l["quando"]}  {l["metodo"] or "-"}')
+        linhas.append(f'    {" ".join(l["sql"].split())[:300]}')
+        for p in l.get('plano') or []:
+            linhas.append(f'      {p}')
+    return '\n'.join(linhas)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('Uso: python -m db.instrumentation dump.json [top]')
+    with open(sys.argv[1], encoding='utf-8') as f:
+        print(format_report(json.load(f), int(sys.argv[2]) if len(sys.argv) > 2 else 15))
@@ -0,0 +1,269 @@
+# db/migrations.py
+"""
+Migrações de esquema para bancos criados por versões anteriores.
+
+DBManager._create_tables já cria as tabelas novas com todas as colunas;
+as funções abaixo apenas completam bancos antigos e são idempotentes.
+"""
+import sqlite3
+
+from utils.text_helpers import sem_acentos_sql
+
+REBUILD_VENDAS_DIARIAS_SQL = '''
+    INSERT INTO vendas_diarias (dia, produto_id, quantidade, quantidade_base, receita, n_vendas, custo)
+    SELECT substr(data, 1, 10), produto_id, SUM(COALESCE(quantidade, 0)), SUM(COALESCE(quantidade_base, 0)),
+           SUM(COALESCE(quantidade, 0) * COALESCE(preco_unitario, 0)), COUNT(*), SUM(COALESCE(custo, 0))
+    FROM vendas
+    WHERE data IS NOT NULL AND produto_id IS NOT NULL
+    GROUP BY substr(data, 1, 10), produto_id
+'''
+
+
+def column_exists(conn, table, column):
+    return any(r[1] == column for r in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def add_column_if_missing(conn, table, column, decl):
+    """Adiciona a coluna se ainda não existir. Retorna True se foi criada."""
+    if column_exists(conn, table, column):
+        return False
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+    return True
+
+
+# tabelas com índice de busca por nome (FTS5 trigram em <tabela>_fts, rowid = id)
+SEARCH_TABLES = ('produtos', 'receitas')
+
+
+def create_search_index(conn):
+    """
+    Cria os índices de busca por nome, sem acentos, mantidos por gatilhos, e
+    os preenche se estiverem desatualizados. Retorna False se o SQLite não
+    tiver FTS5 com o tokenizador trigram (3.34+).
+    """
+    try:
+        for table in SEARCH_TABLES:
+            fts = f'{table}_fts'
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(nome, tokenize='trigram')")
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, nome) VALUES (new.id, {sem_acentos_sql('new.nome')});
+            END''')
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF nome ON {table} BEGIN
+                DELETE FROM {fts} WHERE rowid = old.id;
+                INSERT INTO {fts}(rowid, nome) VALUES (new.id, {sem_acentos_sql('new.nome')});
+            END''')
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN
+                DELETE FROM {fts} WHERE rowid = old.id;
+            END''')
+            desatualizado = conn.execute(f'SELECT (SELECT COUNT(*) FROM {fts}) != (SELECT COUNT(*) FROM {table})').fetchone()[0]
+            if desatualizado:
+                conn.execute(f'DELETE FROM {fts}')
+                conn.execute(f"INSERT INTO {fts}(rowid, nome) SELECT id, {sem_acentos_sql('nome')} FROM {table}")
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return False
+    conn.commit()
+    return True
+
+
+# colunas de data com um nº de dia inteiro ao lado (tabela, coluna ISO, coluna *_dia):
+# filtros por período comparam inteiros, com índices menores que os de texto
+DAY_COLUMNS = (
+    ('vendas', 'data', 'data_dia'),
+    ('compras', 'data', 'data_dia'),
+    ('wastes', 'data', 'data_dia'),
+    ('stock_adjustments', 'data', 'data_dia'),
+    ('lotes', 'data_validade', 'validade_dia'),
+)
+
+DAY_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_vendas_dia ON vendas(data_dia)',
+    'CREATE INDEX IF NOT EXISTS idx_vendas_produto_dia ON vendas(produto_id, data_dia)',
+    'CREATE INDEX IF NOT EXISTS idx_compras_produto_dia ON compras(produto_id, data_dia)',
+    'CREATE INDEX IF NOT EXISTS idx_wastes_dia ON wastes(data_dia)',
+    'CREATE INDEX IF NOT EXISTS idx_stock_adj_dia ON stock_adjustments(data_dia)',
+    'CREATE INDEX IF NOT EXISTS idx_lotes_ativos_validade_dia ON lotes(validade_dia) WHERE quantidade_base > 0',
+)
+
+# índices de texto substituídos pelos de DAY_INDEXES (idx_compras_data fica: ordena a paginação de compras)
+REPLACED_DATE_INDEXES = ('idx_vendas_data', 'idx_vendas_produto_data', 'idx_compras_produto_data', 'idx_wastes_data',
+                         'idx_wastes_produto_data', 'idx_stock_adj_produto_data', 'idx_lotes_ativos_validade')
+
+BACKFILL_CHUNK = 50000
+
+
+def day_number_sql(expr):
+    """Expressão SQL do nº do dia (desde 1970-01-01) de uma data ISO; NULL se inválida."""
+    return f"CAST(julianday(substr({expr}, 1, 10)) - 2440587.5 AS INTEGER)"
+
+
+def update_in_chunks(conn, table, set_sql, where, chunk=BACKFILL_CHUNK):
+    """
+    UPDATE {table} SET {set_sql} WHERE {where} em faixas de `chunk` rowids,
+    com commit por faixa (não segura a escrita por muito tempo). Retorna
+    False se nenhuma linha atendia `where`.
+    """
+    pendente = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {table} WHERE {where}').fetchone()
+    if pendente[0] is None:
+        return False
+    for inicio in range(pendente[0], pendente[1] + 1, chunk):
+        conn.execute(f'UPDATE {table} SET {set_sql} WHERE rowid >= ? AND rowid < ? AND {where}', (inicio, inicio + chunk))
+        conn.commit()
+    return True
+
+
+def create_day_columns(conn, chunk=BACKFILL_CHUNK):
+    """
+    Cria as colunas de DAY_COLUMNS, gatilhos que as preenchem quando quem
+    grava não informa o valor (DBManager informa; population.py e versões
+    antigas não), preenche as linhas antigas em blocos de `chunk` rowids, com
+    commit por bloco, e cria os índices.
+    """
+    for table, src, col in DAY_COLUMNS:
+        add_column_if_missing(conn, table, col, 'INTEGER')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{col}_insert AFTER INSERT ON {table}
+            WHEN NEW.{col} IS NULL AND NEW.{src} IS NOT NULL BEGIN
+                UPDATE {table} SET {col} = {day_number_sql(f'NEW.{src}')} WHERE rowid = NEW.rowid;
+            END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{col}_update AFTER UPDATE OF {src} ON {table} BEGIN
+                UPDATE {table} SET {col} = {day_number_sql(f'NEW.{src}')} WHERE rowid = NEW.rowid;
+            END''')
+    conn.commit()
+    preenchidas = []
+    for table, src, col in DAY_COLUMNS:
+        if update_in_chunks(conn, table, f'{col} = {day_number_sql(src)}', f'{col} IS NULL AND {src} IS NOT NULL', chunk):
+            preenchidas.append(table)
+    for sql in DAY_INDEXES:
+        conn.execute(sql)
+    for nome in REPLACED_DATE_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {nome}')
+    # sem estatísticas o planejador tende a varrer (produto_id, data_dia) inteiro
+    # em vez de buscar a faixa em data_dia
+    for table in preenchidas:
+        conn.execute(f'ANALYZE {table}')
+    conn.commit()
+
+
+# custo registrado no momento do consumo (ver DBManager.consume_from_lotes):
+# custo unitário de cada lote e custo total de cada movimento
+COST_COLUMNS = (
+    ('lotes', 'custo_unitario', 'REAL'),
+    ('vendas', 'custo', 'REAL'),
+    ('wastes', 'custo', 'REAL'),
+    ('stock_adjustments', 'custo', 'REAL'),
+    ('producoes', 'custo', 'REAL'),
+    ('vendas_diarias', 'custo', 'REAL NOT NULL DEFAULT 0'),
+)
+
+# estimativa para linhas sem custo registrado: último preço de compra do produto
+_CUSTO_ESTIMADO_SQL = 'quantidade_base * COALESCE((SELECT p.ultima_compra_unitaria FROM produtos p WHERE p.id = {alias}.produto_id), 0)'
+
+# vendas_diarias acompanha vendas: quantidades, receita, nº de vendas e custo
+# no mesmo gatilho de cada operação (gatilhos separados para o custo dependiam
+# da ordem de disparo). Venda gravada sem custo (fora do DBManager) recebe a
+# estimativa pelo último preço de compra; o UPDATE dispara o gatilho de update,
+# que soma esse custo ao resumo.
+VENDAS_DIARIAS_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS trg_vendas_diarias_insert AFTER INSERT ON vendas
+    BEGIN
+        INSERT INTO vendas_diarias (dia, produto_id, quantidade, quantidade_base, receita, n_vendas, custo)
+        SELECT substr(NEW.data, 1, 10), NEW.produto_id, COALESCE(NEW.quantidade, 0), COALESCE(NEW.quantidade_base, 0),
+               COALESCE(NEW.quantidade, 0) * COALESCE(NEW.preco_unitario, 0), 1, COALESCE(NEW.custo, 0)
+        WHERE NEW.data IS NOT NULL AND NEW.produto_id IS NOT NULL
+        ON CONFLICT(dia, produto_id) DO UPDATE SET
+            quantidade = quantidade + excluded.quantidade,
+            quantidade_base = quantidade_base + excluded.quantidade_base,
+            receita = receita + excluded.receita,
+            n_vendas = n_vendas + 1,
+            custo = custo + excluded.custo;
+        UPDATE vendas SET custo = {_CUSTO_ESTIMADO_SQL.format(alias='NEW')}
+        WHERE rowid = NEW.rowid AND NEW.custo IS NULL AND NEW.quantidade_base IS NOT NULL;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_vendas_diarias_delete AFTER DELETE ON vendas
+    BEGIN
+        UPDATE vendas_diarias SET
+            quantidade = quantidade - COALESCE(OLD.quantidade, 0),
+            quantidade_base = quantidade_base - COALESCE(OLD.quantidade_base, 0),
+            receita = receita - COALESCE(OLD.quantidade, 0) * COALESCE(OLD.preco_unitario, 0),
+            n_vendas = n_vendas - 1,
+            custo = custo - COALESCE(OLD.custo, 0)
+        WHERE dia = substr(OLD.data, 1, 10) AND produto_id = OLD.produto_id;
+        DELETE FROM vendas_diarias WHERE dia = substr(OLD.data, 1, 10) AND produto_id = OLD.produto_id AND n_vendas <= 0;
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS trg_vendas_diarias_update AFTER UPDATE OF produto_id, quantidade, quantidade_base, preco_unitario, data, custo ON vendas
+    BEGIN
+        UPDATE vendas_diarias SET
+            quantidade = quantidade - COALESCE(OLD.quantidade, 0),
+            quantidade_base = quantidade_base - COALESCE(OLD.quantidade_base, 0),
+            receita = receita - COALESCE(OLD.quantidade, 0) * COALESCE(OLD.preco_unitario, 0),
+            n_vendas = n_vendas - 1,
+            custo = custo - COALESCE(OLD.custo, 0)
+        WHERE dia = substr(OLD.data, 1, 10) AND produto_id = OLD.produto_id;
+        DELETE FROM vendas_diarias WHERE dia = substr(OLD.data, 1, 10) AND produto_id = OLD.produto_id AND n_vendas <= 0;
+        INSERT INTO vendas_diarias (dia, produto_id, quantidade, quantidade_base, receita, n_vendas, custo)
+        SELECT substr(NEW.data, 1, 10), NEW.produto_id, COALESCE(NEW.quantidade, 0), COALESCE(NEW.quantidade_base, 0),
+               COALESCE(NEW.quantidade, 0) * COALESCE(NEW.preco_unitario, 0), 1, COALESCE(NEW.custo, 0)
+        WHERE NEW.data IS NOT NULL AND NEW.produto_id IS NOT NULL
+        ON CONFLICT(dia, produto_id) DO UPDATE SET
+            quantidade = quantidade + excluded.quantidade,
+            quantidade_base = quantidade_base + excluded.quantidade_base,
+            receita = receita + excluded.receita,
+            n_vendas = n_vendas + 1,
+            custo = custo + excluded.custo;
+    END''',
+)
+
+# gatilhos substituídos por VENDAS_DIARIAS_TRIGGERS (bases de versões anteriores)
+OBSOLETE_VENDAS_TRIGGERS = (
+    'trg_vendas_insert_diarias', 'trg_vendas_delete_diarias', 'trg_vendas_update_diarias',
+    'trg_vendas_custo_estimado', 'trg_vendas_insert_diarias_custo', 'trg_vendas_delete_diarias_custo',
+    'trg_vendas_update_diarias_custo',
+)
+
+
+def create_cost_columns(conn, chunk=BACKFILL_CHUNK):
+    """
+    Cria as colunas de COST_COLUMNS e os gatilhos de vendas_diarias.
+    Em bases antigas, vendas e desperdícios já gravados recebem a estimativa
+    usada antes pelo relatório (quantidade x último preço de compra), em
+    blocos, e vendas_diarias.custo é recalculado a partir deles.
+    """
+    novas = {table for table, col, decl in COST_COLUMNS if add_column_if_missing(conn, table, col, decl)}
+    for table in ('vendas', 'wastes'):
+        if table in novas:
+            update_in_chunks(conn, table, 'custo = ' + _CUSTO_ESTIMADO_SQL.format(alias=table), 'custo IS NULL', chunk)
+    if 'vendas_diarias' in novas:
+        conn.execute(f'''UPDATE vendas_diarias SET custo = COALESCE((
+            SELECT SUM(v.custo) FROM vendas v
+            WHERE v.produto_id = vendas_diarias.produto_id AND v.data_dia = {day_number_sql('vendas_diarias.dia')}), 0)''')
+    for nome in OBSOLETE_VENDAS_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {nome}')
+    for sql in VENDAS_DIARIAS_TRIGGERS:
+        conn.execute(sql)
+    conn.commit()
+
+
+def run_migrations(conn):
+    # sub-receitas: receita_ingredientes pode referenciar outra receita
+    add_column_if_missing(conn, 'receita_ingredientes', 'sub_receita_id', 'INTEGER REFERENCES receitas(id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_receita_ing_sub_receita ON receita_ingredientes(sub_receita_id) WHERE sub_receita_id IS NOT NULL')
+    # fatores de conversão por produto: densidade (g/ml) e peso por unidade (g)
+    add_column_if_missing(conn, 'produtos', 'densidade', 'REAL')
+    add_column_if_missing(conn, 'produtos', 'peso_unidade', 'REAL')
+    # nº do dia inteiro ao lado das datas ISO usadas em filtros por período
+    create_day_columns(conn)
+    # custo por lote e por movimento (COGS registrado no consumo)
+    create_cost_columns(conn)
+    # rastreabilidade: lote gerado por cada produção (lote_movimentos liga os consumos)
+    add_column_if_missing(conn, 'lotes', 'producao_id', 'INTEGER REFERENCES producoes(id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_lotes_producao ON lotes(producao_id) WHERE producao_id IS NOT NULL')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS trg_producoes_delete_movimentos AFTER DELETE ON producoes
+    BEGIN
+        DELETE FROM lote_movimentos WHERE origem = 'producao' AND origem_id = OLD.id;
+        UPDATE lotes SET producao_id = NULL WHERE producao_id = OLD.id;
+    END''')
+    # resumo diário de vendas: preenche a partir do histórico na primeira abertura
+    vazio = conn.execute('SELECT NOT EXISTS (SELECT 1 FROM vendas_diarias)').fetchone()[0]
+    if vazio and conn.execute('SELECT EXISTS (SELECT 1 FROM vendas)').fetchone()[0]:
+        conn.execute(REBUILD_VENDAS_DIARIAS_SQL)
+    conn.commit()
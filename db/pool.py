@@ -0,0 +1,59 @@
+# db/pool.py
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class ReadPool:
+    """
+    Pool pequeno de conexões somente-leitura do SQLite.
+
+    Cada conexão é usada por uma thread de cada vez: connection() empresta
+    uma conexão livre (criando-a sob demanda até `size`) e a devolve ao sair
+    do bloco. Com o banco em WAL, essas leituras não bloqueiam o escritor.
+    """
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self._size = size
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _acquire(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self._size:
+                conn = self._factory()
+                self._all.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError('Nenhuma conexão de leitura disponível')
+
+    @contextmanager
+    def connection(self, timeout=30):
+        conn = self._acquire(timeout)
+        try:
+            yield conn
+        finally:
+            # encerra a transação de leitura para não segurar o snapshot do WAL
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def connections(self):
+        """Todas as conexões já criadas (livres ou emprestadas)."""
+        with self._lock:
+            return list(self._all)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+        self._idle = queue.LifoQueue()
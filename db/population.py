@@ -27,9 +27,9 @@ def limpar_dados_antigos(conn):
     conn.commit()
     print("Limpeza concluída.\n")
 
-def popular_banco():
+def popular_banco(db_file=DB_FILE):
     """Conecta ao banco de dados e insere dados de exemplo."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
     
     limpar_dados_antigos(conn)
@@ -51,7 +51,12 @@ def popular_banco():
         ('Manteiga sem Sal', 'kg', 4.0, 35.0, 1.0), ('Caixa para Bolo (un)', 'un', 50.0, 1.50, 20.0),
         ('Bolo de Chocolate Pronto', 'un', 0.0, 0.0, 5.0)
     ]
-    cursor.executemany("INSERT INTO produtos (nome, unidade_base, quantidade, ultima_compra_unitaria, reorder_level) VALUES (?, ?, ?, ?, ?)", produtos)
+    # quantidade começa em 0: o estoque inicial entra como lote e os gatilhos de lotes somam
+    cursor.executemany("INSERT INTO produtos (nome, unidade_base, quantidade, ultima_compra_unitaria, reorder_level) VALUES (?, ?, 0, ?, ?)",
+                       [(nome, unidade, preco, reorder) for nome, unidade, _, preco, reorder in produtos])
+    inicio = (date.today() - timedelta(days=91)).strftime('%Y-%m-%d')
+    cursor.executemany("INSERT INTO lotes (produto_id, quantidade_base, data_compra, data_validade, lote, custo_unitario) VALUES (?, ?, ?, NULL, 'inicial', ?)",
+                       [(i, qtd, inicio, preco) for i, (_, _, qtd, preco, _) in enumerate(produtos, start=1) if qtd > 0])
     print("✅ Produtos inseridos.")
 
     receitas = [('Bolo de Chocolate', 12.0, 'fatias'), ('Massa de Panqueca', 8.0, 'un')]
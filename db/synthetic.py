@@ -0,0 +1,112 @@
+# db/synthetic.py
+"""
+Gerador de dados sintéticos em volume, para medir o sistema com bases do
+tamanho real (population.py só cria um exemplo pequeno).
+
+Escreve pelos caminhos em lote do DBManager (add_compras_bulk,
+add_vendas_batch), então os gatilhos, lotes, vendas_diarias e o índice de
+busca ficam consistentes como em uso normal.
+
+Uso: python -m db.synthetic destino.db [--escala 100k] [--produtos N] ...
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+from db.db_manager import DBManager
+
+# escalas pré-definidas: nº de vendas ~ anos * 365 * vendas_por_dia
+ESCALAS = {
+    '10k': dict(produtos=200, fornecedores=20, receitas=50, anos=1, vendas_por_dia=28, lotes_por_produto=3),
+    '100k': dict(produtos=1000, fornecedores=50, receitas=200, anos=2, vendas_por_dia=137, lotes_por_produto=5),
+    '1M': dict(produtos=5000, fornecedores=100, receitas=500, anos=3, vendas_por_dia=913, lotes_por_produto=5),
+}
+
+UNIDADES = ('kg', 'l', 'un')
+
+# vendas gravadas por chamada de add_vendas_batch
+VENDAS_POR_LOTE = 50000
+
+
+def gerar_dados(db, produtos=200, fornecedores=20, receitas=50, anos=1, vendas_por_dia=30,
+                lotes_por_produto=3, ingredientes_por_receita=6, sobra=1.5, seed=42):
+    """
+    Popula `db` (DBManager) e retorna um dict com o nº de registros criados.
+
+    As vendas cobrem `anos` anos até hoje e se concentram em poucos produtos
+    (pesos de Pareto). As compras de cada produto são divididas em
+    `lotes_por_produto` lotes ao longo do período e somam `sobra` vezes a
+    quantidade vendida, para que sobre estoque para produções e novas vendas.
+    """
+    rnd = random.Random(seed)
+    hoje = date.today()
+    dias = max(int(anos * 365), 1)
+    inicio = hoje - timedelta(days=dias - 1)
+
+    nomes = [f'Produto {i:05d}' for i in range(produtos)]
+    unidade = {n: rnd.choice(UNIDADES) for n in nomes}
+    preco = {n: round(rnd.uniform(2, 80), 2) for n in nomes}
+    pesos = [rnd.paretovariate(1.2) for _ in nomes]
+
+    # vendas primeiro (em memória), para dimensionar as compras
+    vendas = []
+    demanda = dict.fromkeys(nomes, 0.0)
+    for d in range(dias):
+        data_str = (inicio + timedelta(days=d)).strftime('%Y-%m-%d')
+        for nome in rnd.choices(nomes, weights=pesos, k=vendas_por_dia):
+            qtd = rnd.randint(1, 5) if unidade[nome] == 'un' else round(rnd.uniform(0.1, 2), 3)
+            demanda[nome] += qtd
+            vendas.append((nome, qtd, data_str))
+
+    compras = []
+    for nome in nomes:
+        total = demanda[nome] * sobra + 10
+        for l in range(lotes_por_produto):
+            dia = inicio + timedelta(days=(dias * l) // lotes_por_produto)
+            qtd = round(total / lotes_por_produto, 3)
+            compras.append({
+                'produto_nome': nome, 'quantidade': qtd, 'unidade': unidade[nome],
+                'preco_total': round(qtd * preco[nome] * rnd.uniform(0.8, 1.2), 2),
+                'data_str': dia.strftime('%Y-%m-%d'), 'lote': f'S{len(compras):07d}',
+                'validade': (dia + timedelta(days=rnd.randint(30, 720))).strftime('%Y-%m-%d'),
+                'fornecedor_nome': f'Fornecedor {rnd.randrange(fornecedores):04d}',
+            })
+    db.add_compras_bulk(compras)
+    ids = {n: db.catalog('produtos').id_of(n) for n in nomes}
+
+    n_vendas = 0
+    for i in range(0, len(vendas), VENDAS_POR_LOTE):
+        n_vendas += db.add_vendas_batch({
+            'produto_id': ids[nome], 'quantidade': qtd, 'unidade': unidade[nome],
+            'preco_unitario': round(preco[nome] * 1.8, 2), 'data_str': data_str, 'local': 'sintetico',
+        } for nome, qtd, data_str in vendas[i:i + VENDAS_POR_LOTE])
+
+    for r in range(receitas):
+        rid = db.add_receita(f'Receita {r:05d}', rnd.choice([1, 4, 10, 12]), 'un')
+        for nome in rnd.sample(nomes, min(ingredientes_por_receita, len(nomes))):
+            qtd = rnd.randint(1, 3) if unidade[nome] == 'un' else rnd.randint(10, 500)
+            db.add_receita_ingrediente(rid, nome, qtd, 'un' if unidade[nome] == 'un' else ('g' if unidade[nome] == 'kg' else 'ml'))
+
+    return {'produtos': produtos, 'fornecedores': fornecedores, 'receitas': receitas,
+            'compras': len(compras), 'vendas': n_vendas}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera dados sintéticos em volume.')
+    parser.add_argument('destino', help='arquivo .db (criado se não existir)')
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='10k')
+    for campo in ESCALAS['10k']:
+        parser.add_argument(f'--{campo.replace("_", "-")}', dest=campo, type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+    params = dict(ESCALAS[args.escala])
+    params.update({k: v for k, v in vars(args).items() if k in params and v is not None})
+    db = DBManager(db_path=args.destino, wal=True)
+    try:
+        print(gerar_dados(db, seed=args.seed, **params))
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -35,3 +35,661 @@ def test_receita_producao_cost(db):
     db.add_producao(rid, 10, datetime.now().strftime("%d/%m/%Y"))
     prods = db.get_produtos()
     assert any(p['nome']=="Bolo" for p in prods)
+
+def _full_scans(conn, statements):
+    """Retorna os passos do plano que percorrem uma tabela inteira (SCAN sem índice)."""
+    scans = []
+    for sql in statements:
+        for row in conn.execute('EXPLAIN QUERY PLAN ' + sql).fetchall():
+            detail = row['detail']
+            if detail.startswith('SCAN') and 'INDEX' not in detail:
+                scans.append((sql, detail))
+    return scans
+
+def test_range_queries_use_indexes(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Leite", 10, "l", 50.0, hoje, lote="L1", validade=hoje, fornecedor_nome="Laticínios")
+    prod = next(p for p in db.get_produtos() if p['nome']=="Leite")
+    db.add_venda(prod['id'], 1, "l", 8.0, hoje)
+    db.add_waste(prod['id'], 1, "l", motivo="azedou", data_str=hoje)
+
+    conn = db.get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        db.get_compras_recent(months=3)
+        db.get_waste_recent(days=30)
+        db.get_vendas_por_data(hoje)
+        db.lots_expiring_within(days=7)
+        db.compute_sales_and_cogs()
+        db.get_average_price_last_months(prod['id'])
+    finally:
+        conn.set_trace_callback(None)
+    selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+    assert len(selects) == 6
+    assert _full_scans(conn, selects) == []
+
+def test_add_compras_bulk_and_csv(db, tmp_path):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    n = db.add_compras_bulk([
+        {'produto_nome': "Farinha", 'quantidade': 5, 'unidade': "kg", 'preco_total': 25.0, 'data_str': hoje, 'fornecedor_nome': "Moinho"},
+        {'produto_nome': "Farinha", 'quantidade': 2, 'unidade': "kg", 'preco_total': 12.0, 'data_str': hoje, 'lote': "F2"},
+        {'produto_nome': "Ovo", 'quantidade': 12, 'unidade': "un", 'preco_total': 9.0, 'data_str': hoje, 'fornecedor_nome': "Granja"},
+    ])
+    assert n == 3
+    farinha = next(p for p in db.get_produtos() if p['nome']=="Farinha")
+    assert farinha['quantidade'] == pytest.approx(7000)
+    assert farinha['ultima_compra_unitaria'] == pytest.approx(0.006)
+    assert {f['nome'] for f in db.get_fornecedores()} == {"Moinho", "Granja"}
+
+    csv_path = tmp_path / "compras.csv"
+    csv_path.write_text("produto,quantidade,unidade,preco_total,data,lote,validade,fornecedor\n"
+                        f"Ovo,30,un,20.0,{hoje},O1,,Granja\n", encoding="utf-8")
+    assert db.import_compras_csv(str(csv_path)) == 1
+    ovo = next(p for p in db.get_produtos() if p['nome']=="Ovo")
+    assert ovo['quantidade'] == pytest.approx(42)
+    assert len(db.get_fornecedores()) == 2
+
+def test_import_compras_csv_linha_invalida(db, tmp_path):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    cabecalho = "produto,quantidade,unidade,preco_total,data\n"
+    curta = tmp_path / "curta.csv"
+    curta.write_text(cabecalho + f"Sal,1,kg,3.0,{hoje}\nAçúcar,2,kg\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Compra 2: preço/quantidade inválido"):
+        db.import_compras_csv(str(curta))
+    vazia = tmp_path / "vazia.csv"
+    vazia.write_text(cabecalho + f"Sal,1,kg,,{hoje}\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Compra 1: preço/quantidade inválido"):
+        db.import_compras_csv(str(vazia))
+    assert db.get_produto_by_nome("Sal") is None
+
+def test_add_vendas_batch_fefo_and_atomic(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Pão", 10, "un", 10.0, hoje, lote="A", validade="01/01/2099")
+    db.add_compra("Pão", 10, "un", 10.0, hoje, lote="B", validade="01/01/2098")
+    db.add_compra("Café", 1, "kg", 40.0, hoje)
+    pao = next(p for p in db.get_produtos() if p['nome']=="Pão")
+    cafe = next(p for p in db.get_produtos() if p['nome']=="Café")
+
+    n = db.add_vendas_batch([
+        {'produto_id': pao['id'], 'quantidade': 8, 'unidade': "un", 'preco_unitario': 2.0, 'data_str': hoje},
+        {'produto_id': pao['id'], 'quantidade': 4, 'unidade': "un", 'preco_unitario': 2.0, 'data_str': hoje},
+        {'produto_id': cafe['id'], 'quantidade': 200, 'unidade': "g", 'preco_unitario': 0.1, 'data_str': hoje},
+    ])
+    assert n == 3
+    assert db.get_produto(pao['id'])['quantidade'] == pytest.approx(8)
+    assert db.get_produto(cafe['id'])['quantidade'] == pytest.approx(800)
+    lotes = {r['lote']: r['quantidade_base'] for r in db.get_connection().execute(
+        'SELECT lote, quantidade_base FROM lotes WHERE produto_id = ?', (pao['id'],))}
+    assert lotes == {"B": 0, "A": 8}
+
+    with pytest.raises(ValueError):
+        db.add_vendas_batch([
+            {'produto_id': cafe['id'], 'quantidade': 100, 'unidade': "g", 'preco_unitario': 0.1, 'data_str': hoje},
+            {'produto_id': pao['id'], 'quantidade': 50, 'unidade': "un", 'preco_unitario': 2.0, 'data_str': hoje},
+        ])
+    assert db.get_produto(cafe['id'])['quantidade'] == pytest.approx(800)
+    assert len(db.get_vendas_por_data(hoje)) == 3
+
+def test_stock_maintained_by_triggers_and_audit(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Sal", 1, "kg", 3.0, hoje)
+    db.add_compra("Sal", 500, "g", 2.0, hoje)
+    sal = next(p for p in db.get_produtos() if p['nome']=="Sal")
+    assert sal['quantidade'] == pytest.approx(1500)
+    db.add_venda(sal['id'], 200, "g", 0.01, hoje)
+    assert db.get_produto(sal['id'])['quantidade'] == pytest.approx(1300)
+    assert db.verify_stock_consistency() == []
+
+    conn = db.get_connection()
+    conn.execute('UPDATE produtos SET quantidade = 999 WHERE id = ?', (sal['id'],))
+    conn.commit()
+    drift = db.verify_stock_consistency(fix=True)
+    assert [(d['nome'], d['quantidade_lotes']) for d in drift] == [("Sal", pytest.approx(1300))]
+    assert db.get_produto(sal['id'])['quantidade'] == pytest.approx(1300)
+    assert db.verify_stock_consistency() == []
+    with pytest.raises(ValueError, match='Produto não encontrado'):
+        db.consume_from_lotes(9999, 10)
+
+def test_legacy_stock_not_duplicated(db):
+    conn = db.get_connection()
+    conn.execute("INSERT INTO produtos (nome, unidade_base, quantidade) VALUES ('Mel', 'g', 400)")
+    conn.commit()
+    mel = next(p for p in db.get_produtos() if p['nome']=="Mel")
+    db.add_compra("Mel", 100, "g", 5.0, datetime.now().strftime("%d/%m/%Y"))
+    assert db.get_produto(mel['id'])['quantidade'] == pytest.approx(500)
+    assert db.verify_stock_consistency() == []
+
+def test_population_sem_divergencia(db):
+    from db.population import popular_banco
+    popular_banco(db.db_path)
+    assert db.verify_stock_consistency() == []
+    farinha = db.get_produto(1)
+    assert farinha['nome'] == "Farinha de Trigo" and farinha['quantidade'] >= 10.0
+
+def test_compute_all_recipe_costs_cache_invalidation(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Farinha", 1, "kg", 5.0, hoje)
+    db.add_compra("Cacau", 1, "kg", 40.0, hoje)
+    pao = db.add_receita("Pão", 10, "un")
+    db.add_receita_ingrediente(pao, "Farinha", 500, "g")
+    bolo = db.add_receita("Bolo", 8, "un")
+    db.add_receita_ingrediente(bolo, "Cacau", 100, "g")
+
+    costs = db.compute_all_recipe_costs()
+    assert costs[pao]['total_cost'] == pytest.approx(2.5)
+    assert costs[pao]['cost_per_unit'] == pytest.approx(0.25)
+    assert costs[bolo]['total_cost'] == pytest.approx(4.0)
+    assert db.compute_recipe_cost(bolo) == costs[bolo]
+
+    conn = db.get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        assert db.compute_all_recipe_costs() == costs
+        assert statements == []
+        db.add_compra("Cacau", 1, "kg", 60.0, hoje)
+        statements.clear()
+        novos = db.compute_all_recipe_costs()
+    finally:
+        conn.set_trace_callback(None)
+    assert novos[bolo]['total_cost'] == pytest.approx(6.0)
+    assert novos[pao] == costs[pao]
+    assert len(statements) == 1 and f'IN ({bolo})' in statements[0]
+
+def test_sub_receitas_cost_rollup_and_cycles(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Farinha", 1, "kg", 4.0, hoje)
+    db.add_compra("Chocolate", 1, "kg", 50.0, hoje)
+    massa = db.add_receita("Massa", 1000, "g")
+    db.add_receita_ingrediente(massa, "Farinha", 800, "g")
+    ganache = db.add_receita("Ganache", 500, "g")
+    db.add_receita_ingrediente(ganache, "Chocolate", 300, "g")
+    bolo = db.add_receita("Bolo de Chocolate", 10, "un")
+    db.add_receita_sub_receita(bolo, massa, 0.5, "kg")
+    db.add_receita_sub_receita(bolo, ganache, 250, "g")
+
+    costs = db.compute_all_recipe_costs()
+    assert costs[massa]['total_cost'] == pytest.approx(3.2)
+    assert costs[ganache]['total_cost'] == pytest.approx(15.0)
+    assert costs[bolo]['total_cost'] == pytest.approx(0.5 * 3.2 + 0.5 * 15.0)
+    assert costs[bolo]['cost_per_unit'] == pytest.approx(0.91)
+
+    farinha = next(p for p in db.get_produtos() if p['nome']=="Farinha")
+    chocolate = next(p for p in db.get_produtos() if p['nome']=="Chocolate")
+    req = db.get_receita_requirements(bolo, quantidade=20)
+    assert req == {farinha['id']: pytest.approx(800), chocolate['id']: pytest.approx(300)}
+
+    # nova compra de chocolate: só Ganache e Bolo são recalculados
+    db.add_compra("Chocolate", 1, "kg", 70.0, hoje)
+    novos = db.compute_all_recipe_costs()
+    assert novos[massa] == costs[massa]
+    assert novos[ganache]['total_cost'] == pytest.approx(21.0)
+    assert novos[bolo]['total_cost'] == pytest.approx(0.5 * 3.2 + 0.5 * 21.0)
+
+    with pytest.raises(ValueError):
+        db.add_receita_sub_receita(massa, bolo, 1, "un")
+    with pytest.raises(ValueError):
+        db.add_receita_sub_receita(massa, massa, 1, "g")
+    with pytest.raises(ValueError):
+        db.delete_receita(massa)
+
+def test_max_producible(db):
+    pytest.importorskip("numpy")
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Farinha", 1, "kg", 5.0, hoje)
+    db.add_compra("Ovo", 6, "un", 6.0, hoje)
+    pao = db.add_receita("Pão", 10, "un")
+    db.add_receita_ingrediente(pao, "Farinha", 250, "g")
+    bolo = db.add_receita("Bolo", 8, "un")
+    db.add_receita_ingrediente(bolo, "Farinha", 200, "g")
+    db.add_receita_ingrediente(bolo, "Ovo", 4, "un")
+    vazia = db.add_receita("Vazia", 1, "un")
+
+    plano = db.max_producible()
+    assert plano[pao]['max_fornadas'] == pytest.approx(4)
+    assert plano[pao]['max_quantidade'] == pytest.approx(40)
+    assert plano[pao]['limitante'] == "Farinha"
+    assert plano[bolo]['max_fornadas'] == pytest.approx(1.5)
+    assert plano[bolo]['limitante'] == "Ovo"
+    assert plano[vazia]['max_fornadas'] == 0 and plano[vazia]['limitante'] is None
+
+def test_producao_single_commit_and_nested_savepoints(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    for nome in ("Farinha", "Açúcar", "Ovo"):
+        db.add_compra(nome, 1, "kg", 10.0, hoje)
+    rid = db.add_receita("Biscoito", 20, "un")
+    for nome in ("Farinha", "Açúcar", "Ovo"):
+        db.add_receita_ingrediente(rid, nome, 100, "g")
+
+    conn = db.get_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        db.add_producao(rid, 20, hoje)
+    finally:
+        conn.set_trace_callback(None)
+    assert [s for s in statements if s.strip().upper() == 'COMMIT'] == ['COMMIT']
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.add_compra("Sal", 1, "kg", 2.0, hoje)
+            raise RuntimeError('falha no meio da operação')
+    assert not any(p['nome']=="Sal" for p in db.get_produtos())
+
+    with db.transaction():
+        db.add_compra("Sal", 1, "kg", 2.0, hoje)
+        with pytest.raises(ValueError):
+            with db.transaction():
+                db.add_compra("Pimenta", 1, "kg", 9.0, hoje)
+                raise ValueError('desfaz só o bloco interno')
+    nomes = {p['nome'] for p in db.get_produtos()}
+    assert "Sal" in nomes and "Pimenta" not in nomes
+
+def test_wal_read_pool_does_not_block_on_writer(tmp_path):
+    import threading
+    dbm = DBManager(db_path=str(tmp_path / "wal.db"), wal=True, readers=2)
+    try:
+        assert dbm.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert dbm.conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        hoje = datetime.now().strftime("%d/%m/%Y")
+        dbm.add_compra("Arroz", 5, "kg", 30.0, hoje)
+
+        resultado = {}
+        def ler():
+            with dbm.read_connection() as conn:
+                resultado['qtd'] = conn.execute("SELECT quantidade FROM produtos WHERE nome = 'Arroz'").fetchone()['quantidade']
+                with pytest.raises(Exception):
+                    conn.execute("DELETE FROM produtos")
+
+        with dbm.transaction():
+            dbm.add_compra("Arroz", 1, "kg", 6.0, hoje)
+            t = threading.Thread(target=ler)
+            t.start(); t.join(timeout=5)
+            assert not t.is_alive()
+        # o leitor vê o último estado confirmado, sem esperar o escritor
+        assert resultado['qtd'] == pytest.approx(5000)
+        assert dbm.get_produtos()[0]['quantidade'] == pytest.approx(6000)
+    finally:
+        dbm.close()
+
+def test_vendas_diarias_rollup(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Suco", 10, "l", 50.0, hoje)
+    db.add_compra("Bolo", 20, "un", 40.0, hoje)
+    suco = next(p for p in db.get_produtos() if p['nome']=="Suco")
+    bolo = next(p for p in db.get_produtos() if p['nome']=="Bolo")
+    db.add_venda(suco['id'], 2, "l", 10.0, hoje)
+    db.add_vendas_batch([
+        {'produto_id': suco['id'], 'quantidade': 500, 'unidade': "ml", 'preco_unitario': 0.01, 'data_str': hoje},
+        {'produto_id': bolo['id'], 'quantidade': 3, 'unidade': "un", 'preco_unitario': 5.0, 'data_str': "01/01/2024"},
+    ])
+    conn = db.get_connection()
+    def resumo():
+        return [tuple(r) for r in conn.execute('SELECT dia, produto_id, quantidade_base, receita, n_vendas FROM vendas_diarias ORDER BY dia, produto_id')]
+    antes = resumo()
+    assert len(antes) == 2
+    assert antes[1][2:] == (pytest.approx(2500), pytest.approx(25.0), 2)
+
+    stats = db.compute_sales_and_cogs()
+    assert stats['revenue'] == pytest.approx(25.0)
+    assert stats['cogs'] == pytest.approx(2500 * 0.005)
+
+    db.rebuild_vendas_diarias()
+    assert resumo() == antes
+
+def test_paginas_por_chave(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compras_bulk([{'produto_nome': f'Item {i:03d}', 'quantidade': 5, 'unidade': 'un', 'preco_total': 5.0,
+                          'data_str': hoje, 'lote': f'L{i}'} for i in range(25)])
+    for p in db.get_produtos()[:12]:
+        db.add_venda(p['id'], 1, 'un', 2.0, hoje)
+
+    def todas(fetch, key):
+        rows, after = [], None
+        while True:
+            page = fetch(after, 7)
+            rows += page
+            if len(page) < 7:
+                return rows
+            after = key(page[-1])
+
+    prods = todas(lambda a, n: db.get_produtos_page(after=a, limit=n), lambda r: r['nome'])
+    assert [p['id'] for p in prods] == [p['id'] for p in db.get_produtos()]
+    compras = todas(lambda a, n: db.get_compras_recent_page(months=6, after=a, limit=n), lambda r: (r['data'], r['id']))
+    assert sorted(c['id'] for c in compras) == sorted(c['id'] for c in db.get_compras_recent(months=6))
+    assert len({c['id'] for c in compras}) == 25
+    vendas = todas(lambda a, n: db.get_vendas_por_data_page(hoje, after=a, limit=n), lambda r: r['id'])
+    assert [v['id'] for v in vendas] == [v['id'] for v in db.get_vendas_por_data(hoje)]
+
+def test_compras_paginadas_mesma_janela(db):
+    from datetime import timedelta
+    from utils.date_helpers import today_number
+    hoje = datetime.now()
+    db.add_compras_bulk([{'produto_nome': 'Farinha', 'quantidade': 1, 'unidade': 'kg', 'preco_total': 5.0,
+                          'data_str': (hoje - timedelta(days=d)).strftime('%d/%m/%Y')} for d in (0, 0, 3, 10, 40, 200)])
+    # linha antiga com data fora do ISO: a janela vale por data_dia nas duas listagens
+    conn = db.get_connection()
+    conn.execute("INSERT INTO compras (produto_id, quantidade_base, preco_total, data, data_dia) VALUES (1, 1, 1.0, ?, ?)",
+                 (hoje.strftime('%d/%m/%Y'), today_number()))
+    conn.commit()
+    compras, after = [], None
+    while True:
+        page = db.get_compras_recent_page(months=1, after=after, limit=2)
+        compras += page
+        if len(page) < 2:
+            break
+        after = (page[-1]['data'], page[-1]['id'])
+    assert len(compras) == 5
+    assert sorted(c['id'] for c in compras) == sorted(c['id'] for c in db.get_compras_recent(months=1))
+
+def test_busca_por_nome_sem_acentos(db):
+    for nome in ["Açúcar refinado", "Pão de açúcar", "Farinha", "Café"]:
+        db.add_or_get_produto(nome)
+    assert [p['nome'] for p in db.search_produtos("acucar")] == ["Açúcar refinado", "Pão de açúcar"]
+    assert [p['nome'] for p in db.search_produtos("AÇÚ", limit=1)] == ["Açúcar refinado"]
+    assert [p['nome'] for p in db.get_produtos(like="cafe")] == ["Café"]
+    # gatilhos mantêm o índice
+    pid = db.get_produto_by_nome("Café")['id']
+    with db.transaction() as cur:
+        cur.execute("UPDATE produtos SET nome = 'Cacau' WHERE id = ?", (pid,))
+    assert db.search_produtos("cafe") == []
+    assert [p['id'] for p in db.search_produtos("cac")] == [pid]
+    rid = db.add_receita("Bolo de Maçã", 1)
+    assert [r['id'] for r in db.search_receitas("maca")] == [rid]
+
+def test_catalogo_em_memoria(db, tmp_path):
+    pid = db.add_or_get_produto("Leite", "ml")
+    assert db.catalog('produtos').id_of("Leite") == pid
+    assert db.add_or_get_produto("Leite") == pid
+    fid = db.add_or_get_fornecedor("Atacadão")
+    assert db.catalog('fornecedores').get(fid)['nome'] == "Atacadão"
+    rid = db.add_receita("Pudim", 8)
+    db.update_receita(rid, "Pudim de leite", 8)
+    assert db.catalog('receitas').id_of("Pudim") is None
+    assert db.catalog('receitas').get(rid)['nome'] == "Pudim de leite"
+    # transação desfeita não deixa nomes fantasmas
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.add_or_get_produto("Fantasma")
+            raise RuntimeError
+    assert db.catalog('produtos').id_of("Fantasma") is None
+    # savepoint desfeito dentro de uma transação que continua também não
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    with db.transaction():
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                db.add_compra("Pimenta", 1, "kg", 9.0, hoje)
+                raise RuntimeError
+        assert db.catalog('produtos').id_of("Pimenta") is None
+        oregano = db.add_or_get_produto("Oregano", "g")
+        db.add_compra("Pimenta", 1, "kg", 9.0, hoje)
+    pimenta = db.catalog('produtos').id_of("Pimenta")
+    assert pimenta != oregano
+    assert db.conn.execute('SELECT produto_id FROM compras WHERE produto_id = ?', (pimenta,)).fetchone()
+    assert db.get_produto(oregano)['quantidade'] == 0
+    assert db.get_produto(pimenta)['quantidade'] == pytest.approx(1000)
+    # gravação de outro processo/conexão é detectada por PRAGMA data_version
+    outro = DBManager(db_path=db.db_path)
+    outro_id = outro.add_or_get_produto("Creme")
+    outro.close()
+    assert db.catalog('produtos').id_of("Creme") == outro_id
+
+def test_export_table_em_fluxo(db, tmp_path):
+    import csv, gzip
+    db.EXPORT_CHUNK = 3
+    db.add_compras_bulk([{'produto_nome': 'Farinha', 'quantidade': 1, 'unidade': 'kg', 'preco_total': 5.0,
+                          'data_str': f'{d:02d}/01/2024'} for d in range(1, 11)])
+    dest = tmp_path / "compras.csv.gz"
+    assert db.export_table('compras', str(dest), columns=['id', 'data'], start_date='03/01/2024', end_date='2024-01-07') == 5
+    with gzip.open(dest, 'rt', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['id', 'data'] and [r[1] for r in rows[1:]] == [f'2024-01-{d:02d}' for d in range(3, 8)]
+    with pytest.raises(ValueError):
+        db.export_table('compras; DROP TABLE compras', str(tmp_path / "x.csv"))
+    with pytest.raises(ValueError):
+        db.export_table('compras', str(tmp_path / "x.csv"), columns=['nao_existe'])
+    pq = pytest.importorskip("pyarrow.parquet")
+    assert db.export_table('compras', str(tmp_path / "compras.parquet")) == 10
+    assert pq.read_table(str(tmp_path / "compras.parquet")).num_rows == 10
+
+def test_export_table_sem_linhas(db, tmp_path):
+    import csv, gzip
+    db.add_compras_bulk([{'produto_nome': 'Farinha', 'quantidade': 1, 'unidade': 'kg', 'preco_total': 5.0, 'data_str': '01/01/2024'}])
+    # tabela vazia e período sem compras: só o cabeçalho, arquivo fechado e legível
+    assert db.export_table('despesas', str(tmp_path / "despesas.csv"), columns=['data', 'valor']) == 0
+    with open(tmp_path / "despesas.csv", newline='', encoding='utf-8') as f:
+        assert list(csv.reader(f)) == [['data', 'valor']]
+    assert db.export_table_csv('despesas', str(tmp_path / "despesas2.csv")) is False
+    assert db.export_table('compras', str(tmp_path / "compras.csv.gz"), columns=['id', 'data'], start_date='01/02/2024') == 0
+    with gzip.open(tmp_path / "compras.csv.gz", 'rt', encoding='utf-8') as f:
+        assert list(csv.reader(f)) == [['id', 'data']]
+
+def test_export_parquet_sem_linhas(db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    db.add_compras_bulk([{'produto_nome': 'Farinha', 'quantidade': 1, 'unidade': 'kg', 'preco_total': 5.0, 'data_str': '01/01/2024'}])
+    # nenhum lote chega ao writer: o esquema vem dos tipos declarados e o arquivo fecha com 0 linhas
+    assert db.export_table('compras', str(tmp_path / "compras.parquet"), columns=['id', 'quantidade_base', 'data'],
+                           start_date='01/02/2024') == 0
+    t = pq.read_table(str(tmp_path / "compras.parquet"))
+    assert t.num_rows == 0 and t.schema.names == ['id', 'quantidade_base', 'data']
+    assert [str(f.type) for f in t.schema] == ['int64', 'double', 'string']
+
+def test_reposicao_por_consumo(db, tmp_path):
+    pytest.importorskip("numpy")
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Farinha", 10, "kg", 50.0, hoje, fornecedor_nome="Moinho")
+    db.add_compra("Sal", 10, "kg", 20.0, hoje)
+    farinha = db.catalog('produtos').id_of("Farinha")
+    for _ in range(3):
+        db.add_venda(farinha, 1, "kg", 10.0, hoje)
+    # 3 kg em 1 dia: ponto de pedido 3 dias * 3000 g > 7000 g em estoque
+    plano = db.compute_reorder_plan(days=1, lead_time_days=3, cobertura_dias=2)
+    assert [p['nome'] for p in plano] == ["Farinha"]
+    p = plano[0]
+    assert p['fornecedor'] == "Moinho"
+    assert p['consumo_diario'] == pytest.approx(3000)
+    assert p['sugerido'] == pytest.approx(3000 * 5 - 7000)
+    # consumo baixo: nada a comprar, mas o reorder_level manual continua valendo
+    assert db.compute_reorder_plan(days=30) == []
+    db.set_produto_reorder(db.catalog('produtos').id_of("Sal"), 20000)
+    assert [p['nome'] for p in db.compute_reorder_plan(days=30)] == ["Sal"]
+    assert db.generate_reorder_csv(str(tmp_path / "pedido.csv"), days=30)
+
+def test_reposicao_producoes_retroativas(db, tmp_path):
+    pytest.importorskip("numpy")
+    from datetime import timedelta
+    hoje = datetime.now()
+
+    def plano_farinha(dbm, dias_atras):
+        dbm.add_compra("Farinha", 3, "kg", 15.0, (hoje - timedelta(days=9)).strftime("%d/%m/%Y"))
+        rid = dbm.add_receita("Pão", 1)
+        dbm.add_receita_ingrediente(rid, "Farinha", 500, "g")
+        for d in dias_atras:
+            dbm.add_producao(rid, 1, (hoje - timedelta(days=d)).strftime("%d/%m/%Y"))
+        return next(p for p in dbm.compute_reorder_plan(days=10) if p['nome'] == "Farinha")
+
+    # mesmo total: espalhado em 4 dias (lançado hoje, com a data de cada produção) ou num dia só
+    espalhado = plano_farinha(db, (1, 2, 3, 4))
+    concentrado = plano_farinha(DBManager(db_path=str(tmp_path / "concentrado.db")), (1, 1, 1, 1))
+    assert espalhado['consumo_diario'] == pytest.approx(concentrado['consumo_diario']) == pytest.approx(200)
+    assert espalhado['estoque_seguranca'] < concentrado['estoque_seguranca']
+
+def test_instrumentacao(db, tmp_path):
+    inst = db.enable_instrumentation(slow_ms=0)
+    db.add_compra("Farinha", 10, "kg", 50.0, None)
+    pid = db.catalog('produtos').id_of("Farinha")
+    db.add_venda(pid, 1, "kg", 10.0, None)
+    with pytest.raises(ValueError):
+        db.add_venda(pid, 100, "kg", 10.0, None)
+    m = inst.snapshot()['metodos']
+    assert m['add_venda']['n'] == 2 and m['add_venda']['erros'] == 1
+    assert m['add_compra']['max_comandos'] > 1
+    assert m['consume_from_lotes']['n'] == 1
+    lento = next(l for l in inst.snapshot()['lentos'] if l['sql'].startswith('SELECT'))
+    assert lento['plano']
+    assert 'add_venda' in inst.report()
+    # erros de fora dos métodos do DBManager (desenho do dashboard) também entram
+    inst.record_error('dashboard.desenhar')
+    assert inst.snapshot()['metodos']['dashboard.desenhar']['erros'] == 1
+    assert 'dashboard.desenhar' in inst.report()
+    inst.dump(str(tmp_path / "trace.json"))
+    assert db.disable_instrumentation() is inst
+    db.add_venda(pid, 1, "kg", 10.0, None)
+    assert inst.snapshot()['metodos']['add_venda']['n'] == 2
+
+def test_conversao_por_produto(db):
+    np = pytest.importorskip('numpy')
+    from utils.unit_converter import UnitConverter
+    q, bases = UnitConverter.to_base_many([1, 500, 2, 3], ['kg', 'mg', 'l', 'cx'])
+    assert q.tolist() == [1000, 0.5, 2000, 3] and bases == ['g', 'g', 'ml', 'cx']
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Leite", 2, "l", 10.0, hoje)
+    db.add_compra("Ovo", 12, "un", 12.0, hoje)
+    leite, ovo = db.catalog('produtos').id_of("Leite"), db.catalog('produtos').id_of("Ovo")
+    # sem densidade, g -> ml é recusado em vez de gravado como se fosse ml
+    with pytest.raises(ValueError):
+        db.add_venda(leite, 103, "g", 1.0, hoje)
+    db.set_produto_conversao(leite, densidade=1.03)
+    db.set_produto_conversao(ovo, peso_unidade=50)
+    db.add_venda(leite, 103, "g", 1.0, hoje)
+    assert db.get_produto(leite)['quantidade'] == pytest.approx(1900)
+    rid = db.add_receita("Omelete", 1)
+    db.add_receita_ingrediente(rid, "Ovo", 100, "g")
+    assert db.get_receita_ingredientes(rid)[0]['quantidade_base'] == pytest.approx(2)
+    db.add_vendas_batch([{'produto_id': ovo, 'quantidade': 0.5, 'unidade': 'kg', 'preco_unitario': 1.0, 'data_str': hoje}])
+    assert db.get_produto(ovo)['quantidade'] == pytest.approx(2)
+
+def test_gravacoes_em_lote_sem_numpy(db, monkeypatch):
+    # sem numpy as gravações em lote convertem linha a linha (to_product_base)
+    monkeypatch.setitem(__import__('sys').modules, 'numpy', None)
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    assert db.add_compras_bulk([{'produto_nome': "Leite", 'quantidade': 2, 'unidade': "l", 'preco_total': 10.0, 'data_str': hoje},
+                                {'produto_nome': "Leite", 'quantidade': 500, 'unidade': "ml", 'preco_total': 3.0, 'data_str': hoje}]) == 2
+    leite = db.catalog('produtos').id_of("Leite")
+    assert db.get_produto(leite)['quantidade'] == pytest.approx(2500)
+    with pytest.raises(ValueError, match="Item 2"):
+        db.add_vendas_batch([{'produto_id': leite, 'quantidade': 1, 'unidade': 'l', 'preco_unitario': 1.0, 'data_str': hoje},
+                             {'produto_id': leite, 'quantidade': 100, 'unidade': 'g', 'preco_unitario': 1.0, 'data_str': hoje}])
+    db.set_produto_conversao(leite, densidade=1.03)
+    db.add_vendas_batch([{'produto_id': leite, 'quantidade': 1, 'unidade': 'l', 'preco_unitario': 1.0, 'data_str': hoje},
+                         {'produto_id': leite, 'quantidade': 103, 'unidade': 'g', 'preco_unitario': 1.0, 'data_str': hoje}])
+    assert db.get_produto(leite)['quantidade'] == pytest.approx(1400)
+
+def test_datas_estritas_nas_gravacoes(db):
+    from utils.date_helpers import parse_date_input, parse_dates_many
+    assert parse_date_input(" 05/03/2024 ") == parse_date_input("2024-03-05") == "2024-03-05"
+    assert parse_dates_many(["05/03/2024", "5/3/2024", "2024-03-05T10:00"]) == ["2024-03-05"] * 3
+    with pytest.raises(ValueError):
+        parse_date_input("31/02/2024", strict=True)
+    with pytest.raises(ValueError):
+        db.add_compra("Sal", 1, "kg", 3.0, "ontem")
+    with pytest.raises(ValueError, match="Item 2"):
+        db.add_compras_bulk([{'produto_nome': "Sal", 'quantidade': 1, 'unidade': "kg", 'preco_total': 3.0, 'data_str': d}
+                             for d in ("01/03/2024", "2024-13-01")])
+    assert db.get_produto_by_nome("Sal") is None
+
+def test_colunas_dia_backfill_e_gatilhos(db, tmp_path):
+    from utils.date_helpers import day_number
+    hoje = datetime.now().strftime("%Y-%m-%d")
+    db.add_compra("Leite", 10, "l", 50.0, hoje, validade=hoje)
+    pid = db.catalog('produtos').id_of("Leite")
+    db.add_venda(pid, 1, "l", 8.0, hoje)
+    # gravação direta, sem data_dia (como population.py): o gatilho preenche
+    db.conn.execute("INSERT INTO vendas (produto_id, quantidade, quantidade_base, preco_unitario, data) VALUES (?,?,?,?,?)",
+                    (pid, 1, 1000, 8.0, "2024-02-29"))
+    assert db.conn.execute("SELECT data_dia FROM vendas WHERE data = '2024-02-29'").fetchone()[0] == day_number("2024-02-29")
+    # base antiga: colunas vazias são preenchidas ao abrir
+    db.conn.execute("UPDATE vendas SET data_dia = NULL")
+    db.conn.commit()
+    db.close()
+    db2 = DBManager(db_path=str(tmp_path / "test_sistema.db"))
+    assert db2.conn.execute("SELECT COUNT(*) FROM vendas WHERE data_dia IS NULL").fetchone()[0] == 0
+    assert len(db2.get_vendas_por_data(hoje)) == 1
+    assert [l['lote'] for l in db2.lots_expiring_within(0)] == [None]
+    db2.close()
+
+def test_custo_por_lote_e_cogs(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Farinha", 1, "kg", 4.0, hoje, validade="01/01/2098")
+    db.add_compra("Farinha", 1, "kg", 6.0, hoje, validade="01/01/2099")
+    farinha = db.catalog('produtos').id_of("Farinha")
+    # a primeira venda leva 800 g do lote mais barato; a segunda, 200 g dele e 200 g do outro
+    db.add_vendas_batch([{'produto_id': farinha, 'quantidade': q, 'unidade': "g", 'preco_unitario': 0.02, 'data_str': hoje}
+                         for q in (800, 400)])
+    custos = [r['custo'] for r in db.conn.execute('SELECT custo FROM vendas ORDER BY id')]
+    assert custos == [pytest.approx(3.2), pytest.approx(0.8 + 1.2)]
+    assert db.compute_sales_and_cogs()['cogs'] == pytest.approx(5.2)
+    assert db.compute_sales_and_cogs()['cogs_est'] == pytest.approx(5.2)
+    # lote da produção custa o que os insumos consumidos custaram
+    rid = db.add_receita("Pão", 2)
+    db.add_receita_ingrediente(rid, "Farinha", 500, "g")
+    db.add_producao(rid, 2, hoje)
+    lote = db.conn.execute("SELECT custo_unitario FROM lotes WHERE lote = 'producao'").fetchone()
+    assert lote['custo_unitario'] == pytest.approx(500 * 0.006 / 2)
+    pao = db.catalog('produtos').id_of("Pão")
+    db.add_venda(pao, 1, "un", 5.0, hoje)
+    assert db.compute_sales_and_cogs()['cogs'] == pytest.approx(5.2 + 1.5)
+    db.rebuild_vendas_diarias()
+    assert db.compute_sales_and_cogs()['cogs'] == pytest.approx(6.7)
+    # alterar a única venda do dia (o resumo do dia é apagado e recriado) mantém o custo
+    pao_venda = db.conn.execute('SELECT MAX(id) FROM vendas').fetchone()[0]
+    db.conn.execute('UPDATE vendas SET preco_unitario = 6 WHERE id = ?', (pao_venda,))
+    db.conn.execute('UPDATE vendas SET quantidade = 2, quantidade_base = 2 WHERE id = ?', (pao_venda,))
+    # venda gravada sem custo recebe a estimativa, também no resumo
+    db.conn.execute("INSERT INTO vendas (produto_id, quantidade, quantidade_base, preco_unitario, data) VALUES (?, 100, 100, 0.02, date('now'))", (farinha,))
+    db.conn.commit()
+    assert db.conn.execute('SELECT custo FROM vendas ORDER BY id DESC').fetchone()['custo'] == pytest.approx(0.6)
+    assert db.compute_sales_and_cogs()['cogs'] == pytest.approx(7.3)
+    db.conn.execute('DELETE FROM vendas WHERE id = ?', (pao_venda,))
+    db.conn.commit()
+    assert db.compute_sales_and_cogs()['cogs'] == pytest.approx(5.8)
+    db.rebuild_vendas_diarias()
+    assert db.compute_sales_and_cogs()['cogs'] == pytest.approx(5.8)
+
+def test_rastreabilidade_de_lotes(db):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    db.add_compra("Farinha", 1, "kg", 4.0, hoje, lote="L1", validade="01/01/2098")
+    db.add_compra("Farinha", 1, "kg", 6.0, hoje, lote="L2", validade="01/01/2099")
+    farinha = db.catalog('produtos').id_of("Farinha")
+    db.add_vendas_batch([{'produto_id': farinha, 'quantidade': q, 'unidade': "g", 'preco_unitario': 0.02, 'data_str': hoje}
+                         for q in (800, 400)])
+    v1, v2 = [r['id'] for r in db.conn.execute('SELECT id FROM vendas ORDER BY id')]
+    rid = db.add_receita("Pão", 2)
+    db.add_receita_ingrediente(rid, "Farinha", 500, "g")
+    prod = db.add_producao(rid, 2, hoje)
+    pao = db.add_venda(db.catalog('produtos').id_of("Pão"), 1, "un", 5.0, hoje)
+    w = db.add_waste(farinha, 100, "g", "mofo", hoje)
+    assert [(r['origem'], r['origem_id'], r['quantidade_base']) for r in db.trace_lote("L1")] == [
+        ('venda', v1, pytest.approx(800)), ('venda', v2, pytest.approx(200))]
+    # L2 -> venda, produção e desperdício; pela produção, a venda do pão (nível 1)
+    ida = [(r['nivel'], r['origem'], r['origem_id']) for r in db.trace_lote("L2")]
+    assert sorted(ida) == [(0, 'producao', prod), (0, 'venda', v2), (0, 'waste', w), (1, 'venda', pao)]
+    volta = [(r['nivel'], r['lote'], r['quantidade_base']) for r in db.trace_origem('venda', pao)]
+    assert volta == [(0, 'producao', pytest.approx(1)), (1, 'L2', pytest.approx(500))]
+    total = db.conn.execute("SELECT SUM(custo) FROM lote_movimentos WHERE origem = 'venda'").fetchone()[0]
+    assert total == pytest.approx(db.compute_sales_and_cogs()['cogs'])
+    # a última venda apagada libera o id; a próxima venda não herda os lotes dela
+    with db.transaction() as cur:
+        cur.execute('DELETE FROM vendas WHERE id = ?', (pao,))
+    outra = db.add_venda(farinha, 50, "g", 0.02, hoje)
+    assert outra == pao
+    assert [(r['lote'], r['quantidade_base']) for r in db.trace_origem('venda', outra)] == [('L2', pytest.approx(50))]
+
+def test_ajustes_com_a_data_da_operacao(db):
+    from utils.date_helpers import day_number
+    db.add_compra("Farinha", 5, "kg", 20.0, "01/03/2024")
+    farinha = db.catalog('produtos').id_of("Farinha")
+    rid = db.add_receita("Pão", 2)
+    db.add_receita_ingrediente(rid, "Farinha", 500, "g")
+    prod = db.add_producao(rid, 2, "05/03/2024")
+    dias = {r['motivo']: r['data_dia'] for r in db.conn.execute('SELECT motivo, data_dia FROM stock_adjustments')}
+    assert dias == {'Produção Pão': day_number('2024-03-05'), 'producao': day_number('2024-03-05')}
+    mov = db.conn.execute("SELECT data_dia FROM lote_movimentos WHERE origem = 'producao' AND origem_id = ?", (prod,)).fetchone()
+    assert mov['data_dia'] == day_number('2024-03-05')
+    # lote de vendas em dias diferentes: um ajuste por dia, encadeados
+    db.add_vendas_batch([{'produto_id': farinha, 'quantidade': q, 'unidade': "g", 'preco_unitario': 0.02, 'data_str': d}
+                         for q, d in ((100, "06/03/2024"), (200, "07/03/2024"), (300, "06/03/2024"))])
+    ajustes = [(r['data'], r['before_qty'], r['after_qty']) for r in db.conn.execute(
+        "SELECT data, before_qty, after_qty FROM stock_adjustments WHERE motivo = 'venda' ORDER BY id")]
+    assert ajustes == [('2024-03-06', pytest.approx(4500), pytest.approx(4100)), ('2024-03-07', pytest.approx(4100), pytest.approx(3900))]
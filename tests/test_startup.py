@@ -0,0 +1,7 @@
+# tests/test_startup.py
+from benchmarks.bench_startup import importtime, pesados_importados
+
+
+def test_abertura_nao_importa_bibliotecas_de_graficos():
+    # pandas/seaborn/matplotlib custam ~1,5 s; só o dashboard os carrega, sob demanda
+    assert pesados_importados(importtime('ui.app')) == []
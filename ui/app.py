@@ -1,13 +1,21 @@
 # ui/app.py
+import atexit
+import importlib
+import os
 import tkinter as tk
 from tkinter import ttk
 from db.db_manager import DBManager
-from ui.dashboard import DashboardTab
-from ui.compras import ComprasTab
-from ui.estoque import EstoqueTab
-from ui.receitas import ReceitasTab
-from ui.producao import ProducaoTab
-from ui.vendas import VendasTab
+
+# (atributo, módulo, classe, título). As abas são criadas na primeira vez que
+# são selecionadas: até lá não importam seus módulos nem consultam o banco.
+TABS = [
+    ('frame_dashboard', 'ui.dashboard', 'DashboardTab', 'Dashboard'),
+    ('frame_compras', 'ui.compras', 'ComprasTab', 'Compras'),
+    ('frame_estoque', 'ui.estoque', 'EstoqueTab', 'Estoque'),
+    ('frame_receitas', 'ui.receitas', 'ReceitasTab', 'Receitas'),
+    ('frame_producao', 'ui.producao', 'ProducaoTab', 'Produção'),
+    ('frame_vendas', 'ui.vendas', 'VendasTab', 'Vendas'),
+]
 
 class App(tk.Tk):
     def __init__(self):
@@ -16,7 +24,13 @@ class App(tk.Tk):
         self.geometry('1100x720')
         self.minsize(1000,650)
 
-        self.db = DBManager()
+        # WAL + pool de leitura: abas podem consultar em segundo plano sem travar os registros
+        self.db = DBManager(wal=True, readers=2)
+        # CULINARIO_TRACE=arquivo.json liga a instrumentação e grava as métricas ao sair
+        # (relatório: python -m db.instrumentation arquivo.json)
+        trace = os.environ.get('CULINARIO_TRACE')
+        if trace:
+            atexit.register(self.db.enable_instrumentation(slow_ms=50).dump, trace)
 
         style = ttk.Style(self)
         try:
@@ -28,16 +42,28 @@ class App(tk.Tk):
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(fill='both', expand=True, padx=6, pady=6)
 
-        self.frame_dashboard = DashboardTab(self.notebook, self.db)
-        self.frame_compras = ComprasTab(self.notebook, self.db)
-        self.frame_estoque = EstoqueTab(self.notebook, self.db)
-        self.frame_receitas = ReceitasTab(self.notebook, self.db)
-        self.frame_producao = ProducaoTab(self.notebook, self.db)
-        self.frame_vendas = VendasTab(self.notebook, self.db)
-
-        self.notebook.add(self.frame_dashboard, text='Dashboard')
-        self.notebook.add(self.frame_compras, text='Compras')
-        self.notebook.add(self.frame_estoque, text='Estoque')
-        self.notebook.add(self.frame_receitas, text='Receitas')
-        self.notebook.add(self.frame_producao, text='Produção')
-        self.notebook.add(self.frame_vendas, text='Vendas')
+        # cada página começa como um contêiner vazio; self.frame_* fica None até a aba ser aberta
+        self._containers = {}
+        for attr, module, cls, text in TABS:
+            container = ttk.Frame(self.notebook)
+            self.notebook.add(container, text=text)
+            self._containers[str(container)] = (attr, module, cls, container)
+            setattr(self, attr, None)
+
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
+        # a primeira aba já vem selecionada, mas o evento só dispara ao entrar no loop
+        self._ensure_tab(self.notebook.select())
+
+    def _on_tab_changed(self, event=None):
+        self._ensure_tab(self.notebook.select())
+
+    def _ensure_tab(self, tab_id):
+        """Cria a aba correspondente a tab_id, se ainda não existir, e a retorna."""
+        attr, module, cls, container = self._containers[str(tab_id)]
+        tab = getattr(self, attr)
+        if tab is None:
+            tab_cls = getattr(importlib.import_module(module), cls)
+            tab = tab_cls(container, self.db)
+            tab.pack(fill='both', expand=True)
+            setattr(self, attr, tab)
+        return tab
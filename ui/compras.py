@@ -3,6 +3,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from utils.unit_converter import UnitConverter
 from utils.trunc import truncar_float
+from utils.paged_treeview import PagedTreeview
 from datetime import datetime
 
 class ComprasTab(ttk.Frame):
@@ -25,10 +26,13 @@ class ComprasTab(ttk.Frame):
         ttk.Button(form, text='Registrar Compra', command=self.on_add_compra).grid(row=5,column=0, pady=8)
         ttk.Button(form, text='Atualizar Lista', command=self.refresh_list).grid(row=5,column=1, padx=6)
 
-        self.tree = ttk.Treeview(self, columns=('produto','quantidade','unidade','preco','data','lote'), show='headings')
+        self.list = PagedTreeview(self, ('produto','quantidade','unidade','preco','data','lote'),
+                                  fetch_page=lambda after, limit: self.db.get_compras_recent_page(months=6, after=after, limit=limit),
+                                  row_values=self._row_values, row_key=lambda r: (r['data'], r['id']))
+        self.tree = self.list.tree
         for c in ('produto','quantidade','unidade','preco','data','lote'):
             self.tree.heading(c, text=c.capitalize())
-        self.tree.pack(fill='both', expand=True, padx=6, pady=6)
+        self.list.pack(fill='both', expand=True, padx=6, pady=6)
 
     def on_add_compra(self):
         produto = self.ent_produto.get().strip()
@@ -54,13 +58,13 @@ class ComprasTab(ttk.Frame):
             messagebox.showerror('Erro', str(e))
 
     def refresh_list(self):
-        for r in self.tree.get_children(): self.tree.delete(r)
-        rows = self.db.get_compras_recent(months=6)
-        for r in rows:
-            fornecedor = r['fornecedor_nome'] if 'fornecedor_nome' in r.keys() else ''
-            try:
-                qtd_s = f"{float(r['quantidade'] or 0):.2f}"
-            except Exception:
-                qtd_s = str(r['quantidade'] or '')
-            preco_s = f"{float(r['preco_total'] or 0):.2f}"
-            self.tree.insert('', 'end', values=(r['produto_nome'], qtd_s, r['unidade'] or '', preco_s, r['data'], r['lote']))
+        self.list.reload()
+
+    @staticmethod
+    def _row_values(r):
+        try:
+            qtd_s = f"{float(r['quantidade'] or 0):.2f}"
+        except Exception:
+            qtd_s = str(r['quantidade'] or '')
+        preco_s = f"{float(r['preco_total'] or 0):.2f}"
+        return (r['produto_nome'], qtd_s, r['unidade'] or '', preco_s, r['data'], r['lote'])
@@ -1,11 +1,12 @@
+import logging
 import tkinter as tk
 from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
 
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+logger = logging.getLogger(__name__)
 
-# Importa as 4 funções de plotagem do seu arquivo de utilitários
-from utils.dash import plot_sales_trend, plot_top_products, plot_stock_levels, plot_purchases_by_supplier
+# matplotlib, pandas e seaborn (via utils.dash) são importados só depois que a
+# aba aparece na tela, em segundo plano, para não atrasar a abertura da janela.
 
 class DashboardTab(ttk.Frame):
     def __init__(self, parent, db):
@@ -19,15 +20,17 @@ class DashboardTab(ttk.Frame):
         super().__init__(parent, padding=8)
         self.db = db
 
-        # Inicializa as quatro figuras do Matplotlib que conterão os gráficos
-        self.fig1 = Figure(dpi=100)
-        self.fig2 = Figure(dpi=100)
-        self.fig3 = Figure(dpi=100)
-        self.fig4 = Figure(dpi=100)
+        # Consultas e montagem das figuras rodam fora do loop do Tk; cada
+        # tarefa usa uma conexão de leitura própria (db.read_connection).
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='dashboard')
+        self._pending = []          # (future, callback, geração) aguardando entrega
+        self._generation = 0        # incrementa a cada refresh; resultados antigos são descartados
+        self._polling = False
+        self.charts = []            # (canvas, função de plot), criado em _build_charts
 
-        # Constrói a interface gráfica e carrega os dados iniciais
+        # Constrói a interface; gráficos e dados carregam quando a aba é exibida
         self._build_ui()
-        self.refresh()
+        self._map_binding = self.bind('<Map>', self._on_first_map, add='+')
 
     def _build_ui(self):
         """Constrói todos os widgets da interface do dashboard."""
@@ -42,7 +45,7 @@ class DashboardTab(ttk.Frame):
         ttk.Label(stats_frame, text='📊 Dashboard', font=('Segoe UI', 14, 'bold')).pack(anchor='w')
         self.lbl_rev = ttk.Label(stats_frame, text='Receita (30d): R$ 0.00')
         self.lbl_rev.pack(anchor='w', pady=1)
-        self.lbl_cogs = ttk.Label(stats_frame, text='COGS (estimado 30d): R$ 0.00')
+        self.lbl_cogs = ttk.Label(stats_frame, text='COGS (30d): R$ 0.00')
         self.lbl_cogs.pack(anchor='w', pady=1)
         self.lbl_stock = ttk.Label(stats_frame, text='Valor estoque: R$ 0.00')
         self.lbl_stock.pack(anchor='w', pady=1)
@@ -51,8 +54,41 @@ class DashboardTab(ttk.Frame):
         self.btn_refresh.pack(side="right", anchor="ne", pady=6)
         
         # --- Painel Inferior: Grade de Gráficos ---
-        charts_frame = ttk.Frame(self)
-        charts_frame.pack(expand=True, fill='both')
+        self.charts_frame = ttk.Frame(self)
+        self.charts_frame.pack(expand=True, fill='both')
+        self.lbl_loading = ttk.Label(self.charts_frame, text='Carregando gráficos...', foreground='gray')
+        self.lbl_loading.pack(expand=True)
+
+    def _on_first_map(self, event=None):
+        self.unbind('<Map>', self._map_binding)
+        # geração None: não é cancelada nem descartada por refresh()
+        self._submit(None, self._import_chart_libs, self._build_charts)
+        self.refresh()
+
+    @staticmethod
+    def _import_chart_libs():
+        """Roda na thread de trabalho: faz as importações pesadas antes de criar os gráficos."""
+        import matplotlib.figure  # noqa: F401
+        import matplotlib.backends.backend_tkagg  # noqa: F401
+        import utils.dash  # noqa: F401  (pandas, seaborn)
+
+    def _build_charts(self, result=None):
+        """Cria a grade de gráficos (thread do Tk) e dispara a primeira atualização."""
+        if isinstance(result, Exception):
+            self.lbl_loading.config(text='Erro ao carregar gráficos')
+            return
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from utils.dash import plot_sales_trend, plot_top_products, plot_stock_levels, plot_purchases_by_supplier
+
+        self.lbl_loading.destroy()
+        charts_frame = self.charts_frame
+
+        # Inicializa as quatro figuras do Matplotlib que conterão os gráficos
+        self.fig1 = Figure(dpi=100)
+        self.fig2 = Figure(dpi=100)
+        self.fig3 = Figure(dpi=100)
+        self.fig4 = Figure(dpi=100)
 
         # Configura a grade (2 colunas, 2 linhas) para expandir com a janela
         charts_frame.grid_columnconfigure(0, weight=1)
@@ -73,41 +109,119 @@ class DashboardTab(ttk.Frame):
         self.canvas3.get_tk_widget().grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
         self.canvas4.get_tk_widget().grid(row=1, column=1, sticky='nsew', padx=5, pady=5)
 
+        self.charts = [
+            (self.canvas1, plot_sales_trend),
+            (self.canvas2, plot_top_products),
+            (self.canvas3, plot_stock_levels),
+            (self.canvas4, plot_purchases_by_supplier),
+        ]
+        # entra na atualização corrente sem descartar as estatísticas em andamento
+        self._refresh_charts(self._generation)
+
     def refresh(self):
-        """Busca os dados mais recentes do banco e atualiza todos os elementos da tela."""
-        
-        # 1. Atualiza os labels de estatísticas
-        try:
-            stats = self.db.compute_sales_and_cogs()
-            stock_val = self.db.total_stock_value()
-            self.lbl_rev.config(text=f"Receita (30d): R$ {stats['revenue']:.2f}")
-            self.lbl_cogs.config(text=f"COGS (estimado 30d): R$ {stats['cogs_est']:.2f}")
-            self.lbl_stock.config(text=f"Valor estoque: R$ {stock_val:.2f}")
-        except Exception as e:
-            print(f"Erro ao atualizar estatísticas: {e}")
+        """
+        Dispara a atualização em segundo plano e retorna imediatamente.
+        Cliques repetidos cancelam as tarefas ainda não iniciadas da
+        atualização anterior e descartam seus resultados.
+        """
+        self._generation += 1
+        gen = self._generation
+        for future, _, g in self._pending:
+            if g is not None:
+                future.cancel()
+        self._pending = [p for p in self._pending if p[2] is None]
+
+        self._refresh_stats(gen)
+        self._refresh_charts(gen)
+
+    def _refresh_stats(self, gen):
+        self.lbl_rev.config(text='Receita (30d): carregando...')
+        self.lbl_cogs.config(text='COGS (30d): carregando...')
+        self.lbl_stock.config(text='Valor estoque: carregando...')
+        self._submit(gen, self._fetch_stats, self._show_stats)
+
+    def _refresh_charts(self, gen):
+        # vazio até _build_charts: cada gráfico é montado em uma Figure nova e trocado ao chegar
+        for canvas, plot_fn in self.charts:
+            self._show_loading(canvas)
+            size, dpi = canvas.figure.get_size_inches(), canvas.figure.dpi
+            self._submit(gen, lambda plot_fn=plot_fn, size=size, dpi=dpi: self._build_figure(plot_fn, size, dpi),
+                         lambda fig, canvas=canvas: self._install_figure(canvas, fig))
+
+    # --- execução em segundo plano ---
+    def _submit(self, gen, job, callback):
+        future = self._executor.submit(job)
+        deliver = callback if gen is None else (lambda result: callback(result) if gen == self._generation else None)
+        self._pending.append((future, deliver, gen))
+        if not self._polling:
+            self._polling = True
+            self.after(50, self._poll)
+
+    def _poll(self):
+        """Entrega no loop do Tk os resultados prontos (via after, nunca da thread de trabalho)."""
+        prontos = [p for p in self._pending if p[0].done()]
+        self._pending = [p for p in self._pending if not p[0].done()]
+        for future, callback, _ in prontos:
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception("Erro ao atualizar dashboard")
+                self._registrar_erro('dashboard.atualizar')
+                result = e
+            try:
+                callback(result)
+            except Exception:
+                logger.exception("Erro ao desenhar dashboard")
+                self._registrar_erro('dashboard.desenhar')
+        if self._pending:
+            self.after(50, self._poll)
+        else:
+            self._polling = False
+
+    def _registrar_erro(self, nome):
+        # com a instrumentação ligada, o erro aparece em report()/dump()
+        inst = getattr(self.db, 'instrumentation', None)
+        if inst is not None:
+            inst.record_error(nome)
+
+    def _fetch_stats(self):
+        return {'stats': self.db.compute_sales_and_cogs(), 'stock_val': self.db.total_stock_value()}
+
+    def _build_figure(self, plot_fn, size, dpi):
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=size, dpi=dpi)
+        with self.db.read_connection() as conn:
+            plot_fn(conn, fig)
+        return fig
+
+    # --- aplicação dos resultados (thread do Tk) ---
+    def _show_stats(self, result):
+        if isinstance(result, Exception):
             self.lbl_rev.config(text="Receita (30d): Erro")
-            self.lbl_cogs.config(text="COGS (estimado 30d): Erro")
+            self.lbl_cogs.config(text="COGS (30d): Erro")
             self.lbl_stock.config(text="Valor estoque: Erro")
-
-
-        # 2. Atualiza os gráficos
-        try:
-            conn = self.db.get_connection()
-
-            # Gráfico 1 (Canto Superior Esquerdo)
-            plot_sales_trend(conn, self.fig1)
-            self.canvas1.draw()
-
-            # Gráfico 2 (Canto Superior Direito)
-            plot_top_products(conn, self.fig2)
-            self.canvas2.draw()
-
-            # Gráfico 3 (Canto Inferior Esquerdo)
-            plot_stock_levels(conn, self.fig3)
-            self.canvas3.draw()
-
-            # Gráfico 4 (Canto Inferior Direito)
-            plot_purchases_by_supplier(conn, self.fig4)
-            self.canvas4.draw()
-        except Exception as e:
-            print(f"Erro ao desenhar gráficos: {e}")
\ No newline at end of file
+            return
+        stats = result['stats']
+        self.lbl_rev.config(text=f"Receita (30d): R$ {stats['revenue']:.2f}")
+        self.lbl_cogs.config(text=f"COGS (30d): R$ {stats['cogs']:.2f}")
+        self.lbl_stock.config(text=f"Valor estoque: R$ {result['stock_val']:.2f}")
+
+    def _show_loading(self, canvas, text='Carregando...'):
+        fig = canvas.figure
+        fig.clear()
+        fig.text(0.5, 0.5, text, ha='center', va='center', color='gray')
+        canvas.draw_idle()
+
+    def _install_figure(self, canvas, fig):
+        if isinstance(fig, Exception):
+            self._show_loading(canvas, 'Erro ao carregar gráfico')
+            return
+        fig.set_canvas(canvas)
+        canvas.figure = fig
+        canvas.draw_idle()
+
+    def destroy(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        super().destroy()
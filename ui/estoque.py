@@ -2,6 +2,7 @@
 import tkinter as tk
 from tkinter import ttk
 from utils.date_helpers import iso_to_display
+from utils.paged_treeview import PagedTreeview
 
 class EstoqueTab(ttk.Frame):
     def __init__(self, parent, db):
@@ -14,24 +15,45 @@ class EstoqueTab(ttk.Frame):
         ttk.Label(self, text='📦 Estoque', font=('Segoe UI', 14)).pack(anchor='w')
         toolbar = ttk.Frame(self); toolbar.pack(fill='x', padx=6, pady=6)
         ttk.Button(toolbar, text='Atualizar', command=self.refresh).pack(side='left')
-        ttk.Button(toolbar, text='Gerar Reorder CSV', command=self._gen_reorder).pack(side='left', padx=6)
-        self.tree = ttk.Treeview(self, columns=('nome','qtd','un_base','reorder'), show='headings')
+        self.btn_reorder = ttk.Button(toolbar, text='Gerar Reorder CSV', command=self._gen_reorder)
+        self.btn_reorder.pack(side='left', padx=6)
+        self.list = PagedTreeview(self, ('nome','qtd','un_base','reorder'),
+                                  fetch_page=lambda after, limit: self.db.get_produtos_page(after=after, limit=limit),
+                                  row_values=lambda p: (p['nome'], f"{p['quantidade']:.2f}", p['unidade_base'], p['reorder_level'] or 0),
+                                  row_key=lambda p: p['nome'])
+        self.tree = self.list.tree
         for k,t in [('nome','Produto'),('qtd','Quantidade (base)'),('un_base','Unidade base'),('reorder','Reorder level')]:
             self.tree.heading(k, text=t)
-        self.tree.pack(fill='both', expand=True, padx=6, pady=6)
+        self.list.pack(fill='both', expand=True, padx=6, pady=6)
         ttk.Label(self, text='Lotes próximos do vencimento:').pack(anchor='w', padx=6)
         self.expire_tree = ttk.Treeview(self, columns=('produto','qtd','validade'), show='headings')
         for c,t in [('produto','Produto'),('qtd','Quantidade'),('validade','Validade')]:
             self.expire_tree.heading(c, text=t)
         self.expire_tree.pack(fill='x', padx=6, pady=(0,6))
+        self.reorder_label = ttk.Label(self, text='Sugestão de compra (consumo dos últimos 30 dias):')
+        self.reorder_label.pack(anchor='w', padx=6)
+        self.reorder_tree = ttk.Treeview(self, columns=('fornecedor','produto','consumo','qtd','sugerido','un'), show='headings', height=6)
+        for c,t in [('fornecedor','Fornecedor'),('produto','Produto'),('consumo','Consumo/dia'),('qtd','Estoque'),('sugerido','Sugerido'),('un','Unid base')]:
+            self.reorder_tree.heading(c, text=t)
+        self.reorder_tree.pack(fill='x', padx=6, pady=(0,6))
 
     def refresh(self):
-        for r in self.tree.get_children(): self.tree.delete(r)
+        self.list.reload()
         for r in self.expire_tree.get_children(): self.expire_tree.delete(r)
-        for p in self.db.get_produtos():
-            self.tree.insert('', 'end', values=(p['nome'], f"{p['quantidade']:.2f}", p['unidade_base'], p['reorder_level'] or 0))
         for l in self.db.lots_expiring_within(days=7):
             self.expire_tree.insert('', 'end', values=(l['nome'], f"{l['quantidade_base']:.2f}", iso_to_display(l['data_validade'])))
+        if not self.reorder_tree.winfo_manager():
+            return
+        for r in self.reorder_tree.get_children(): self.reorder_tree.delete(r)
+        try:
+            plano = self.db.compute_reorder_plan()
+        except ImportError:
+            # sugestão de compra requer numpy (dependência opcional): sem ele o painel e o botão somem
+            for w in (self.reorder_label, self.reorder_tree, self.btn_reorder):
+                w.pack_forget()
+            return
+        for p in plano:
+            self.reorder_tree.insert('', 'end', values=(p['fornecedor'] or '-', p['nome'], f"{p['consumo_diario']:.2f}", f"{p['quantidade']:.2f}", f"{p['sugerido']:.0f}", p['unidade_base']))
 
     def _gen_reorder(self):
         import tkinter.filedialog as fd
@@ -42,4 +64,4 @@ class EstoqueTab(ttk.Frame):
         if ok:
             tk.messagebox.showinfo('Gerado', f'Pedido de compra salvo em {dest}')
         else:
-            tk.messagebox.showinfo('Nada', 'Nenhum produto abaixo do reorder level')
+            tk.messagebox.showinfo('Nada', 'Nenhum produto precisa de reposição')
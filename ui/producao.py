@@ -19,18 +19,46 @@ class ProducaoTab(ttk.Frame):
         ttk.Label(frm, text='Data (opcional DD/MM/AAAA):').grid(row=2,column=0); self.ent_data = ttk.Entry(frm, width=12); self.ent_data.grid(row=2,column=1)
         ttk.Button(frm, text='Registrar produção', command=self.on_produce).grid(row=3,column=0, columnspan=2, pady=8)
         ttk.Button(frm, text='Atualizar receitas', command=self.refresh_receitas).grid(row=4,column=0, columnspan=2)
+
+        self.plan_label = ttk.Label(self, text='Produção possível com o estoque atual (duplo clique para selecionar):')
+        self.plan_label.pack(anchor='w', padx=6)
+        self.plan_tree = ttk.Treeview(self, columns=('receita','qtd','un','limitante'), show='headings')
+        for c,t in [('receita','Receita'),('qtd','Qtd máx.'),('un','Unid result.'),('limitante','Ingrediente limitante')]:
+            self.plan_tree.heading(c, text=t)
+        self.plan_tree.pack(fill='both', expand=True, padx=6, pady=6)
+        self.plan_tree.bind('<Double-1>', self.on_plan_double)
         self.refresh_receitas()
 
     def refresh_receitas(self):
-        rows = self.db.get_receitas()
-        self.cmb_receitas['values'] = [r['nome'] for r in rows]
+        self.cmb_receitas['values'] = self.db.catalog('receitas').names()
+        self.refresh_plan()
+
+    def refresh_plan(self):
+        if not self.plan_tree.winfo_manager():
+            return
+        for r in self.plan_tree.get_children(): self.plan_tree.delete(r)
+        try:
+            plano = self.db.max_producible()
+        except ImportError:
+            # planejador requer numpy (dependência opcional): sem ele o painel some
+            self.plan_label.pack_forget()
+            self.plan_tree.pack_forget()
+            return
+        for rid, p in sorted(plano.items(), key=lambda kv: kv[1]['nome']):
+            self.plan_tree.insert('', 'end', iid=str(rid), values=(p['nome'], f"{p['max_quantidade']:.2f}", p['unidade_resultado'], p['limitante'] or '-'))
+
+    def on_plan_double(self, event):
+        sel = self.plan_tree.selection()
+        if not sel:
+            return
+        self.cmb_receitas.set(self.plan_tree.item(sel[0], 'values')[0])
+        self.ent_qtd.focus_set()
 
     def on_produce(self):
         nome = self.cmb_receitas.get().strip()
         if not nome:
             messagebox.showwarning('Erro','Selecione uma receita'); return
-        recs = self.db.get_receitas()
-        rec = next((r for r in recs if r['nome'] == nome), None)
+        rec = self.db.catalog('receitas').get_by_nome(nome)
         if not rec:
             messagebox.showerror('Erro','Receita não encontrada'); return
         try:
@@ -41,5 +69,6 @@ class ProducaoTab(ttk.Frame):
         try:
             self.db.add_producao(rec['id'], qtd, data, self.cmb_un.get())
             messagebox.showinfo('Ok','Produção registrada')
+            self.refresh_plan()
         except Exception as e:
             messagebox.showerror('Erro ao produzir', str(e))
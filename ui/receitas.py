@@ -2,6 +2,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from utils.unit_converter import UnitConverter
+from utils.common_combobox import SearchCombobox
 
 class ReceitasTab(ttk.Frame):
     def __init__(self, parent, db):
@@ -19,7 +20,7 @@ class ReceitasTab(ttk.Frame):
         ttk.Label(frm, text='Unid resultado:').grid(row=0,column=4); self.ent_un_res = ttk.Combobox(frm, values=UnitConverter.common_units(), width=6); self.ent_un_res.set('un'); self.ent_un_res.grid(row=0,column=5)
 
         # ingredientes
-        ttk.Label(frm, text='Ingrediente:').grid(row=1,column=0); self.ent_ing = ttk.Combobox(frm, values=[p['nome'] for p in self.db.get_produtos()], width=40); self.ent_ing.grid(row=1,column=1)
+        ttk.Label(frm, text='Ingrediente:').grid(row=1,column=0); self.ent_ing = SearchCombobox(frm, search=lambda t: [p['nome'] for p in self.db.search_produtos(t)], width=40); self.ent_ing.grid(row=1,column=1)
         ttk.Label(frm, text='Qtd:').grid(row=1,column=2); self.ent_ing_qtd = ttk.Entry(frm, width=10); self.ent_ing_qtd.grid(row=1,column=3)
         ttk.Label(frm, text='Unid:').grid(row=1,column=4); self.cmb_ing_un = ttk.Combobox(frm, values=UnitConverter.common_units(), width=6); self.cmb_ing_un.set('g'); self.cmb_ing_un.grid(row=1,column=5)
         ttk.Button(frm, text='Adicionar ingrediente', command=self.add_ingredient).grid(row=1,column=6, padx=6)
@@ -34,8 +35,8 @@ class ReceitasTab(ttk.Frame):
 
         # receitas existentes
         ttk.Label(self, text='Receitas existentes (duplo clique para ver ingredientes)').pack(anchor='w', padx=6)
-        self.recipes_tree = ttk.Treeview(self, columns=('nome','rendimento','un'), show='headings')
-        for c,t in [('nome','Nome'),('rendimento','Rendimento'),('un','Unid result.')]:
+        self.recipes_tree = ttk.Treeview(self, columns=('nome','rendimento','un','custo'), show='headings')
+        for c,t in [('nome','Nome'),('rendimento','Rendimento'),('un','Unid result.'),('custo','Custo/unid (R$)')]:
             self.recipes_tree.heading(c, text=t)
         self.recipes_tree.pack(fill='both', expand=True, padx=6, pady=6)
         self.recipes_tree.bind('<Double-1>', self.open_recipe)
@@ -84,8 +85,10 @@ class ReceitasTab(ttk.Frame):
 
     def refresh_recipes(self):
         for r in self.recipes_tree.get_children(): self.recipes_tree.delete(r)
+        costs = self.db.compute_all_recipe_costs()
         for rec in self.db.get_receitas():
-            self.recipes_tree.insert('', 'end', iid=rec['id'], values=(rec['nome'], rec['rendimento'], rec['unidade_resultado']))
+            custo = costs.get(rec['id'], {}).get('cost_per_unit', 0)
+            self.recipes_tree.insert('', 'end', iid=rec['id'], values=(rec['nome'], rec['rendimento'], rec['unidade_resultado'], f"{custo:.2f}"))
 
     def open_recipe(self, event):
         sel = self.recipes_tree.selection()
@@ -101,3 +104,5 @@ class ReceitasTab(ttk.Frame):
         ings = self.db.get_receita_ingredientes(rid)
         for ing in ings:
             tree.insert('', 'end', values=(ing['produto_nome'], f"{ing['quantidade_usada']}", ing['unidade']))
+        for sub in self.db.get_receita_sub_receitas(rid):
+            tree.insert('', 'end', values=(f"[receita] {sub['sub_receita_nome']}", f"{sub['quantidade_usada']}", sub['unidade']))
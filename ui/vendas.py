@@ -2,12 +2,14 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from utils.unit_converter import UnitConverter
+from utils.paged_treeview import PagedTreeview
+from utils.common_combobox import SearchCombobox
 
 class VendasTab(ttk.Frame):
     def __init__(self, parent, db):
         super().__init__(parent, padding=8)
         self.db = db
-        self.produtos = []
+        self._list_date = None
         self._build_ui()
         self.refresh_products()
         self.refresh_list()
@@ -15,7 +17,7 @@ class VendasTab(ttk.Frame):
     def _build_ui(self):
         ttk.Label(self, text='💰 Vendas', font=('Segoe UI', 14)).pack(anchor='w')
         frm = ttk.Frame(self); frm.pack(fill='x', padx=6, pady=6)
-        ttk.Label(frm, text='Produto:').grid(row=0,column=0); self.cmb_prod = ttk.Combobox(frm, values=[], width=40); self.cmb_prod.grid(row=0,column=1)
+        ttk.Label(frm, text='Produto:').grid(row=0,column=0); self.cmb_prod = SearchCombobox(frm, search=lambda t: [p['nome'] for p in self.db.search_produtos(t)], width=40); self.cmb_prod.grid(row=0,column=1)
         ttk.Label(frm, text='Qtd:').grid(row=1,column=0); self.ent_qtd = ttk.Entry(frm, width=12); self.ent_qtd.grid(row=1,column=1)
         ttk.Label(frm, text='Unid:').grid(row=1,column=2); self.cmb_un = ttk.Combobox(frm, values=UnitConverter.common_units(), width=6); self.cmb_un.set('un'); self.cmb_un.grid(row=1,column=3)
         ttk.Label(frm, text='Preço unit. (R$):').grid(row=2,column=0); self.ent_preco = ttk.Entry(frm, width=12); self.ent_preco.grid(row=2,column=1)
@@ -24,32 +26,34 @@ class VendasTab(ttk.Frame):
 
         ttk.Label(self, text='Produtos cadastrados (duplo-clique para usar):').pack(anchor='w', padx=6)
         cols = ('nome','qtd','un_base','preco_unit')
-        self.prod_tree = ttk.Treeview(self, columns=cols, show='headings', height=6)
+        self.prod_list = PagedTreeview(self, cols,
+                                       fetch_page=lambda after, limit: self.db.get_produtos_page(after=after, limit=limit),
+                                       row_values=lambda p: (p['nome'], f"{p['quantidade']:.4f}", p['unidade_base'], f"{float(p['ultima_compra_unitaria'] or 0):.4f}"),
+                                       row_key=lambda p: p['nome'], row_iid=lambda p: str(p['id']), height=6)
+        self.prod_tree = self.prod_list.tree
         for c,t in [('nome','Produto'),('qtd','Qtd (base)'),('un_base','Unid base'),('preco_unit','Últ. preço')]:
             self.prod_tree.heading(c, text=t)
-        self.prod_tree.pack(fill='x', padx=6, pady=(0,6))
+        self.prod_list.pack(fill='x', padx=6, pady=(0,6))
         self.prod_tree.bind('<Double-1>', self.on_prod_tree_double)
 
-        self.vendas_tree = ttk.Treeview(self, columns=('produto','qtd','un','preco','data'), show='headings')
+        self.vendas_list = PagedTreeview(self, ('produto','qtd','un','preco','data'),
+                                         fetch_page=lambda after, limit: self.db.get_vendas_por_data_page(self._list_date, after=after, limit=limit),
+                                         row_values=lambda r: (r['nome'], f"{float(r['quantidade']):.2f}", r['quantidade_base'], f"{float(r['preco_unitario']):.2f}", r['data']),
+                                         row_key=lambda r: r['id'])
+        self.vendas_tree = self.vendas_list.tree
         for c,t in [('produto','Produto'),('qtd','Quantidade'),('un','Unidade'),('preco','Preço unit.'),('data','Data')]:
             self.vendas_tree.heading(c, text=t)
-        self.vendas_tree.pack(fill='both', expand=True, padx=6, pady=6)
+        self.vendas_list.pack(fill='both', expand=True, padx=6, pady=6)
 
     def refresh_products(self):
-        self.produtos = list(self.db.get_produtos())
-        names = [p['nome'] for p in self.produtos]
-        self.cmb_prod['values'] = names
-        for r in self.prod_tree.get_children(): self.prod_tree.delete(r)
-        for p in self.produtos:
-            last_price = p['ultima_compra_unitaria'] or 0
-            self.prod_tree.insert('', 'end', iid=str(p['id']), values=(p['nome'], f"{p['quantidade']:.4f}", p['unidade_base'], f"{float(last_price):.4f}"))
+        self.prod_list.reload()
 
     def on_prod_tree_double(self, event):
         sel = self.prod_tree.selection()
         if not sel:
             return
         pid = int(sel[0])
-        prod = next((p for p in self.produtos if p['id'] == pid), None)
+        prod = self.db.get_produto(pid)
         if not prod:
             return
         self.cmb_prod.set(prod['nome'])
@@ -62,7 +66,7 @@ class VendasTab(ttk.Frame):
         nome = self.cmb_prod.get().strip()
         if not nome:
             messagebox.showwarning('Erro','Selecione produto'); return
-        prod = next((p for p in self.produtos if p['nome'] == nome), None)
+        prod = self.db.catalog('produtos').get_by_nome(nome)
         if not prod:
             messagebox.showerror('Erro','Produto não encontrado'); return
         try:
@@ -84,7 +88,6 @@ class VendasTab(ttk.Frame):
             messagebox.showerror('Erro', str(e))
 
     def refresh_list(self):
-        for r in self.vendas_tree.get_children(): self.vendas_tree.delete(r)
-        rows = self.db.get_vendas_por_data(self.ent_data.get() or None)
-        for r in rows:
-            self.vendas_tree.insert('', 'end', values=(r['nome'], f"{float(r['quantidade']):.2f}", r['quantidade_base'], f"{float(r['preco_unitario']):.2f}", r['data']))
+        # a data fica fixa enquanto o usuário rola a lista, mesmo se o campo mudar
+        self._list_date = self.ent_data.get() or None
+        self.vendas_list.reload()
@@ -0,0 +1,30 @@
+# utils/common_combobox.py
+from tkinter import ttk
+
+
+class SearchCombobox(ttk.Combobox):
+    """
+    Combobox com busca incremental: em vez de carregar todos os nomes, a
+    lista de opções é consultada a cada digitação (com um pequeno atraso
+    para agrupar teclas) por search(texto) -> lista de strings.
+    """
+
+    DELAY_MS = 150
+
+    def __init__(self, parent, search, **kw):
+        super().__init__(parent, postcommand=self.update_values, **kw)
+        self.search = search
+        self._after_id = None
+        self.bind('<KeyRelease>', self._on_key, add='+')
+
+    def _on_key(self, event):
+        # navegação e confirmação não mudam o texto
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(self.DELAY_MS, self.update_values)
+
+    def update_values(self):
+        self._after_id = None
+        self['values'] = self.search(self.get())
@@ -1,15 +1,17 @@
 # utils/dash.py (versão corrigida sem warnings)
-import pandas as pd
-import seaborn as sns
+# pandas e seaborn são importados dentro das funções: este módulo é carregado
+# na inicialização e essas bibliotecas só são necessárias ao desenhar.
 
 def plot_sales_trend(db_conn, fig):
     """Gera um gráfico de linha com a tendência de vendas."""
+    import pandas as pd
+    import seaborn as sns
     fig.clear()
     ax = fig.add_subplot(111)
     query = """
-    SELECT date(data) as dia, SUM(quantidade_base * preco_unitario) as faturamento
-    FROM vendas
-    WHERE date(data) >= date('now', '-30 days')
+    SELECT dia, SUM(receita) as faturamento
+    FROM vendas_diarias
+    WHERE dia >= date('now', '-30 days')
     GROUP BY dia ORDER BY dia;
     """
     df = pd.read_sql_query(query, db_conn)
@@ -23,24 +25,29 @@ def plot_sales_trend(db_conn, fig):
 
 def plot_top_products(db_conn, fig):
     """Gera um gráfico de barras com os produtos mais vendidos."""
+    import pandas as pd
+    import seaborn as sns
     fig.clear()
     ax = fig.add_subplot(111)
     query = """
-    SELECT p.nome, SUM(v.quantidade_base) as total_vendido
-    FROM vendas v JOIN produtos p ON v.produto_id = p.id
+    SELECT p.nome, SUM(vd.quantidade_base) as total_vendido
+    FROM vendas_diarias vd JOIN produtos p ON vd.produto_id = p.id
+    WHERE vd.dia >= date('now', '-30 days')
     GROUP BY p.nome ORDER BY total_vendido DESC LIMIT 5;
     """
     df = pd.read_sql_query(query, db_conn)
     if not df.empty:
         # CORREÇÃO APLICADA AQUI
         sns.barplot(data=df, x='total_vendido', y='nome', ax=ax, palette='viridis', hue='nome', legend=False)
-    ax.set_title('Top 5 Produtos (Volume de Vendas)')
+    ax.set_title('Top 5 Produtos (Volume de Vendas, 30 dias)')
     ax.set_xlabel('Unidades Vendidas')
     ax.set_ylabel('')
     fig.tight_layout()
 
 def plot_stock_levels(db_conn, fig):
     """Gera um gráfico de barras com os níveis de estoque."""
+    import pandas as pd
+    import seaborn as sns
     fig.clear()
     ax = fig.add_subplot(111)
     query = "SELECT nome, quantidade, reorder_level FROM produtos WHERE reorder_level > 0 ORDER BY quantidade ASC LIMIT 7;"
@@ -56,6 +63,7 @@ def plot_stock_levels(db_conn, fig):
 
 def plot_purchases_by_supplier(db_conn, fig):
     """Gera um gráfico de pizza com o valor das compras por fornecedor."""
+    import pandas as pd
     fig.clear()
     ax = fig.add_subplot(111)
     query = """
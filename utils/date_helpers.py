@@ -1,19 +1,64 @@
 # utils/date_helpers.py
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 
 DISPLAY_DATE_FMT = '%d/%m/%Y'
 ISO_DATE_FMT = '%Y-%m-%d'
 
-def parse_date_input(date_str):
+def parse_date_input(date_str, strict=False):
     """
     Aceita DD/MM/YYYY ou YYYY-MM-DD ou None.
     Retorna ISO YYYY-MM-DD (string).
+    None/vazio é hoje. Texto que não é data também vira hoje, a menos que
+    strict=True: aí levanta ValueError.
     """
     if date_str is None:
         return datetime.now().strftime(ISO_DATE_FMT)
     s = str(date_str).strip()
     if not s:
         return datetime.now().strftime(ISO_DATE_FMT)
+    iso = _parse_texto(s)
+    if iso is None:
+        if strict:
+            raise ValueError(f"Data inválida: '{s}'")
+        # last resort: now
+        return datetime.now().strftime(ISO_DATE_FMT)
+    return iso
+
+def parse_dates_many(values, strict=False):
+    """
+    parse_date_input para uma coluna inteira (importações): cada texto
+    distinto é convertido uma vez. Em strict, o erro indica o item.
+    """
+    hoje = None
+    memo = {}
+    out = []
+    for i, v in enumerate(values, start=1):
+        iso = memo.get(v)
+        if iso is None:
+            s = '' if v is None else str(v).strip()
+            iso = _parse_texto(s) if s else None
+            if iso is None:
+                if s and strict:
+                    raise ValueError(f"Item {i}: data inválida '{s}'")
+                hoje = hoje or datetime.now().strftime(ISO_DATE_FMT)
+                out.append(hoje)
+                continue
+            memo[v] = iso
+        out.append(iso)
+    return out
+
+@lru_cache(maxsize=4096)
+def _parse_texto(s):
+    """ISO do texto (já sem espaços) ou None; não depende de hoje, por isso o cache."""
+    try:
+        # caminhos rápidos: YYYY-MM-DD e DD/MM/YYYY com dois dígitos
+        if len(s) == 10 and s[4] == '-' and s[7] == '-':
+            return date.fromisoformat(s).isoformat()
+        if len(s) == 10 and s[2] == '/' and s[5] == '/':
+            return date(int(s[6:]), int(s[3:5]), int(s[:2])).isoformat()
+    except ValueError:
+        return None
     for fmt in (DISPLAY_DATE_FMT, ISO_DATE_FMT):
         try:
             return datetime.strptime(s, fmt).strftime(ISO_DATE_FMT)
@@ -23,8 +68,28 @@ def parse_date_input(date_str):
     try:
         return datetime.fromisoformat(s).strftime(ISO_DATE_FMT)
     except Exception:
-        # last resort: now
-        return datetime.now().strftime(ISO_DATE_FMT)
+        return None
+
+# dia 0 das colunas *_dia (inteiros): 1970-01-01
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+@lru_cache(maxsize=4096)
+def day_number(iso_date):
+    """Nº do dia (inteiro desde 1970-01-01) de uma data ISO; None se vazia."""
+    if not iso_date:
+        return None
+    return date.fromisoformat(str(iso_date)[:10]).toordinal() - EPOCH_ORDINAL
+
+def today_number():
+    return date.today().toordinal() - EPOCH_ORDINAL
+
+def next_day_iso(iso_date):
+    """
+    Retorna o dia seguinte a uma data ISO (YYYY-MM-DD).
+    Usado como limite superior exclusivo em filtros por período.
+    """
+    d = datetime.strptime(str(iso_date)[:10], ISO_DATE_FMT) + timedelta(days=1)
+    return d.strftime(ISO_DATE_FMT)
 
 def iso_to_display(iso_date):
     if not iso_date:
@@ -0,0 +1,61 @@
+# utils/paged_treeview.py
+from tkinter import ttk
+
+
+class PagedTreeview(ttk.Frame):
+    """
+    Treeview com barra de rolagem que carrega as linhas por páginas, à medida
+    que o usuário rola até o fim, em vez de inserir a tabela inteira de uma vez.
+
+    fetch_page(after, limit) deve retornar a próxima página (lista de linhas)
+    a partir da chave `after` (None na primeira); row_key(linha) dá a chave da
+    última linha para pedir a seguinte e row_values(linha) os valores exibidos.
+    O Treeview fica em self.tree (headings, bind, selection...).
+    """
+
+    # carrega a próxima página quando o fim visível passa desta fração
+    PRELOAD_AT = 0.9
+
+    def __init__(self, parent, columns, fetch_page, row_values, row_key, row_iid=None, page_size=200, **tree_kw):
+        super().__init__(parent)
+        self.fetch_page = fetch_page
+        self.row_values = row_values
+        self.row_key = row_key
+        self.row_iid = row_iid
+        self.page_size = page_size
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', **tree_kw)
+        self.scroll = ttk.Scrollbar(self, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_yscroll)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scroll.pack(side='right', fill='y')
+        self._after = None
+        self._exhausted = True
+        self._scheduled = False
+
+    def reload(self):
+        """Limpa a lista e carrega a primeira página."""
+        self.tree.delete(*self.tree.get_children())
+        self._after = None
+        self._exhausted = False
+        self.load_next()
+
+    def load_next(self):
+        """Carrega a próxima página; retorna o número de linhas inseridas."""
+        self._scheduled = False
+        if self._exhausted:
+            return 0
+        rows = self.fetch_page(self._after, self.page_size)
+        for r in rows:
+            iid = self.row_iid(r) if self.row_iid else None
+            self.tree.insert('', 'end', iid=iid, values=self.row_values(r))
+        if rows:
+            self._after = self.row_key(rows[-1])
+        self._exhausted = len(rows) < self.page_size
+        return len(rows)
+
+    def _on_yscroll(self, first, last):
+        self.scroll.set(first, last)
+        # também preenche a área visível quando a primeira página não a ocupa toda
+        if not self._exhausted and not self._scheduled and float(last) >= self.PRELOAD_AT:
+            self._scheduled = True
+            self.after_idle(self.load_next)
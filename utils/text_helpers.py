@@ -0,0 +1,36 @@
+# utils/text_helpers.py
+
+# Acentos removidos nas buscas. A mesma tabela gera a expressão SQL usada nos
+# gatilhos do índice de busca, para que o texto indexado e o texto pesquisado
+# sejam normalizados exatamente da mesma forma.
+ACENTOS = {
+    'á': 'a', 'à': 'a', 'â': 'a', 'ã': 'a', 'ä': 'a',
+    'é': 'e', 'è': 'e', 'ê': 'e', 'ë': 'e',
+    'í': 'i', 'ì': 'i', 'î': 'i', 'ï': 'i',
+    'ó': 'o', 'ò': 'o', 'ô': 'o', 'õ': 'o', 'ö': 'o',
+    'ú': 'u', 'ù': 'u', 'û': 'u', 'ü': 'u',
+    'ç': 'c', 'ñ': 'n',
+}
+ACENTOS.update({k.upper(): v.upper() for k, v in list(ACENTOS.items())})
+
+_TABELA = str.maketrans(ACENTOS)
+
+
+def sem_acentos(texto):
+    """'Açúcar' -> 'Acucar'."""
+    return (texto or '').translate(_TABELA)
+
+
+def sem_acentos_sql(expr, por_nivel=12):
+    """
+    Expressão SQL equivalente a sem_acentos(expr). Os replace() são divididos
+    em subconsultas aninhadas de `por_nivel` em `por_nivel`: um único
+    aninhamento com todos estoura a pilha do parser do SQLite.
+    """
+    pares = list(ACENTOS.items())
+    for i in range(0, len(pares), por_nivel):
+        inner = 's'
+        for acento, letra in pares[i:i + por_nivel]:
+            inner = f"replace({inner}, '{acento}', '{letra}')"
+        expr = f'(SELECT {inner} FROM (SELECT {expr} AS s))'
+    return expr
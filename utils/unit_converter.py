@@ -4,6 +4,14 @@ class UnitConverter:
     VOLUME = {'ml': 1.0, 'l': 1000.0}
     PIECE = {'un': 1.0}
 
+    # tabela de códigos para conversão em lote (to_base_many): código = posição
+    UNITS = ('mg', 'g', 'kg', 'ml', 'l', 'un')
+    CODES = {u: i for i, u in enumerate(UNITS)}
+    FACTORS = (0.001, 1.0, 1000.0, 1.0, 1000.0, 1.0)
+    BASES = ('g', 'g', 'g', 'ml', 'ml', 'un')
+    # dimensão de cada base, na ordem usada pelos fatores para gramas
+    DIMENSIONS = ('g', 'ml', 'un')
+
     @staticmethod
     def to_base(quantity, unit):
         """
@@ -24,22 +32,119 @@ class UnitConverter:
         return q, unit
 
     @staticmethod
-    def from_base(quantity, base_unit, target_unit):
+    def base_factor(from_base, to_base, densidade=None, peso_unidade=None):
+        """
+        Fator de from_base para to_base ('g', 'ml' ou 'un'). Entre dimensões
+        diferentes usa densidade (g/ml) e/ou peso_unidade (g por unidade);
+        ValueError se o fator necessário não estiver definido.
+        """
+        if from_base == to_base:
+            return 1.0
+        para_g = {'g': 1.0, 'ml': densidade, 'un': peso_unidade}
+        origem, destino = para_g.get(from_base), para_g.get(to_base)
+        if not origem or not destino:
+            raise ValueError(f"Sem fator de conversão de '{from_base}' para '{to_base}' (defina densidade/peso por unidade do produto)")
+        return float(origem) / float(destino)
+
+    @staticmethod
+    def to_product_base(quantity, unit, produto_base, densidade=None, peso_unidade=None):
+        """
+        Como to_base, mas na base da unidade do produto (ex.: 'kg' -> 'g'),
+        convertendo entre massa, volume e unidades pelos fatores do produto.
+        Unidades fora da tabela passam sem conversão, como em to_base.
+        """
+        q, base = UnitConverter.to_base(quantity, unit)
+        alvo = UnitConverter.to_base(1, produto_base)[1]
+        if base not in UnitConverter.DIMENSIONS or alvo not in UnitConverter.DIMENSIONS:
+            return q, base
+        return q * UnitConverter.base_factor(base, alvo, densidade, peso_unidade), alvo
+
+    @staticmethod
+    def to_base_many(quantities, units, target_units=None, densidades=None, pesos_unidade=None):
+        """
+        Versão vetorizada de to_base (requer numpy). Retorna (array de
+        quantidades em base, lista de unidades base). `units` é uma unidade
+        para todas ou uma por quantidade. Com `target_units` (unidade de cada
+        produto) faz o mesmo que to_product_base, com `densidades` e
+        `pesos_unidade` por linha (None = não definido).
+        """
+        import numpy as np  # dependência opcional, só para conversões em lote
+
+        try:
+            q = np.asarray(quantities, dtype=float).reshape(-1)
+        except (TypeError, ValueError):
+            raise ValueError('Quantidade inválida')
+        if np.isnan(q).any():
+            raise ValueError('Quantidade inválida')
+        n = len(q)
+        unidades = UnitConverter._as_list(units, n)
+        desconhecida = len(UnitConverter.UNITS)
+        codes = UnitConverter._codes(unidades, desconhecida)
+        # última posição: unidade fora da tabela (fator 1, base = a própria unidade)
+        fatores = np.array(UnitConverter.FACTORS + (1.0,))
+        dims = np.array([UnitConverter.DIMENSIONS.index(b) for b in UnitConverter.BASES] + [-1])
+        result = q * fatores[codes]
+        origem = dims[codes]
+        bases = np.array(UnitConverter.BASES + (None,), dtype=object)[codes]
+        if (codes == desconhecida).any():
+            bases[codes == desconhecida] = np.array(unidades, dtype=object)[codes == desconhecida]
+        if target_units is None:
+            return result, bases.tolist()
+
+        alvo = dims[UnitConverter._codes(UnitConverter._as_list(target_units, n), desconhecida)]
+        cruzar = (origem >= 0) & (alvo >= 0) & (origem != alvo)
+        if cruzar.any():
+            def coluna(valores):
+                if valores is None:
+                    return np.full(n, np.nan)
+                return np.broadcast_to(np.asarray(valores, dtype=float), (n,))
+            # fatores para gramas por dimensão (linhas) e item (colunas)
+            para_g = np.vstack([np.ones(n), coluna(densidades), coluna(pesos_unidade)])
+            cols = np.arange(n)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fator = para_g[origem.clip(0), cols] / para_g[alvo.clip(0), cols]
+            ruins = cruzar & ~(np.isfinite(fator) & (fator > 0))
+            if ruins.any():
+                i = int(np.argmax(ruins))
+                raise ValueError(f"Item {i + 1}: sem fator de conversão de '{bases[i]}' para "
+                                 f"'{UnitConverter.DIMENSIONS[alvo[i]]}' (defina densidade/peso por unidade do produto)")
+            result = np.where(cruzar, result * fator, result)
+            bases[cruzar] = np.array(UnitConverter.DIMENSIONS, dtype=object)[alvo[cruzar]]
+        return result, bases.tolist()
+
+    @staticmethod
+    def _as_list(units, n):
+        if units is None or isinstance(units, str):
+            return [units] * n
+        units = list(units)
+        if len(units) != n:
+            raise ValueError('Quantidades e unidades com tamanhos diferentes')
+        return units
+
+    @staticmethod
+    def _codes(units, desconhecida):
+        import numpy as np
+
+        memo = {u: UnitConverter.CODES.get((u or '').lower(), desconhecida) for u in set(units)}
+        return np.fromiter(map(memo.__getitem__, units), dtype=np.intp, count=len(units))
+
+    @staticmethod
+    def from_base(quantity, base_unit, target_unit, densidade=None, peso_unidade=None):
+        """
+        Converte uma quantidade na base de base_unit para target_unit. Entre
+        dimensões diferentes usa densidade/peso_unidade (ValueError sem eles).
+        """
         if quantity is None:
             return 0
         try:
             q = float(quantity)
         except Exception:
             return 0
-        bu = (base_unit or '').lower()
-        tu = (target_unit or '').lower()
-        if bu in UnitConverter.MASS and tu in UnitConverter.MASS:
-            return q / UnitConverter.MASS[tu]
-        if bu in UnitConverter.VOLUME and tu in UnitConverter.VOLUME:
-            return q / UnitConverter.VOLUME[tu]
-        if bu == 'un' and tu == 'un':
+        origem = UnitConverter.to_base(1, base_unit)[1]
+        fator, destino = UnitConverter.to_base(1, target_unit)
+        if origem not in UnitConverter.DIMENSIONS or destino not in UnitConverter.DIMENSIONS:
             return q
-        return q
+        return q * UnitConverter.base_factor(origem, destino, densidade, peso_unidade) / fator
 
     @staticmethod
     def common_units():